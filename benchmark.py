@@ -0,0 +1,783 @@
+"""Reproducible benchmarks for screening and watchlist ingestion against a local Postgres + pgvector.
+
+    python benchmark.py generate --entities 100000 --customers 2000 --out bench_data
+    BENCHMARK_DATABASE_URL=postgresql://localhost/screening_bench \
+        python benchmark.py run --data bench_data --reset --output results.json
+    python benchmark.py compare baseline.json results.json
+    python benchmark.py embedding --backends sentence-transformers onnx onnx-int8 --output embedding.json
+
+By default the embedding model is replaced with a deterministic hashing
+stand-in and Ollama with a local stub server, so runs need neither model
+weights nor a GPU and are comparable between commits. Use --reset for
+comparable numbers: it empties the watchlist and screening tables first.
+`run` only works against BENCHMARK_DATABASE_URL, whose database name must
+contain "bench", never the service's DATABASE_URL: it writes stand-in
+embeddings and --reset truncates the screening audit trail.
+`embedding` measures each embedding backend in a fresh process, so cold
+start includes imports and model loading.
+"""
+import argparse
+import csv
+import datetime
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+SYLLABLES = [
+    "al", "an", "ar", "ba", "bo", "da", "de", "el", "fa", "ga", "ha", "ia", "ib", "ka", "ko", "la", "li", "lu",
+    "ma", "mi", "mo", "na", "ni", "no", "ol", "pa", "ra", "re", "ri", "ro", "sa", "se", "sh", "si", "ta", "te",
+    "to", "ur", "va", "vi", "ya", "yo", "za", "zi", "chen", "dmi", "gor", "kov", "lin", "mar", "ser", "tar",
+]
+NATIONALITIES = ["US", "GB", "RU", "CN", "IR", "PK", "AE", "DE", "FR", "NG", "VE", "SY", "KP", "MX", "IN"]
+RISK_CATEGORIES = ["SAN", "PEP", "AME"]
+# How a known-match customer's name is derived from its watchlist entity
+CUSTOMER_VARIANTS = ["exact", "misspelled", "reordered", "alias"]
+
+WATCHLIST_FIELDS = ["unique_id", "name", "date_of_birth", "nationality", "risk_category", "aliases"]
+CUSTOMER_FIELDS = ["customer_id", "name", "date_of_birth", "nationality", "expected_unique_id", "variant"]
+
+# Mirrors servicesembedding.EMBEDDING_BACKENDS; not imported so the CLI parses without loading config
+EMBEDDING_BACKEND_NAMES = ("hashing", "sentence-transformers", "onnx", "onnx-int8")
+
+BENCHMARK_TABLES = [
+    "watchlist_entities", "watchlist_aliases", "watchlist_name_keys", "watchlist_changes",
+    "screening_records", "screening_matches", "customer_embeddings", "llm_explanation_cache", "stats_counters",
+]
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Answers /api/generate like Ollama after a fixed delay; the warmup call (empty prompt) returns at once"""
+
+    latency_seconds = 0.0
+
+    def _send_json(self, payload, content_type="application/json"):
+        body = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            self._send_json("Ollama is running", content_type="text/plain")
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        response = ""
+        if request.get("prompt"):
+            time.sleep(self.latency_seconds)
+            response = "Stub explanation: the customer's name closely matches a watchlist entry."
+        answer = {
+            "model": request.get("model"),
+            "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+            "response": response,
+            "done": True,
+        }
+        if request.get("stream", True):
+            self._send_json(json.dumps(answer) + "\n", content_type="application/x-ndjson")
+        else:
+            self._send_json(answer)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_ollama(latency_ms: float) -> ThreadingHTTPServer:
+    handler = type("ConfiguredStubOllamaHandler", (StubOllamaHandler,), {"latency_seconds": latency_ms / 1000})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True).start()
+    return server
+
+# Spelling changes typical of transliteration and data entry, used to derive benchmark queries
+SPELLING_VARIATIONS = [
+    ("ph", "f"), ("f", "ph"), ("v", "w"), ("w", "v"), ("ou", "u"), ("u", "ou"), ("y", "i"), ("i", "y"),
+    ("kh", "h"), ("ck", "k"), ("c", "k"), ("k", "c"), ("s", "z"), ("z", "s"), ("ee", "i"), ("oo", "u"),
+    ("j", "dzh"), ("sh", "sch"), ("ch", "tch"), ("mm", "m"), ("ll", "l"), ("o", "a"), ("e", "a"),
+]
+
+def perturb_name(name: str, rng) -> str:
+    """One transliteration-style spelling change, or a dropped letter when none applies"""
+    lowered = name.lower()
+    options = [(old, new) for old, new in SPELLING_VARIATIONS if old in lowered]
+    if options:
+        old, new = options[rng.integers(len(options))]
+        position = lowered.find(old)
+        return name[:position] + new + name[position + len(old):]
+    if len(name) > 3:
+        position = int(rng.integers(1, len(name) - 1))
+        return name[:position] + name[position + 1:]
+    return name
+
+class SyntheticNames:
+    """Seeded generator of person-like names, DOBs and aliases"""
+
+    def __init__(self, seed: int):
+        self.rng = np.random.default_rng(seed)
+
+    def word(self) -> str:
+        count = self.rng.integers(2, 4)
+        return "".join(SYLLABLES[i] for i in self.rng.integers(len(SYLLABLES), size=count)).capitalize()
+
+    def name(self) -> str:
+        words = [self.word() for _ in range(3 if self.rng.random() < 0.2 else 2)]
+        return " ".join(words)
+
+    def date_of_birth(self):
+        if self.rng.random() < 0.1:
+            return None
+        return datetime.date(1940, 1, 1) + datetime.timedelta(days=int(self.rng.integers(0, 60 * 365)))
+
+    def misspell(self, name: str) -> str:
+        return perturb_name(name, self.rng)
+
+    def aliases(self, name: str) -> list[str]:
+        return [self.misspell(self.misspell(name)) for _ in range(self.rng.integers(0, 3))]
+
+    def watchlist_row(self, unique_id: str) -> dict:
+        name = self.name()
+        dob = self.date_of_birth()
+        return {
+            "unique_id": unique_id,
+            "name": name,
+            "date_of_birth": dob.isoformat() if dob else "",
+            "nationality": NATIONALITIES[self.rng.integers(len(NATIONALITIES))],
+            "risk_category": RISK_CATEGORIES[self.rng.integers(len(RISK_CATEGORIES))],
+            "aliases": ";".join(self.aliases(name)),
+        }
+
+    def customer_of(self, entity: dict, variant: str) -> str:
+        name = entity["name"]
+        aliases = [alias for alias in entity["aliases"].split(";") if alias]
+        if variant == "alias" and aliases:
+            return aliases[self.rng.integers(len(aliases))]
+        if variant == "reordered":
+            words = name.split()
+            return " ".join(words[1:] + words[:1])
+        if variant == "exact":
+            return name
+        return self.misspell(name)
+
+def generate(args):
+    """Write watchlist.csv, customers.csv (with the expected match of each customer) and manifest.json"""
+    names = SyntheticNames(args.seed)
+    os.makedirs(args.out, exist_ok=True)
+    known = int(args.customers * args.match_rate)
+    known_indexes = set(names.rng.choice(args.entities, size=min(known, args.entities), replace=False).tolist())
+    customers = []
+    start = time.perf_counter()
+    with open(os.path.join(args.out, "watchlist.csv"), "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=WATCHLIST_FIELDS)
+        writer.writeheader()
+        for index in range(args.entities):
+            entity = names.watchlist_row(f"W{index:08d}")
+            writer.writerow(entity)
+            if index in known_indexes:
+                variant = CUSTOMER_VARIANTS[names.rng.integers(len(CUSTOMER_VARIANTS))]
+                customers.append({
+                    "name": names.customer_of(entity, variant),
+                    "date_of_birth": entity["date_of_birth"],
+                    # Customers don't always declare a nationality
+                    "nationality": entity["nationality"] if names.rng.random() < 0.8 else "",
+                    "expected_unique_id": entity["unique_id"],
+                    "variant": variant,
+                })
+    for _ in range(args.customers - len(customers)):
+        dob = names.date_of_birth()
+        customers.append({
+            "name": names.name(),
+            "date_of_birth": dob.isoformat() if dob else "",
+            "nationality": "",
+            "expected_unique_id": "",
+            "variant": "none",
+        })
+    names.rng.shuffle(customers)
+    with open(os.path.join(args.out, "customers.csv"), "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=CUSTOMER_FIELDS)
+        writer.writeheader()
+        for index, customer in enumerate(customers):
+            writer.writerow({"customer_id": f"C{index:08d}", **customer})
+    manifest = {
+        "entities": args.entities,
+        "customers": len(customers),
+        "known_matches": len(known_indexes),
+        "seed": args.seed,
+        "generated_at": datetime.datetime.utcnow().isoformat(),
+    }
+    with open(os.path.join(args.out, "manifest.json"), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+    print(
+        f"Wrote {args.entities} watchlist entities and {len(customers)} customers "
+        f"({len(known_indexes)} with a known match) to {args.out} in {time.perf_counter() - start:.1f}s"
+    )
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def latency_stats(seconds) -> dict:
+    if not seconds:
+        return {}
+    milliseconds = np.asarray(seconds) * 1000
+    return {
+        "count": len(seconds),
+        "mean_ms": round(float(milliseconds.mean()), 3),
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 3),
+        "p95_ms": round(float(np.percentile(milliseconds, 95)), 3),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 3),
+        "max_ms": round(float(milliseconds.max()), 3),
+    }
+
+def git_revision() -> dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=here, capture_output=True, text=True, check=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit.stdout.strip(), "dirty": bool(status.stdout.strip())}
+
+def settings_snapshot(config) -> dict:
+    """Config values that affect the numbers; connection URLs and credentials are left out"""
+    return {
+        name: getattr(config, name) for name in sorted(dir(config))
+        if name.isupper() and not any(secret in name for secret in ("PASSWORD", "URL", "USER", "HOST"))
+    }
+
+def load_watchlist(path: str, generator) -> dict:
+    from databaseconnection import SessionLocal
+    from servicesingestion import WatchlistIngestor, iter_csv_rows
+    with SessionLocal() as db, open(path, newline="", encoding="utf-8") as handle:
+        stats = WatchlistIngestor(db, generator).ingest(iter_csv_rows(handle))
+    return {
+        "rows": stats["rows_processed"],
+        "created": stats["created_count"],
+        "updated": stats["updated_count"],
+        "unchanged": stats["skipped_unchanged"],
+        "errors": stats["error_count"],
+        "elapsed_seconds": stats["elapsed_seconds"],
+        "rows_per_second": stats["rows_per_second"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def screen_customers(path: str, limit: int, concurrency: int, top_k: int) -> dict:
+    """ScreeningService.screen_entity() per customer; recall counts customers whose expected entity is matched"""
+    from databaseconnection import SessionLocal
+    from servicesscreening import ScreeningService
+
+    with open(path, newline="", encoding="utf-8") as handle:
+        customers = list(csv.DictReader(handle))[:limit or None]
+    local = threading.local()
+    sessions = []
+    sessions_lock = threading.Lock()
+
+    def screen(customer):
+        if not hasattr(local, "service"):
+            db = SessionLocal()
+            with sessions_lock:
+                sessions.append(db)
+            local.service = ScreeningService(db)
+        dob = datetime.date.fromisoformat(customer["date_of_birth"]) if customer["date_of_birth"] else None
+        start = time.perf_counter()
+        result = local.service.screen_entity(
+            customer["name"], dob, nationality=customer["nationality"] or None, top_k=top_k
+        )
+        elapsed = time.perf_counter() - start
+        return elapsed, [match["unique_id"] for match in result["matches"]]
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(screen, customers))
+    finally:
+        for db in sessions:
+            db.close()
+    elapsed = time.perf_counter() - start
+
+    known = {variant: [0, 0] for variant in CUSTOMER_VARIANTS}
+    top1 = unknown = unknown_matched = 0
+    for customer, (_, matched_ids) in zip(customers, outcomes):
+        expected = customer["expected_unique_id"]
+        if not expected:
+            unknown += 1
+            unknown_matched += bool(matched_ids)
+            continue
+        known[customer["variant"]][0] += 1
+        known[customer["variant"]][1] += expected in matched_ids
+        top1 += bool(matched_ids) and matched_ids[0] == expected
+    total_known = sum(count for count, _ in known.values())
+    return {
+        "queries": len(customers),
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "queries_per_second": round(len(customers) / elapsed, 1) if elapsed > 0 else 0.0,
+        "latency": latency_stats([seconds for seconds, _ in outcomes]),
+        "recall": round(sum(found for _, found in known.values()) / total_known, 4) if total_known else None,
+        "top1_rate": round(top1 / total_known, 4) if total_known else None,
+        "recall_by_variant": {
+            variant: round(found / count, 4) for variant, (count, found) in known.items() if count
+        },
+        # Customers generated without a watchlist counterpart that still matched something
+        "unknown_match_rate": round(unknown_matched / unknown, 4) if unknown else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def update_entities(count: int, run_id: str, names: SyntheticNames) -> dict:
+    """add_or_update_watchlist_entity(): create `count` fresh entities, then rename each one (re-embedding it)"""
+    from databaseconnection import SessionLocal
+    from servicesscreening import ScreeningService
+
+    timings = {"created": [], "updated": []}
+    with SessionLocal() as db:
+        service = ScreeningService(db)
+        entities = [names.watchlist_row(f"BENCH-{run_id}-{index}") for index in range(count)]
+        for phase in ("created", "updated"):
+            for entity in entities:
+                name = entity["name"] if phase == "created" else names.misspell(entity["name"])
+                dob = datetime.date.fromisoformat(entity["date_of_birth"]) if entity["date_of_birth"] else None
+                start = time.perf_counter()
+                service.add_or_update_watchlist_entity(
+                    entity["unique_id"], name, [dob] if dob else None, entity["risk_category"],
+                    [alias for alias in entity["aliases"].split(";") if alias]
+                )
+                timings[phase].append(time.perf_counter() - start)
+    return {
+        "created": latency_stats(timings["created"]),
+        "updated": latency_stats(timings["updated"]),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def upload_watchlist(rows: int, run_id: str, names: SyntheticNames) -> dict:
+    """POST a generated CSV to /watchlist/upload in-process (FastAPI TestClient), as the UI does"""
+    import io
+    from fastapi.testclient import TestClient
+    from main import app
+
+    body = io.StringIO()
+    writer = csv.DictWriter(body, fieldnames=WATCHLIST_FIELDS)
+    writer.writeheader()
+    for index in range(rows):
+        writer.writerow(names.watchlist_row(f"BENCHUP-{run_id}-{index}"))
+    # Without the context manager the app's startup hooks (model warmup, workers) don't run
+    client = TestClient(app)
+    start = time.perf_counter()
+    response = client.post("/watchlist/upload", content=body.getvalue().encode(), headers={"Content-Type": "text/csv"})
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    result = response.json()
+    return {
+        "rows": result["rows_processed"],
+        "created": result["created_count"],
+        "errors": result["error_count"],
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(result["rows_processed"] / elapsed, 1) if elapsed > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def use_benchmark_database():
+    """Point DATABASE_URL at BENCHMARK_DATABASE_URL; must run before config is imported"""
+    from sqlalchemy.engine import make_url
+    url = os.getenv("BENCHMARK_DATABASE_URL")
+    if not url:
+        raise SystemExit("Set BENCHMARK_DATABASE_URL to a dedicated benchmark database; `run` never uses DATABASE_URL")
+    database = make_url(url).database or ""
+    if "bench" not in database.lower():
+        raise SystemExit(
+            f"Refusing to benchmark against database {database!r}: "
+            "the BENCHMARK_DATABASE_URL database name must contain 'bench'"
+        )
+    os.environ["DATABASE_URL"] = url
+    # An explicit async URL would still point at the service database
+    os.environ["DB_ASYNC_URL"] = ""
+    return database
+
+def reset_tables():
+    from sqlalchemy import text
+    from databaseconnection import engine
+    with engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {', '.join(BENCHMARK_TABLES)} RESTART IDENTITY"))
+    logger.warning(f"Emptied {', '.join(BENCHMARK_TABLES)}")
+
+def run(args):
+    database = use_benchmark_database()
+    stub = None
+    if args.llm == "stub":
+        # Before anything imports the ollama client, which reads OLLAMA_HOST once
+        stub = start_stub_ollama(args.llm_latency_ms)
+        os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    from config import config
+    from databaseconnection import initialize_db
+    from databasemaintenance import verify_embedding_dimension
+    from servicesregistry import registry
+    from servicesexplanations import explanation_queue
+    from servicesaudit import screening_audit_writer
+    from servicesvectorindex import vector_mirror
+
+    from servicesembedding import create_embedding_generator
+
+    registry.set_embedding_generator(create_embedding_generator(args.embedding))
+    generator = registry.get_embedding_generator()
+    initialize_db()
+    verify_embedding_dimension(generator.embedding_size)
+    if args.reset:
+        reset_tables()
+
+    manifest_path = os.path.join(args.data, "manifest.json")
+    manifest = json.load(open(manifest_path)) if os.path.exists(manifest_path) else None
+    run_id = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    names = SyntheticNames(args.seed)
+    results = {
+        "meta": {
+            **git_revision(),
+            "run_id": run_id,
+            "started_at": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding": generator.model_version,
+            "llm": f"stub ({args.llm_latency_ms}ms)" if stub else "ollama",
+            "database": database,
+            "dataset": manifest,
+            "settings": settings_snapshot(config),
+        },
+        "phases": {},
+    }
+
+    phases = results["phases"]
+    try:
+        if not args.skip_load:
+            print("Loading the watchlist...")
+            phases["ingest"] = load_watchlist(os.path.join(args.data, "watchlist.csv"), generator)
+
+        # Same background services as the API's startup hook
+        registry.get_llm_analyzer().warmup()
+        if config.LLM_EXPLANATION_MODE == "async":
+            explanation_queue.start()
+        if config.SCREENING_ENGINE == "memory":
+            vector_mirror.start()
+        if config.SCREENING_AUDIT_WRITE_BEHIND:
+            screening_audit_writer.start()
+
+        if args.queries != 0:
+            print("Screening customers...")
+            phases["screening"] = screen_customers(
+                os.path.join(args.data, "customers.csv"), args.queries, args.concurrency, args.top_k
+            )
+        if args.updates:
+            print("Creating and updating watchlist entities...")
+            phases["watchlist_update"] = update_entities(args.updates, run_id, names)
+        if args.upload_rows:
+            print("Uploading a watchlist file...")
+            phases["upload"] = upload_watchlist(args.upload_rows, run_id, names)
+    finally:
+        explanation_queue.stop()
+        screening_audit_writer.stop()
+        vector_mirror.stop()
+        registry.shutdown()
+        if stub:
+            stub.shutdown()
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    with open(args.output, "w") as handle:
+        json.dump(results, handle, indent=2, default=str)
+    print_summary(results)
+    print(f"Results written to {args.output}")
+
+# The single-stage vector query screening used before lexical candidates and reranking; benchmark baseline
+VECTOR_ONLY_CANDIDATES_SQL = (
+    "SELECT DISTINCT ON (entity_id) entity_id, distance FROM ("
+    "  (SELECT id AS entity_id, name_embedding <=> CAST(:embedding AS vector) AS distance FROM watchlist_entities "
+    "   ORDER BY name_embedding <=> CAST(:embedding AS vector) LIMIT :limit)"
+    "  UNION ALL "
+    "  (SELECT watchlist_entity_id, alias_embedding <=> CAST(:embedding AS vector) FROM watchlist_aliases "
+    "   ORDER BY alias_embedding <=> CAST(:embedding AS vector) LIMIT :alias_limit)"
+    ") AS probes WHERE distance < :max_distance ORDER BY entity_id, distance"
+)
+
+def benchmark_candidate_search(sample_size: int = 200, seed: int = 42) -> dict:
+    """Latency and recall of two-stage search against the vector-only baseline.
+
+    Queries are sampled watchlist names with one spelling change each; a query
+    counts as recalled when its source entity is among the matches. Embedding
+    time is excluded from both plans.
+    """
+    from sqlalchemy import func, select, text
+    from config import config
+    from databaseconnection import SessionLocal
+    from databasemaintenance import apply_search_params
+    from databasemodels import WatchlistEntity, vector_param
+    from servicesregistry import registry
+    from servicesscreening import MATCH_THRESHOLD, search_candidates
+
+    rng = np.random.default_rng(seed)
+    db = SessionLocal()
+    try:
+        sample = db.execute(
+            select(WatchlistEntity.id, WatchlistEntity.name)
+            .where(WatchlistEntity.name_embedding.isnot(None))
+            # Repeatable for a given seed and watchlist
+            .order_by(func.md5(func.concat(WatchlistEntity.id, f":{seed}")))
+            .limit(sample_size)
+        ).fetchall()
+        if not sample:
+            raise RuntimeError("watchlist_entities has no embeddings to sample")
+        queries = [perturb_name(row.name, rng) for row in sample]
+        embeddings = registry.get_embedding_generator().generate_embeddings(queries)
+
+        timings = {"vector_only": [], "two_stage": []}
+        recalled = {"vector_only": 0, "two_stage": 0}
+        returned = {"vector_only": 0, "two_stage": 0}
+        for source, query, embedding in zip(sample, queries, embeddings):
+            apply_search_params(db)
+            start = time.perf_counter()
+            found = [
+                row.entity_id for row in db.execute(text(VECTOR_ONLY_CANDIDATES_SQL), {
+                    "embedding": vector_param(embedding),
+                    "max_distance": 1 - MATCH_THRESHOLD,
+                    "limit": config.SCREENING_CANDIDATE_LIMIT,
+                    "alias_limit": config.SCREENING_ALIAS_CANDIDATE_LIMIT,
+                })
+            ]
+            timings["vector_only"].append(time.perf_counter() - start)
+            recalled["vector_only"] += source.id in found
+            returned["vector_only"] += len(found)
+            db.rollback()
+
+            start = time.perf_counter()
+            found = [entity.id for entity, _ in search_candidates(db, [query], [embedding])[0][0]]
+            timings["two_stage"].append(time.perf_counter() - start)
+            recalled["two_stage"] += source.id in found
+            returned["two_stage"] += len(found)
+            db.rollback()
+    finally:
+        db.close()
+
+    result = {"queries": len(sample), "engine": config.SCREENING_ENGINE}
+    for plan, times in timings.items():
+        result[plan] = {
+            "recall": recalled[plan] / len(sample),
+            "mean_matches": returned[plan] / len(sample),
+            "p50_ms": float(np.percentile(times, 50) * 1000),
+            "p95_ms": float(np.percentile(times, 95) * 1000),
+        }
+    return result
+
+def benchmark_vector_transport(iterations: int = 2000, round_trips: int = 500, seed: int = 42) -> dict:
+    """Cost of sending an embedding as a decimal text literal (the old .tolist() / ','.join path) vs pgvector binary.
+
+    Measures client-side serialization time and peak allocation per vector,
+    then round trips of the same parameter through CAST(... AS vector).
+    """
+    import tracemalloc
+    from sqlalchemy import text
+    from config import config
+    from databaseconnection import SessionLocal
+    from databasemodels import vector_param
+
+    rng = np.random.default_rng(seed)
+    embedding = rng.standard_normal(config.EMBEDDING_SIZE).astype(np.float32)
+    encoders = {
+        "text": lambda vector: "[" + ",".join(map(str, vector.tolist())) + "]",
+        "binary": lambda vector: vector_param(vector).to_binary(),
+    }
+
+    result = {"dimensions": config.EMBEDDING_SIZE, "iterations": iterations, "round_trips": round_trips}
+    for transport, encode in encoders.items():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            payload = encode(embedding)
+        encode_seconds = time.perf_counter() - start
+        tracemalloc.start()
+        encode(embedding)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result[transport] = {
+            "encode_us": encode_seconds / iterations * 1e6,
+            "payload_bytes": len(payload),
+            "peak_alloc_bytes": peak,
+        }
+
+    statement = text("SELECT vector_dims(CAST(:embedding AS vector))")
+    params = {"text": lambda vector: encoders["text"](vector), "binary": vector_param}
+    with SessionLocal() as db:
+        for transport, param in params.items():
+            db.execute(statement, {"embedding": param(embedding)})  # warm up the connection and plan
+            start = time.perf_counter()
+            for _ in range(round_trips):
+                db.execute(statement, {"embedding": param(embedding)}).scalar_one()
+            result[transport]["round_trip_us"] = (time.perf_counter() - start) / round_trips * 1e6
+    return result
+
+def embedding_worker(args):
+    """Runs in the child process started by embedding(): one backend, result as JSON on stdout"""
+    from servicesembedding import benchmark_embedding_backend
+    names = SyntheticNames(args.seed)
+    texts = [names.name() for _ in range(args.texts)]
+    result = benchmark_embedding_backend(args.backend, texts, single_calls=args.single_calls)
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+def embedding(args):
+    """Cold start, single-text latency and batch throughput of each embedding backend, each in a fresh process"""
+    from config import config
+    results = {
+        "meta": {
+            **git_revision(),
+            "started_at": datetime.datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_model": config.EMBEDDING_MODEL,
+            "texts": args.texts,
+        },
+        "phases": {"embedding": {}},
+    }
+    for backend in args.backends:
+        print(f"Benchmarking {backend}...")
+        child = subprocess.run(
+            [
+                sys.executable, os.path.abspath(__file__), "embedding-worker", "--backend", backend,
+                "--texts", str(args.texts), "--single-calls", str(args.single_calls), "--seed", str(args.seed),
+            ],
+            capture_output=True, text=True
+        )
+        if child.returncode != 0:
+            print(f"{backend} failed:\n{child.stderr.strip()}")
+            continue
+        results["phases"]["embedding"][backend] = json.loads(child.stdout.strip().splitlines()[-1])
+    if not results["phases"]["embedding"]:
+        return 1
+    results["peak_rss_mb"] = max(metrics["peak_rss_mb"] for metrics in results["phases"]["embedding"].values())
+    with open(args.output, "w") as handle:
+        json.dump(results, handle, indent=2)
+    print_summary(results)
+    print(f"Results written to {args.output}")
+
+def print_summary(results):
+    for phase, metrics in results["phases"].items():
+        print(f"{phase}:")
+        for metric, value in flatten(metrics).items():
+            print(f"  {metric}: {value}")
+    print(f"peak RSS: {results['peak_rss_mb']} MB")
+
+def flatten(metrics: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+def metric_direction(metric: str):
+    """1 when higher is better, -1 when lower is better, None for counts that aren't judged"""
+    name = metric.rsplit(".", 1)[-1]
+    if name.endswith(("per_second", "recall", "top1_rate")) or metric.startswith("screening.recall_by_variant."):
+        return 1
+    if name.endswith(("_ms", "_seconds", "_mb", "unknown_match_rate")):
+        return -1
+    return None
+
+def compare(args):
+    """Print metric changes between two result files; exits 1 when a judged metric got worse beyond --tolerance"""
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.current) as handle:
+        current = json.load(handle)
+    before = flatten(baseline["phases"])
+    after = flatten(current["phases"])
+    before["peak_rss_mb"], after["peak_rss_mb"] = baseline["peak_rss_mb"], current["peak_rss_mb"]
+
+    print(f"baseline {baseline['meta'].get('commit')} vs current {current['meta'].get('commit')}")
+    regressions = []
+    for metric in sorted(set(before) & set(after)):
+        old, new = before[metric], after[metric]
+        direction = metric_direction(metric)
+        if direction is None or not isinstance(old, (int, float)) or not isinstance(new, (int, float)):
+            continue
+        change = (new - old) / abs(old) * 100 if old else 0.0
+        regressed = direction * change < -args.tolerance
+        if regressed:
+            regressions.append(metric)
+        print(f"  {metric}: {old} -> {new} ({change:+.1f}%){'  REGRESSION' if regressed else ''}")
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.tolerance}%")
+        return 1
+    print(f"No regressions beyond {args.tolerance}%")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screening and ingestion benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    gen = subparsers.add_parser("generate", help="Generate a synthetic watchlist and customer set with known matches")
+    gen.add_argument("--entities", type=int, default=10000, help="Watchlist size (10k to 5M)")
+    gen.add_argument("--customers", type=int, default=1000)
+    gen.add_argument("--match-rate", type=float, default=0.5, help="Share of customers derived from an entity")
+    gen.add_argument("--seed", type=int, default=42)
+    gen.add_argument("--out", default="bench_data")
+    gen.set_defaults(func=generate)
+
+    bench = subparsers.add_parser("run", help="Load the data set and benchmark screening, updates and uploads")
+    bench.add_argument("--data", default="bench_data", help="Directory written by `generate`")
+    bench.add_argument("--output", default="benchmark_results.json")
+    bench.add_argument("--reset", action="store_true", help="Empty the watchlist and screening tables first")
+    bench.add_argument("--skip-load", action="store_true", help="Reuse the watchlist already in the database")
+    bench.add_argument("--embedding", choices=list(EMBEDDING_BACKEND_NAMES), default="hashing",
+                       help="Embedding backend; hashing is a deterministic model-free stand-in")
+    bench.add_argument("--llm", choices=["stub", "ollama"], default="stub", help="Stub Ollama server or OLLAMA_HOST")
+    bench.add_argument("--llm-latency-ms", type=float, default=50, help="Stub Ollama response delay")
+    bench.add_argument("--queries", type=int, default=None, help="Customers screened (default: all, 0 skips)")
+    bench.add_argument("--concurrency", type=int, default=4)
+    bench.add_argument("--top-k", type=int, default=None)
+    bench.add_argument("--updates", type=int, default=200, help="Entities created then updated one at a time")
+    bench.add_argument("--upload-rows", type=int, default=2000, help="Rows in the /watchlist/upload file")
+    bench.add_argument("--seed", type=int, default=7, help="Seed for the update and upload entities")
+    bench.set_defaults(func=run)
+
+    embed = subparsers.add_parser("embedding", help="Benchmark embedding backends (cold start, latency, throughput)")
+    embed.add_argument("--backends", nargs="+", choices=list(EMBEDDING_BACKEND_NAMES),
+                       default=["sentence-transformers", "onnx", "onnx-int8"])
+    embed.add_argument("--texts", type=int, default=2000, help="Synthetic names encoded in the batch pass")
+    embed.add_argument("--single-calls", type=int, default=200, help="Names encoded one at a time")
+    embed.add_argument("--seed", type=int, default=11)
+    embed.add_argument("--output", default="embedding_benchmark.json")
+    embed.set_defaults(func=embedding)
+
+    worker = subparsers.add_parser("embedding-worker", help=argparse.SUPPRESS)
+    worker.add_argument("--backend", required=True)
+    worker.add_argument("--texts", type=int, required=True)
+    worker.add_argument("--single-calls", type=int, required=True)
+    worker.add_argument("--seed", type=int, required=True)
+    worker.set_defaults(func=embedding_worker)
+
+    diff = subparsers.add_parser("compare", help="Compare two result files")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--tolerance", type=float, default=10.0, help="Allowed change in percent")
+    diff.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,18 +13,147 @@ class Config:
     DB_NAME = os.getenv("PGDATABASE", "wlmscreening_db")
     DB_URL = os.getenv("DATABASE_URL", 
                       f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+    # asyncpg URL for the async engine; defaults to DB_URL with the postgresql+asyncpg driver
+    DB_ASYNC_URL = os.getenv("DB_ASYNC_URL", "")
+    # Connection pool, per engine (sync and async): size it against concurrent requests plus worker threads
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # Prepared statements cached per asyncpg connection; set 0 behind pgbouncer in transaction mode
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
 
     # API settings
     API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
     SCREENING_API_URL = f"{API_BASE_URL}/screening/realtime"
     UPLOAD_API_URL = f"{API_BASE_URL}/watchlist/upload"
+    UPLOAD_JOBS_API_URL = f"{API_BASE_URL}/watchlist/jobs"
+    STATS_API_URL = f"{API_BASE_URL}/stats"
+    # How long the Streamlit UI reuses a /stats response across reruns
+    UI_STATS_CACHE_SECONDS = int(os.getenv("UI_STATS_CACHE_SECONDS", "30"))
+    # The UI stops polling an upload job whose progress hasn't moved for this long, or that exceeds the max wait
+    UI_UPLOAD_STALL_SECONDS = int(os.getenv("UI_UPLOAD_STALL_SECONDS", "300"))
+    UI_UPLOAD_MAX_WAIT_SECONDS = int(os.getenv("UI_UPLOAD_MAX_WAIT_SECONDS", "7200"))
 
     # LLM settings
     OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
+    # "sync" generates the explanation before responding; "async" queues it and returns explanation_status=pending
+    LLM_EXPLANATION_MODE = os.getenv("LLM_EXPLANATION_MODE", "sync").lower()
+    LLM_QUEUE_WORKERS = int(os.getenv("LLM_QUEUE_WORKERS", "2"))
+    LLM_QUEUE_MAX_SIZE = int(os.getenv("LLM_QUEUE_MAX_SIZE", "500"))
+    LLM_EXPLANATION_STREAM_TIMEOUT = float(os.getenv("LLM_EXPLANATION_STREAM_TIMEOUT", "120"))
+    # Deterministic decoding (temperature 0, fixed seed) makes cached explanations reproducible for audit
+    LLM_DETERMINISTIC = os.getenv("LLM_DETERMINISTIC", "false").lower() == "true"
+    LLM_SEED = int(os.getenv("LLM_SEED", "42"))
+
+    # LLM explanation cache: in-process LRU plus a persistent Postgres tier
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PERSISTENT = os.getenv("LLM_CACHE_PERSISTENT", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+    LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
 
     # Embedding settings
-    EMBEDDING_SIZE = 1536  # Matches the vector column size in database
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    # Must equal the model's output dimension (384 for all-MiniLM-L6-v2); sizes the vector column
+    EMBEDDING_SIZE = int(os.getenv("EMBEDDING_SIZE", "384"))
+    EMBEDDING_ENCODE_BATCH_SIZE = int(os.getenv("EMBEDDING_ENCODE_BATCH_SIZE", "64"))
+    # "sentence-transformers" (PyTorch), "onnx" or "onnx-int8" (ONNX Runtime, see manage.py export-onnx), "hashing"
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+    EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "onnx_model")
+    EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))  # 0 lets ONNX Runtime decide
+
+    # Vector index (pgvector ANN) settings: "hnsw", "ivfflat" or "none"
+    VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "hnsw").lower()
+    HNSW_M = int(os.getenv("HNSW_M", "16"))
+    HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+    IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", "1000"))
+    IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", "10"))
+    VECTOR_INDEX_MAINTENANCE_WORK_MEM = os.getenv("VECTOR_INDEX_MAINTENANCE_WORK_MEM", "")  # e.g. "2GB" for big builds
+    # Filtered ANN searches: iterative index scans on pgvector >= 0.8 (keep scanning until enough rows pass
+    # the filters); older versions widen ef_search/probes by this factor instead
+    VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN", "true").lower() == "true"
+    VECTOR_FILTERED_SEARCH_FACTOR = int(os.getenv("VECTOR_FILTERED_SEARCH_FACTOR", "4"))
+
+    # Number of nearest neighbours fetched before the similarity threshold is applied
+    SCREENING_CANDIDATE_LIMIT = int(os.getenv("SCREENING_CANDIDATE_LIMIT", "50"))
+    # Matches returned (and stored) per screened name; requests may ask for up to SCREENING_MAX_TOP_K
+    SCREENING_DEFAULT_TOP_K = int(os.getenv("SCREENING_DEFAULT_TOP_K", "10"))
+    SCREENING_MAX_TOP_K = int(os.getenv("SCREENING_MAX_TOP_K", "100"))
+    # Alias vectors probed per query; higher than the entity limit since one entity can own several close aliases
+    SCREENING_ALIAS_CANDIDATE_LIMIT = int(os.getenv("SCREENING_ALIAS_CANDIDATE_LIMIT", "100"))
+    # Lexical first stage: entities sharing n-gram/phonetic keys with the query join the vector candidates
+    LEXICAL_CANDIDATE_LIMIT = int(os.getenv("LEXICAL_CANDIDATE_LIMIT", "50"))
+    LEXICAL_MIN_KEY_OVERLAP = float(os.getenv("LEXICAL_MIN_KEY_OVERLAP", "0.3"))
+    # Keys shared by more entities than this are too common to narrow anything down and are skipped
+    LEXICAL_MAX_KEY_POSTINGS = int(os.getenv("LEXICAL_MAX_KEY_POSTINGS", "5000"))
+    # DOB filter: a watchlist entity matches when one of its birth years is within this many years of the customer's
+    SCREENING_DOB_YEAR_TOLERANCE = int(os.getenv("SCREENING_DOB_YEAR_TOLERANCE", "1"))
+    # Second stage: match_score = weighted embedding cosine + edit-distance similarity of the best name/alias
+    MATCH_SCORE_VECTOR_WEIGHT = float(os.getenv("MATCH_SCORE_VECTOR_WEIGHT", "0.6"))
+    MATCH_SCORE_EDIT_WEIGHT = float(os.getenv("MATCH_SCORE_EDIT_WEIGHT", "0.4"))
+    MATCH_SCORE_THRESHOLD = float(os.getenv("MATCH_SCORE_THRESHOLD", "0.7"))
+
+    # "postgres" searches with pgvector; "memory" searches an in-process mirror of the watchlist vectors
+    SCREENING_ENGINE = os.getenv("SCREENING_ENGINE", "postgres").lower()
+    VECTOR_SNAPSHOT_DIR = os.getenv("VECTOR_SNAPSHOT_DIR", "vector_snapshot")
+    VECTOR_MIRROR_REFRESH_SECONDS = float(os.getenv("VECTOR_MIRROR_REFRESH_SECONDS", "5"))
+    VECTOR_MIRROR_REFRESH_OVERLAP_SECONDS = float(os.getenv("VECTOR_MIRROR_REFRESH_OVERLAP_SECONDS", "30"))
+    VECTOR_MIRROR_MAX_OVERLAY = int(os.getenv("VECTOR_MIRROR_MAX_OVERLAY", "100000"))
+
+    # Realtime screening audit rows: written in the request (one round trip) or, with write-behind, buffered and
+    # flushed in batches by a background thread (ids are reserved from the sequence in blocks); flushed on shutdown
+    SCREENING_AUDIT_WRITE_BEHIND = os.getenv("SCREENING_AUDIT_WRITE_BEHIND", "false").lower() == "true"
+    SCREENING_AUDIT_FLUSH_SECONDS = float(os.getenv("SCREENING_AUDIT_FLUSH_SECONDS", "1"))
+    SCREENING_AUDIT_FLUSH_BATCH = int(os.getenv("SCREENING_AUDIT_FLUSH_BATCH", "500"))
+    SCREENING_AUDIT_MAX_PENDING = int(os.getenv("SCREENING_AUDIT_MAX_PENDING", "10000"))
+    SCREENING_ID_BLOCK_SIZE = int(os.getenv("SCREENING_ID_BLOCK_SIZE", "100"))
+    # JSON lines file receiving buffered screenings the database rejects, so one bad row can't block the rest
+    SCREENING_AUDIT_DEAD_LETTER_PATH = os.getenv("SCREENING_AUDIT_DEAD_LETTER_PATH", "audit_dead_letter.jsonl")
+
+    # Observability: stage histograms are always exported on /metrics; Server-Timing response headers are optional
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+    # Opt-in pyinstrument profiling (pip install pyinstrument): a sampled share of requests is profiled and
+    # reports of those slower than PROFILER_SLOW_MS are written to PROFILER_OUTPUT_DIR
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+    PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0.01"))
+    PROFILER_SLOW_MS = float(os.getenv("PROFILER_SLOW_MS", "1000"))
+    PROFILER_INTERVAL_SECONDS = float(os.getenv("PROFILER_INTERVAL_SECONDS", "0.001"))
+    PROFILER_OUTPUT_DIR = os.getenv("PROFILER_OUTPUT_DIR", "profiles")
+
+    # /stats counters: deltas are buffered in memory and upserted every STATS_FLUSH_SECONDS;
+    # responses are cached (with an ETag) for STATS_CACHE_TTL_SECONDS
+    STATS_FLUSH_SECONDS = float(os.getenv("STATS_FLUSH_SECONDS", "2"))
+    STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "5"))
+
+    # Batch screening: customers per embed/search/insert chunk
+    BATCH_SCREENING_CHUNK_SIZE = int(os.getenv("BATCH_SCREENING_CHUNK_SIZE", "1000"))
+
+    # Delta rescreening: screened customers' embeddings are kept so watchlist changes can be re-checked against them
+    CUSTOMER_EMBEDDINGS_ENABLED = os.getenv("CUSTOMER_EMBEDDINGS_ENABLED", "true").lower() == "true"
+    DELTA_RESCREEN_CHUNK_SIZE = int(os.getenv("DELTA_RESCREEN_CHUNK_SIZE", "50000"))
+    DELTA_RESCREEN_SETTLE_SECONDS = int(os.getenv("DELTA_RESCREEN_SETTLE_SECONDS", "60"))
+
+    # Bulk watchlist ingestion: rows per embed/COPY/merge chunk
+    INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+    INGEST_MAX_REPORTED_ERRORS = int(os.getenv("INGEST_MAX_REPORTED_ERRORS", "1000"))
+    # Background upload jobs
+    UPLOAD_JOB_WORKERS = int(os.getenv("UPLOAD_JOB_WORKERS", "2"))
+    UPLOAD_JOB_DIR = os.getenv("UPLOAD_JOB_DIR", "")  # defaults to the system temp dir
+    # Streamed request bodies are buffered in memory up to this size, then spill to a temp file
+    UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+
+    # Cache of screened-name embeddings; set EMBEDDING_CACHE_PATH to persist it (memory-mapped) across restarts
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+    EMBEDDING_CACHE_FLUSH_EVERY = int(os.getenv("EMBEDDING_CACHE_FLUSH_EVERY", "1000"))
+
+    # Micro-batching of concurrent screening embeddings
+    EMBEDDING_COALESCING_ENABLED = os.getenv("EMBEDDING_COALESCING_ENABLED", "true").lower() == "true"
+    EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
 
 # Instance of Config for easy import
 config = Config()
\ No newline at end of file
@@ -1,17 +1,169 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, make_url, exc, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from pgvector.psycopg import register_vector
+from pgvector.utils import Vector
+from psycopg.types import TypeInfo
 import os
+import threading
+import time
+import logging
 from databasemodels import Base
 from config import config
 
-# Use config for DB_URL
-engine = create_engine(config.DB_URL)
+logger = logging.getLogger(__name__)
+
+class PoolMetrics:
+    """Checkout counts and wait times of one connection pool"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def stats(self, pool) -> dict:
+        with self._lock:
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": config.DB_MAX_OVERFLOW,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_ms_mean": round(self.wait_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            }
+
+class _TimedPoolMixin:
+    """Times each checkout, including waiting for a free connection and opening a new one"""
+
+    metrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def _pool_options() -> dict:
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+
+def sync_database_url(url: str):
+    """DB_URL with the psycopg (3) driver unless it names a driver itself"""
+    url = make_url(url)
+    return url.set(drivername="postgresql+psycopg") if url.drivername == "postgresql" else url
+
+def async_database_url(url: str):
+    """DB_URL with the asyncpg driver; a set DB_ASYNC_URL wins"""
+    if config.DB_ASYNC_URL:
+        return make_url(config.DB_ASYNC_URL)
+    url = make_url(url).set(drivername="postgresql+asyncpg")
+    # SQLAlchemy's cache of asyncpg prepared statements (0 disables it, e.g. behind pgbouncer)
+    return url.update_query_dict({"prepared_statement_cache_size": str(config.DB_STATEMENT_CACHE_SIZE)})
+
+# Use config for DB_URL; used by bulk jobs, maintenance and threadpool handlers
+engine = create_engine(sync_database_url(config.DB_URL), poolclass=TimedQueuePool, **_pool_options())
+engine.pool.metrics = PoolMetrics("sync")
+
+@event.listens_for(engine, "connect")
+def _register_vector_types(dbapi_connection, connection_record):
+    """Send and receive vectors in pgvector's binary format: NumPy float32 arrays, no decimal strings"""
+    # Checked here: pgvector 0.3.0 raises a NameError instead of ProgrammingError for a missing type
+    if TypeInfo.fetch(dbapi_connection, "vector") is None:
+        # The extension doesn't exist yet; initialize_db() creates it and recycles the pool
+        logger.warning("vector type not found, connection opened without pgvector adapters")
+    else:
+        register_vector(dbapi_connection)
+    dbapi_connection.rollback()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# asyncpg engine for async route handlers, so queries don't block the event loop
+async_engine = create_async_engine(
+    async_database_url(config.DB_URL),
+    poolclass=TimedAsyncQueuePool,
+    connect_args={"statement_cache_size": config.DB_STATEMENT_CACHE_SIZE},
+    **_pool_options()
+)
+async_engine.pool.metrics = PoolMetrics("async")
+
+async def _register_vector_codec(connection):
+    # Only the vector type: pgvector.asyncpg.register_vector also needs halfvec/sparsevec (pgvector >= 0.7)
+    if await connection.fetchval("SELECT to_regtype('vector')") is None:
+        logger.warning("vector type not found, connection opened without pgvector codecs")
+        return
+    await connection.set_type_codec(
+        "vector", encoder=Vector._to_db_binary, decoder=Vector._from_db_binary, format="binary"
+    )
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _register_async_vector_types(dbapi_connection, connection_record):
+    dbapi_connection.run_async(_register_vector_codec)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def pool_stats() -> dict:
+    """Pool occupancy and checkout metrics for both engines"""
+    return {
+        "sync": engine.pool.metrics.stats(engine.pool),
+        "async": async_engine.pool.metrics.stats(async_engine.pool),
+    }
+
 def initialize_db():
-    """Initialize database by creating all tables"""
+    """Initialize database by creating all tables and the vector index"""
+    # Imported here because databasemaintenance depends on this module's engine
+    from databasemaintenance import (
+        ensure_vector_index, ensure_schema_upgrades, ensure_schema_functions, ensure_stats_counters,
+        normalize_stored_nationalities
+    )
     try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        # Connections opened before the extension existed have no vector adapters
+        engine.dispose()
+        ensure_schema_functions()
         Base.metadata.create_all(bind=engine)
+        ensure_schema_upgrades()
+        ensure_vector_index()
+        ensure_stats_counters()
+        normalize_stored_nationalities()
         print("Database initialized successfully")
     except Exception as e:
         print(f"Error initializing database: {e}")
@@ -23,4 +175,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
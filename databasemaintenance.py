@@ -0,0 +1,407 @@
+from sqlalchemy import text, select, func
+import numpy as np
+import functools
+import re
+import time
+import logging
+from databaseconnection import engine
+from databasemodels import WatchlistEntity, vector_param
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Columns added after the first release. create_all() only creates missing tables,
+# so existing databases pick these up through ADD COLUMN IF NOT EXISTS.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE screening_records ADD COLUMN IF NOT EXISTS explanation_status VARCHAR",
+    "ALTER TABLE watchlist_entities ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT clock_timestamp()",
+    "CREATE INDEX IF NOT EXISTS ix_watchlist_entities_updated_at ON watchlist_entities (updated_at)",
+    "ALTER TABLE watchlist_entities ADD COLUMN IF NOT EXISTS name_hash VARCHAR",
+    "ALTER TABLE watchlist_entities ADD COLUMN IF NOT EXISTS embedding_model VARCHAR",
+    "ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS skipped_unchanged INTEGER DEFAULT 0",
+    # Structured screening filters (the ADD COLUMN rewrites the table once to compute birth_years)
+    "ALTER TABLE watchlist_entities ADD COLUMN IF NOT EXISTS birth_years INTEGER[] "
+    "GENERATED ALWAYS AS (watchlist_birth_years(dates_of_birth)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_watchlist_entities_birth_years ON watchlist_entities USING gin (birth_years)",
+    "CREATE INDEX IF NOT EXISTS ix_watchlist_entities_nationality ON watchlist_entities (nationality)",
+    "CREATE INDEX IF NOT EXISTS ix_watchlist_entities_risk_category ON watchlist_entities (risk_category)",
+    "CREATE INDEX IF NOT EXISTS ix_watchlist_entities_entity_type ON watchlist_entities (entity_type)",
+]
+
+# SQL functions referenced by table definitions; created before create_all()
+SCHEMA_FUNCTIONS = [
+    "CREATE OR REPLACE FUNCTION watchlist_birth_years(dates date[]) RETURNS integer[] "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE AS "
+    "$$ SELECT array_agg(DISTINCT extract(year FROM d)::integer) FROM unnest(dates) AS d $$",
+]
+
+def ensure_schema_functions():
+    with engine.begin() as conn:
+        for statement in SCHEMA_FUNCTIONS:
+            conn.execute(text(statement))
+
+def ensure_schema_upgrades():
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPGRADES:
+            conn.execute(text(statement))
+
+def get_vector_column_dimension(table="watchlist_entities", column="name_embedding"):
+    """Return the declared dimension of a pgvector column, or None if the table/column doesn't exist"""
+    with engine.connect() as conn:
+        row = conn.execute(
+            text(
+                "SELECT a.atttypmod FROM pg_attribute a "
+                "WHERE a.attrelid = to_regclass(:table) AND a.attname = :column AND NOT a.attisdropped"
+            ),
+            {"table": table, "column": column}
+        ).fetchone()
+    if row is None or row.atttypmod < 0:
+        return None
+    return row.atttypmod
+
+def verify_embedding_dimension(model_dimension: int):
+    """Fail fast if the loaded model and the watchlist vector column disagree on dimension"""
+    if config.EMBEDDING_SIZE != model_dimension:
+        raise RuntimeError(
+            f"Embedding dimension mismatch: model {config.EMBEDDING_MODEL} produces {model_dimension} dims "
+            f"but EMBEDDING_SIZE is {config.EMBEDDING_SIZE}"
+        )
+    column_dimension = get_vector_column_dimension()
+    if column_dimension is None:
+        return
+    if column_dimension != model_dimension:
+        raise RuntimeError(
+            f"Embedding dimension mismatch: model produces {model_dimension} dims but "
+            f"watchlist_entities.name_embedding is vector({column_dimension}). "
+            f"Set EMBEDDING_SIZE={model_dimension} and run `python manage.py migrate-embedding-dim --dim {model_dimension}`"
+        )
+    logger.info(f"Embedding dimension check passed ({model_dimension} dims)")
+
+def shrink_embedding_dimension(target_dimension: int, force: bool = False):
+    """Truncate zero-padded vectors in place, e.g. vector(1536) -> vector(384), without re-embedding"""
+    current_dimension = get_vector_column_dimension()
+    if current_dimension is None:
+        raise RuntimeError("watchlist_entities.name_embedding does not exist")
+    if current_dimension == target_dimension:
+        logger.info(f"name_embedding is already vector({target_dimension}), nothing to do")
+        return 0
+    if current_dimension < target_dimension:
+        raise RuntimeError(f"Cannot grow vector({current_dimension}) to vector({target_dimension}) without re-embedding")
+
+    with engine.begin() as conn:
+        if not force:
+            # Only padding may be dropped: refuse if any row carries data beyond the target dimension
+            non_zero_tail = conn.execute(
+                text(
+                    "SELECT count(*) FROM watchlist_entities "
+                    "WHERE name_embedding IS NOT NULL AND EXISTS ("
+                    f"  SELECT 1 FROM unnest((name_embedding::real[])[{target_dimension + 1}:{current_dimension}]) AS v "
+                    "  WHERE v <> 0"
+                    ")"
+                )
+            ).scalar()
+            if non_zero_tail:
+                raise RuntimeError(
+                    f"{non_zero_tail} rows have non-zero values past dimension {target_dimension}; "
+                    "they were not produced by zero-padding. Re-embed them or pass --force"
+                )
+        conn.execute(
+            text(
+                f"ALTER TABLE watchlist_entities ALTER COLUMN name_embedding TYPE vector({target_dimension}) "
+                f"USING ((name_embedding::real[])[1:{target_dimension}])::vector({target_dimension})"
+            )
+        )
+        row_count = conn.execute(text("SELECT count(*) FROM watchlist_entities")).scalar()
+    logger.info(f"Shrunk name_embedding from vector({current_dimension}) to vector({target_dimension}) for {row_count} rows")
+    return row_count
+
+VECTOR_INDEX_TYPES = ("hnsw", "ivfflat")
+
+# Every vector column screening searches; each gets an ANN index of the configured type
+VECTOR_COLUMNS = [
+    ("watchlist_entities", "name_embedding"),
+    ("watchlist_aliases", "alias_embedding"),
+]
+
+def vector_index_name(table, column, index_type):
+    return f"ix_{table}_{column}_{index_type}"
+
+def _vector_index_ddl(table, column, index_type, concurrently=False):
+    name = vector_index_name(table, column, index_type)
+    concurrently_sql = "CONCURRENTLY " if concurrently else ""
+    if index_type == "hnsw":
+        options = f"m = {config.HNSW_M}, ef_construction = {config.HNSW_EF_CONSTRUCTION}"
+    else:
+        options = f"lists = {config.IVFFLAT_LISTS}"
+    # vector_cosine_ops matches the <=> operator used by the screening query
+    return (
+        f"CREATE INDEX {concurrently_sql}IF NOT EXISTS {name} ON {table} "
+        f"USING {index_type} ({column} vector_cosine_ops) WITH ({options})"
+    )
+
+def get_vector_indexes():
+    """Return {index_name: definition} for ANN indexes on the screened vector columns"""
+    names = [
+        vector_index_name(table, column, index_type)
+        for table, column in VECTOR_COLUMNS
+        for index_type in VECTOR_INDEX_TYPES
+    ]
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT indexname, indexdef FROM pg_indexes WHERE indexname = ANY(:names)"),
+            {"names": names}
+        ).fetchall()
+    return {row.indexname: row.indexdef for row in rows}
+
+def create_vector_index(index_type=None, rebuild=False, concurrently=True, columns=None):
+    """Create (or rebuild) the ANN index on each vector column and drop the other type"""
+    index_type = (index_type or config.VECTOR_INDEX_TYPE).lower()
+    if index_type not in VECTOR_INDEX_TYPES:
+        raise ValueError(f"Unsupported vector index type: {index_type}")
+
+    existing = get_vector_indexes()
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        concurrently_sql = "CONCURRENTLY " if concurrently else ""
+        if config.VECTOR_INDEX_MAINTENANCE_WORK_MEM:
+            conn.execute(text("SELECT set_config('maintenance_work_mem', :mem, false)"),
+                         {"mem": config.VECTOR_INDEX_MAINTENANCE_WORK_MEM})
+        for table, column in columns or VECTOR_COLUMNS:
+            for other_type in VECTOR_INDEX_TYPES:
+                other_name = vector_index_name(table, column, other_type)
+                if other_name in existing and (other_type != index_type or rebuild):
+                    logger.info(f"Dropping vector index {other_name}")
+                    conn.execute(text(f"DROP INDEX {concurrently_sql}IF EXISTS {other_name}"))
+            start = time.perf_counter()
+            conn.execute(text(_vector_index_ddl(table, column, index_type, concurrently=concurrently)))
+            logger.info(
+                f"Vector index {vector_index_name(table, column, index_type)} ready in {time.perf_counter() - start:.1f}s"
+            )
+
+def drop_vector_indexes():
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table, column in VECTOR_COLUMNS:
+            for index_type in VECTOR_INDEX_TYPES:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {vector_index_name(table, column, index_type)}"))
+    logger.info("Dropped vector indexes")
+
+def reindex_vector_index():
+    """Rebuild the current ANN indexes without blocking writes, e.g. after a large reload"""
+    existing = get_vector_indexes()
+    if not existing:
+        raise RuntimeError("No vector index exists; run create-vector-index first")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in existing:
+            start = time.perf_counter()
+            conn.execute(text(f"REINDEX INDEX CONCURRENTLY {name}"))
+            logger.info(f"Reindexed {name} in {time.perf_counter() - start:.1f}s")
+
+def ensure_vector_index():
+    """Called from initialize_db: create the configured index on any column missing it"""
+    if config.VECTOR_INDEX_TYPE == "none":
+        return
+    # Also caches the version before request handlers need it
+    version = pgvector_version()
+    if config.VECTOR_ITERATIVE_SCAN and not iterative_scan_enabled():
+        logger.warning(
+            f"pgvector {'.'.join(map(str, version or ()))} has no iterative index scans; filtered searches "
+            f"widen the ANN search by VECTOR_FILTERED_SEARCH_FACTOR={config.VECTOR_FILTERED_SEARCH_FACTOR} instead"
+        )
+    existing = get_vector_indexes()
+    missing = []
+    for table, column in VECTOR_COLUMNS:
+        if vector_index_name(table, column, config.VECTOR_INDEX_TYPE) in existing:
+            continue
+        if config.VECTOR_INDEX_TYPE == "ivfflat":
+            # IVFFlat centroids are trained on existing rows; building on an empty table gives poor recall
+            with engine.connect() as conn:
+                row_count = conn.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+            if row_count < config.IVFFLAT_LISTS * 10:
+                logger.info(
+                    f"Deferring IVFFlat index on {table}: {row_count} rows is too few for {config.IVFFLAT_LISTS} lists. "
+                    "Run `python manage.py create-vector-index` after loading the watchlist"
+                )
+                continue
+        missing.append((table, column))
+    if missing:
+        create_vector_index(config.VECTOR_INDEX_TYPE, concurrently=False, columns=missing)
+
+# Counters recomputed from the tables; watchlist entities carry no creation date and count on the baseline day
+STATS_SEED_SQL = text(
+    "INSERT INTO stats_counters (name, day, value) "
+    "SELECT 'screenings', CAST(screening_time AS date), count(*) FROM screening_records GROUP BY 2 "
+    "UNION ALL "
+    "SELECT 'matched_screenings', CAST(screening_time AS date), count(*) FROM screening_records WHERE matched GROUP BY 2 "
+    "UNION ALL "
+    "SELECT 'watchlist_entities', DATE '1970-01-01', count(*) FROM watchlist_entities"
+)
+
+def rebuild_stats_counters() -> dict:
+    """Recount the /stats counters with one scan per table, e.g. to repair drift after a crashed process"""
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        # Holds off counter flushes from running processes until the recount commits
+        conn.execute(text("LOCK TABLE stats_counters IN EXCLUSIVE MODE"))
+        conn.execute(text("DELETE FROM stats_counters"))
+        conn.execute(STATS_SEED_SQL)
+        totals = dict(conn.execute(text("SELECT name, sum(value) FROM stats_counters GROUP BY name")).fetchall())
+    logger.info(f"Rebuilt stats counters in {time.perf_counter() - start:.1f}s")
+    return {name: int(total) for name, total in totals.items()}
+
+def ensure_stats_counters():
+    """Called from initialize_db: seed the counters once, for a database that has data but no counters yet"""
+    with engine.connect() as conn:
+        seeded = conn.execute(text("SELECT EXISTS (SELECT 1 FROM stats_counters)")).scalar()
+    if not seeded:
+        rebuild_stats_counters()
+
+# Entities whose nationality changes are logged so the delta rescreen revisits them
+RENORMALIZE_NATIONALITY_SQL = text(
+    "WITH changed AS ("
+    "  UPDATE watchlist_entities SET nationality = CAST(:code AS varchar), updated_at = clock_timestamp() "
+    "  WHERE nationality = :value RETURNING id"
+    ") "
+    "INSERT INTO watchlist_changes (watchlist_entity_id, change_type) SELECT id, 'updated' FROM changed"
+)
+
+def normalize_stored_nationalities() -> dict:
+    """Called from initialize_db: rewrite stored nationalities to the codes normalize_country() now produces.
+
+    Spellings that don't resolve are cleared, so they no longer exclude
+    entities through the exact-match nationality filter.
+    """
+    from servicesnormalization import normalize_country
+    with engine.connect() as conn:
+        values = conn.execute(
+            text("SELECT DISTINCT nationality FROM watchlist_entities WHERE nationality IS NOT NULL")
+        ).scalars().all()
+    changes = {value: normalize_country(value) for value in values if normalize_country(value) != value}
+    if changes:
+        with engine.begin() as conn:
+            for value, code in changes.items():
+                conn.execute(RENORMALIZE_NATIONALITY_SQL, {"value": value, "code": code})
+        logger.info(f"Normalized {len(changes)} stored nationality spellings: {changes}")
+    return changes
+
+# Largest hnsw.ef_search pgvector accepts
+HNSW_MAX_EF_SEARCH = 1000
+
+@functools.lru_cache(maxsize=1)
+def pgvector_version():
+    """Installed pgvector version as a tuple, e.g. (0, 8, 0); None without the extension. Read once per process"""
+    with engine.connect() as conn:
+        version = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+    return tuple(int(part) for part in re.findall(r"\d+", version)) if version else None
+
+def iterative_scan_enabled() -> bool:
+    """Whether filtered ANN searches use iterative index scans (pgvector >= 0.8)"""
+    return config.VECTOR_ITERATIVE_SCAN and (pgvector_version() or ()) >= (0, 8)
+
+def search_params_statement(ef_search=None, probes=None, filtered=False):
+    """(statement, params) setting ANN query-time parameters for the current transaction, or None.
+
+    The index returns ef_search (HNSW) or probes lists' worth (IVFFlat) of
+    neighbours and WHERE filters apply afterwards, so a selective filter can
+    leave fewer than LIMIT rows. Iterative scans keep fetching until enough
+    rows pass; without them a filtered search widens ef_search/probes.
+    """
+    if config.VECTOR_INDEX_TYPE == "hnsw":
+        setting, value, ceiling = "hnsw.ef_search", ef_search or config.HNSW_EF_SEARCH, HNSW_MAX_EF_SEARCH
+    elif config.VECTOR_INDEX_TYPE == "ivfflat":
+        setting, value, ceiling = "ivfflat.probes", probes or config.IVFFLAT_PROBES, config.IVFFLAT_LISTS
+    else:
+        return None
+    settings = {setting: value}
+    if iterative_scan_enabled():
+        # Relaxed order is enough: candidate queries re-sort by distance themselves
+        settings[f"{config.VECTOR_INDEX_TYPE}.iterative_scan"] = "relaxed_order"
+    elif filtered:
+        settings[setting] = max(value, min(value * config.VECTOR_FILTERED_SEARCH_FACTOR, ceiling))
+    columns = ", ".join(f"set_config('{name}', :p{i}, true)" for i, name in enumerate(settings))
+    return text(f"SELECT {columns}"), {f"p{i}": str(value) for i, value in enumerate(settings.values())}
+
+def apply_search_params(db, ef_search=None, probes=None, filtered=False):
+    """Set ANN query-time parameters for the current transaction"""
+    statement = search_params_statement(ef_search, probes, filtered)
+    if statement is not None:
+        db.execute(*statement)
+
+async def apply_search_params_async(db, ef_search=None, probes=None, filtered=False):
+    """apply_search_params() for an AsyncSession"""
+    statement = search_params_statement(ef_search, probes, filtered)
+    if statement is not None:
+        await db.execute(*statement)
+
+NEAREST_NEIGHBOURS_QUERY = text(
+    "SELECT id FROM watchlist_entities "
+    "ORDER BY name_embedding <=> CAST(:embedding AS vector) "
+    "LIMIT :k"
+)
+
+# Nearest neighbours among the entities sharing the sampled entity's risk category and nationality,
+# the kind of selective filter screening requests apply
+FILTERED_NEAREST_NEIGHBOURS_QUERY = text(
+    "SELECT id FROM watchlist_entities "
+    "WHERE risk_category IS NOT DISTINCT FROM :risk_category AND nationality IS NOT DISTINCT FROM :nationality "
+    "ORDER BY name_embedding <=> CAST(:embedding AS vector) "
+    "LIMIT :k"
+)
+
+def check_recall(sample_size=100, k=10, ef_search=None, probes=None, noise=0.02, seed=42, filtered=False):
+    """Compare ANN top-k against an exact sequential scan for sampled watchlist vectors.
+
+    Query vectors are stored embeddings with a little Gaussian noise, so the
+    source row isn't trivially the only neighbour. With filtered=True both
+    plans only look at entities sharing the source's risk category and
+    nationality. Returns recall@k and latency percentiles for both plans.
+    """
+    rng = np.random.default_rng(seed)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(WatchlistEntity.name_embedding, WatchlistEntity.risk_category, WatchlistEntity.nationality)
+            .where(WatchlistEntity.name_embedding.isnot(None))
+            .order_by(func.random())
+            .limit(sample_size)
+        ).fetchall()
+    if not rows:
+        raise RuntimeError("watchlist_entities has no embeddings to sample")
+
+    query = FILTERED_NEAREST_NEIGHBOURS_QUERY if filtered else NEAREST_NEIGHBOURS_QUERY
+    recalls, ann_times, exact_times = [], [], []
+    for row in rows:
+        query_vector = np.asarray(row.name_embedding, dtype=np.float32)
+        query_vector = query_vector + rng.normal(0, noise, size=query_vector.shape).astype(np.float32)
+        params = {"embedding": vector_param(query_vector), "k": k}
+        if filtered:
+            params.update(risk_category=row.risk_category, nationality=row.nationality)
+
+        with engine.begin() as conn:
+            apply_search_params(conn, ef_search=ef_search, probes=probes, filtered=filtered)
+            start = time.perf_counter()
+            ann_ids = {r.id for r in conn.execute(query, params)}
+            ann_times.append(time.perf_counter() - start)
+
+        with engine.begin() as conn:
+            conn.execute(text("SET LOCAL enable_indexscan = off"))
+            conn.execute(text("SET LOCAL enable_bitmapscan = off"))
+            start = time.perf_counter()
+            exact_ids = {r.id for r in conn.execute(query, params)}
+            exact_times.append(time.perf_counter() - start)
+
+        if exact_ids:
+            recalls.append(len(ann_ids & exact_ids) / len(exact_ids))
+
+    return {
+        "index_type": config.VECTOR_INDEX_TYPE,
+        "ef_search": ef_search or config.HNSW_EF_SEARCH,
+        "probes": probes or config.IVFFLAT_PROBES,
+        "k": k,
+        "filtered": filtered,
+        "iterative_scan": iterative_scan_enabled(),
+        "queries": len(recalls),
+        "recall": float(np.mean(recalls)) if recalls else 0.0,
+        "ann_p50_ms": float(np.percentile(ann_times, 50) * 1000),
+        "ann_p95_ms": float(np.percentile(ann_times, 95) * 1000),
+        "exact_p50_ms": float(np.percentile(exact_times, 50) * 1000),
+        "exact_p95_ms": float(np.percentile(exact_times, 95) * 1000),
+    }
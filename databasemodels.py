@@ -1,23 +1,69 @@
-from sqlalchemy import Column, Integer, String, DateTime, Date, Float, ARRAY, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Date, Float, ARRAY, Boolean, JSON, Computed, Index, func
 from sqlalchemy.ext.declarative import declarative_base
 from pgvector.sqlalchemy import Vector
+from pgvector.utils import Vector as VectorValue
+from config import config
+import numpy as np
 
 Base = declarative_base()
 
+class BinaryVector(Vector):
+    """pgvector column bound as a float32 NumPy array, which the drivers' pgvector adapters send in binary.
+
+    pgvector's own type formats every value as a decimal string literal.
+    """
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None:
+                return None
+            value = np.asarray(value, dtype=np.float32)
+            if self.dim is not None and value.shape != (self.dim,):
+                raise ValueError(f"expected {self.dim} dimensions, not {value.shape[-1]}")
+            return value
+        return process
+
+def vector_param(embedding):
+    """Bind value for a vector in raw SQL (also inside vector[] arrays), sent in binary by either driver"""
+    return VectorValue(np.asarray(embedding, dtype=np.float32))
+
 class WatchlistEntity(Base):
     __tablename__ = "watchlist_entities"
     id = Column(Integer, primary_key=True)
     unique_id = Column(String, unique=True, nullable=False)
     name = Column(String, nullable=False)
-    name_embedding = Column(Vector(1536))  # Size matches the model's output
+    name_embedding = Column(BinaryVector(config.EMBEDDING_SIZE))  # Size matches the model's output
+    name_hash = Column(String)  # sha256 of the normalized name and aliases the embeddings were computed from
+    embedding_model = Column(String)  # model version that produced name_embedding
     aliases = Column(ARRAY(String))
     dates_of_birth = Column(ARRAY(Date))
+    # Derived by Postgres for the DOB year-window filter (GIN-indexed)
+    birth_years = Column(ARRAY(Integer), Computed("watchlist_birth_years(dates_of_birth)", persisted=True))
     gender = Column(String)
-    nationality = Column(String)
+    nationality = Column(String, index=True)  # ISO 3166 alpha-2 code; NULL when unrecognised
     country_of_residence = Column(String)
-    risk_category = Column(String)
+    risk_category = Column(String, index=True)
     additional_info = Column(String)
-    entity_type = Column(String, default="INDIVIDUAL")
+    entity_type = Column(String, default="INDIVIDUAL", index=True)
+    # Database clock, so the in-memory vector mirror can fetch rows changed since its snapshot
+    updated_at = Column(DateTime, server_default=func.clock_timestamp(), onupdate=func.clock_timestamp(), index=True)
+
+    __table_args__ = (Index("ix_watchlist_entities_birth_years", "birth_years", postgresql_using="gin"),)
+
+class WatchlistAlias(Base):
+    """One embedding per alias, searched alongside the primary name vectors"""
+    __tablename__ = "watchlist_aliases"
+    id = Column(Integer, primary_key=True)
+    watchlist_entity_id = Column(Integer, nullable=False, index=True)
+    alias = Column(String, nullable=False)
+    alias_embedding = Column(BinaryVector(config.EMBEDDING_SIZE), nullable=False)
+
+class WatchlistNameKey(Base):
+    """Lexical inverted index: one row per (character trigram or phonetic code, entity) over names and aliases"""
+    __tablename__ = "watchlist_name_keys"
+    key = Column(String, primary_key=True)
+    watchlist_entity_id = Column(Integer, primary_key=True, index=True)
 
 class ScreeningRecord(Base):
     __tablename__ = "screening_records"
@@ -29,6 +75,7 @@ class ScreeningRecord(Base):
     matched = Column(Boolean, default=False)
     risk_score = Column(Float)
     llm_explanation = Column(String)
+    explanation_status = Column(String)  # pending, completed, failed, not_required, not_requested (batch)
 
 class ScreeningMatch(Base):
     __tablename__ = "screening_matches"
@@ -36,4 +83,70 @@ class ScreeningMatch(Base):
     screening_id = Column(Integer, nullable=False)
     watchlist_entity_id = Column(Integer, nullable=False)
     match_type = Column(String, nullable=False)
-    match_score = Column(Float, nullable=False)
\ No newline at end of file
+    match_score = Column(Float, nullable=False)
+
+class UploadJob(Base):
+    __tablename__ = "upload_jobs"
+    id = Column(String, primary_key=True)
+    status = Column(String, nullable=False)  # queued, running, completed, failed
+    filename = Column(String)
+    total_rows = Column(Integer)
+    rows_done = Column(Integer, default=0)
+    created_count = Column(Integer, default=0)
+    updated_count = Column(Integer, default=0)
+    skipped_unchanged = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+    errors = Column(JSON)  # Per-row errors, capped at INGEST_MAX_REPORTED_ERRORS
+    message = Column(String)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class LLMExplanationCache(Base):
+    __tablename__ = "llm_explanation_cache"
+    cache_key = Column(String, primary_key=True)  # sha256 of normalized prompt inputs + model + options
+    model = Column(String, nullable=False)
+    entity_unique_id = Column(String, index=True)
+    explanation = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+class WatchlistChange(Base):
+    """Changelog of created/updated watchlist entities, consumed by the delta rescreen job"""
+    __tablename__ = "watchlist_changes"
+    id = Column(Integer, primary_key=True)
+    watchlist_entity_id = Column(Integer, nullable=False, index=True)
+    change_type = Column(String, nullable=False)  # created, updated
+    changed_at = Column(DateTime, nullable=False, server_default=func.clock_timestamp())
+
+class CustomerEmbedding(Base):
+    """Latest name embedding of every screened customer, so watchlist changes can be rescreened without re-embedding"""
+    __tablename__ = "customer_embeddings"
+    id = Column(Integer, primary_key=True)
+    customer_key = Column(String, unique=True, nullable=False)  # customer_id when known, else normalized name + DOB
+    customer_id = Column(String)
+    name = Column(String, nullable=False)
+    date_of_birth = Column(Date)
+    name_embedding = Column(BinaryVector(config.EMBEDDING_SIZE), nullable=False)
+    last_screening_id = Column(Integer)
+    updated_at = Column(DateTime, nullable=False)
+
+class StatsCounter(Base):
+    """Counters behind /stats, one row per counter and UTC day, so the endpoint never counts whole tables"""
+    __tablename__ = "stats_counters"
+    name = Column(String, primary_key=True)  # screenings, matched_screenings, watchlist_entities, ...
+    day = Column(Date, primary_key=True)  # 1970-01-01 holds totals seeded from rows that carry no date
+    value = Column(BigInteger, nullable=False, default=0)
+
+class DeltaRescreenRun(Base):
+    __tablename__ = "delta_rescreen_runs"
+    id = Column(Integer, primary_key=True)
+    status = Column(String, nullable=False)  # running, completed, failed
+    from_change_id = Column(Integer, nullable=False)  # exclusive
+    to_change_id = Column(Integer, nullable=False)  # inclusive
+    changed_entities = Column(Integer, default=0)
+    customers_scanned = Column(Integer, default=0)
+    customers_matched = Column(Integer, default=0)
+    matches_created = Column(Integer, default=0)
+    message = Column(String)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
\ No newline at end of file
@@ -1,12 +1,30 @@
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request
-from databaseconnection import get_db, initialize_db
-from servicesscreening import ScreeningService
+from databaseconnection import get_db, get_async_db, initialize_db, SessionLocal, AsyncSessionLocal, async_engine, pool_stats
+from servicesscreening import AsyncScreeningService, resolve_limits
+from servicesingestion import WatchlistIngestor, detect_format, iter_upload_rows
+from servicesregistry import registry
+from servicesjobs import upload_jobs
+from servicesexplanations import explanation_queue
+from servicesaudit import screening_audit_writer
+from servicescache import explanation_cache
+from servicesvectorindex import vector_mirror
+from servicesbatchscreening import BatchScreener
+from databasemaintenance import verify_embedding_dimension
+from servicesstats import stats_counters
+from servicesmetrics import HTTP_REQUEST_SECONDS, request_profiler, start_request_timing, server_timing_header
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import datetime
 import logging
-import csv
-from io import StringIO
 import json
+import tempfile
+import shutil
+import asyncio
+import time
+from config import config
 
 app = FastAPI()
 logging.basicConfig(level=logging.INFO)
@@ -15,9 +33,93 @@ logger = logging.getLogger(__name__)
 @app.on_event("startup")
 def startup_event():
     initialize_db()
+    registry.warmup()
+    verify_embedding_dimension(registry.get_embedding_generator().embedding_size)
+    if config.LLM_EXPLANATION_MODE == "async":
+        explanation_queue.start()
+    if config.SCREENING_ENGINE == "memory":
+        vector_mirror.start()
+    if config.SCREENING_AUDIT_WRITE_BEHIND:
+        screening_audit_writer.start()
+    stats_counters.start()
 
-def get_screening_service(db: Session = Depends(get_db)):
-    return ScreeningService(db)
+@app.on_event("shutdown")
+def shutdown_event():
+    upload_jobs.shutdown()
+    explanation_queue.stop()
+    # After the explanation workers, which may still flush buffered screenings
+    screening_audit_writer.stop()
+    stats_counters.stop()
+    vector_mirror.stop()
+    registry.shutdown()
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """Request latency histogram, optional Server-Timing header and sampled slow-request profiling"""
+    timings = start_request_timing() if config.SERVER_TIMING_ENABLED else None
+    profiler = request_profiler.start()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        # The route template, not the raw path, so ids don't explode the label set
+        HTTP_REQUEST_SECONDS.labels(request.method, route.path if route else "unmatched", str(status)).observe(elapsed)
+        if profiler is not None:
+            request_profiler.finish(profiler, request.method, request.url.path, elapsed)
+    if timings is not None:
+        response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus exposition of this worker process's histograms and counters"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/stats")
+def get_stats(request: Request):
+    """Dashboard counters from stats_counters; cached for STATS_CACHE_TTL_SECONDS and revalidated by ETag"""
+    stats, etag = stats_counters.snapshot()
+    headers = {"ETag": etag, "Cache-Control": f"max-age={int(config.STATS_CACHE_TTL_SECONDS)}"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(",") if tag.strip()):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=stats, headers=headers)
+
+@app.get("/health/live")
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {
+        "llm_explanations": explanation_cache.stats(),
+        "query_embeddings": registry.status()["embedding_cache"],
+    }
+
+@app.get("/db/pool/stats")
+def db_pool_stats():
+    return pool_stats()
+
+@app.get("/health/ready")
+def readiness():
+    status = registry.status()
+    if config.SCREENING_ENGINE == "memory":
+        status["vector_mirror"] = vector_mirror.stats()
+        status["ready"] = status["ready"] and vector_mirror.is_loaded()
+    if screening_audit_writer.is_running():
+        status["screening_audit"] = screening_audit_writer.stats()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+def get_async_screening_service(db: AsyncSession = Depends(get_async_db)):
+    return AsyncScreeningService(db)
 
 class CustomJSONEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -28,79 +130,62 @@ class CustomJSONEncoder(json.JSONEncoder):
                 return None
         return super().default(obj)
 
+async def spool_request_body(request: Request):
+    """Copy the request body into a temp file without holding more than UPLOAD_SPOOL_MAX_BYTES in memory"""
+    spool = tempfile.SpooledTemporaryFile(max_size=config.UPLOAD_SPOOL_MAX_BYTES)
+    async for chunk in request.stream():
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
 @app.post("/watchlist/upload")
-async def upload_watchlist(file: UploadFile = File(None), request: Request = None, service: ScreeningService = Depends(get_screening_service)):
+async def upload_watchlist(file: UploadFile = File(None), request: Request = None, db: Session = Depends(get_db)):
     try:
-        watchlist = []
+        ingestor = WatchlistIngestor(db, registry.get_embedding_generator())
+        content_type = request.headers.get("content-type", "")
         if file:
-            contents = await file.read()
-            csv_str = contents.decode("utf-8")
-            csv_file = StringIO(csv_str)
-            reader = csv.DictReader(csv_file)
-            for row in reader:
-                row = {k: (v if v != "" else None) for k, v in row.items()}
-                watchlist.append(row)
-            logger.info(f"Processed CSV with {len(watchlist)} entries")
-        else:
+            # The multipart body is already spooled to a temp file; parse it lazily in bounded chunks
+            file_format = detect_format(file.filename, file.content_type)
+            logger.info(f"Streaming {file_format} upload {file.filename}")
+            result = await run_in_threadpool(ingestor.ingest, iter_upload_rows(file.file, file_format))
+        elif content_type.startswith("multipart/"):
+            raise HTTPException(status_code=400, detail="Multipart upload must contain a 'file' field")
+        elif content_type.startswith("application/json"):
             try:
                 data = await request.json()
-                logger.info(f"Received JSON: {data}")
                 watchlist = data.get("watchlist", [])
+                logger.info(f"Received JSON watchlist with {len(watchlist)} entries")
                 if not watchlist:
                     raise HTTPException(status_code=400, detail="JSON must contain 'watchlist' key with non-empty list")
             except json.JSONDecodeError:
                 raise HTTPException(status_code=400, detail="Invalid JSON format")
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"JSON parsing error: {str(e)}")
                 raise HTTPException(status_code=400, detail=f"JSON processing failed: {str(e)}")
+            result = await run_in_threadpool(ingestor.ingest, watchlist)
+        else:
+            # Raw text/csv or application/x-ndjson body: stream it to a spool file, then parse line by line
+            file_format = detect_format(content_type=content_type)
+            spool = await spool_request_body(request)
+            try:
+                result = await run_in_threadpool(ingestor.ingest, iter_upload_rows(spool, file_format))
+            finally:
+                spool.close()
 
-        if not watchlist:
+        if result["rows_processed"] == 0:
             raise HTTPException(status_code=400, detail="No valid data provided")
 
-        processed_count = 0
-        updated_count = 0
-        error_count = 0
-        
-        for entry in watchlist:
-            try:
-                dob = None
-                if entry.get("date_of_birth"):
-                    try:
-                        dob = datetime.datetime.strptime(entry["date_of_birth"], "%Y-%m-%d").date()
-                        dob = [dob]
-                    except ValueError:
-                        logger.warning(f"Invalid date_of_birth for {entry['unique_id']}: {entry['date_of_birth']}")
-                        error_count += 1
-                        continue
-
-                # Try to add or update the entity
-                result = service.add_or_update_watchlist_entity(
-                    unique_id=entry["unique_id"],
-                    name=entry["name"],
-                    dates_of_birth=dob,
-                    risk_category=entry.get("risk_category")
-                )
-                
-                if result == "created":
-                    processed_count += 1
-                elif result == "updated":
-                    updated_count += 1
-                    
-            except Exception as e:
-                logger.error(f"Error processing entry {entry.get('unique_id', 'unknown')}: {str(e)}")
-                error_count += 1
-                continue
-
-        response_message = f"Watchlist processed successfully. Created: {processed_count}, Updated: {updated_count}"
-        if error_count > 0:
-            response_message += f", Errors: {error_count}"
-            
-        return json.loads(json.dumps({
-            "created_count": processed_count,
-            "updated_count": updated_count,
-            "error_count": error_count,
-            "message": response_message
-        }, cls=CustomJSONEncoder))
+        response_message = (
+            f"Watchlist processed successfully. Created: {result['created_count']}, Updated: {result['updated_count']}, "
+            f"Unchanged: {result['skipped_unchanged']}"
+        )
+        if result["error_count"] > 0:
+            response_message += f", Errors: {result['error_count']}"
+        result["message"] = response_message
+
+        return json.loads(json.dumps(result, cls=CustomJSONEncoder))
         
     except HTTPException as he:
         raise he
@@ -108,8 +193,52 @@ async def upload_watchlist(file: UploadFile = File(None), request: Request = Non
         logger.error(f"Error uploading watchlist: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def save_upload_for_job(file: UploadFile, request: Request) -> str:
+    """Persist an upload to UPLOAD_JOB_DIR so a background job can read it after the request ends"""
+    handle = tempfile.NamedTemporaryFile(prefix="watchlist-", suffix=".upload", delete=False,
+                                         dir=config.UPLOAD_JOB_DIR or None)
+    try:
+        if file:
+            await run_in_threadpool(shutil.copyfileobj, file.file, handle, 1024 * 1024)
+        else:
+            async for chunk in request.stream():
+                handle.write(chunk)
+    finally:
+        handle.close()
+    return handle.name
+
+@app.post("/watchlist/jobs", status_code=202)
+async def submit_watchlist_job(
+    file: UploadFile = File(None),
+    request: Request = None,
+    chunk_size: int = None,
+    continue_on_error: bool = True
+):
+    content_type = request.headers.get("content-type", "")
+    if not file and content_type.startswith("multipart/"):
+        raise HTTPException(status_code=400, detail="Multipart upload must contain a 'file' field")
+    filename = file.filename if file else None
+    file_format = detect_format(filename, file.content_type if file else content_type)
+    try:
+        path = await save_upload_for_job(file, request)
+        job_id = await run_in_threadpool(
+            upload_jobs.submit, path, filename, file_format,
+            chunk_size=chunk_size, continue_on_error=continue_on_error
+        )
+    except Exception as e:
+        logger.error(f"Error submitting watchlist job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/watchlist/jobs/{job_id}")
+def get_watchlist_job(job_id: str):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.post("/screening/realtime")
-async def screen_realtime(data: dict, service: ScreeningService = Depends(get_screening_service)):
+async def screen_realtime(data: dict, service: AsyncScreeningService = Depends(get_async_screening_service)):
     try:
         name = data.get("name")
         dob_data = data.get("date_of_birth")
@@ -120,8 +249,88 @@ async def screen_realtime(data: dict, service: ScreeningService = Depends(get_sc
                 month=dob_data["month"],
                 day=dob_data["day"]
             )
-        result = service.screen_entity(name=name, date_of_birth=date_of_birth)
+        risk_categories = data.get("risk_categories") or data.get("risk_category")
+        if isinstance(risk_categories, str):
+            risk_categories = [risk_categories]
+        # The UI sends its "Risk Level Threshold" slider as risk_threshold
+        threshold = data.get("threshold", data.get("risk_threshold"))
+        try:
+            top_k, threshold = resolve_limits(data.get("top_k"), threshold)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        result = await service.screen_entity(
+            name=name, date_of_birth=date_of_birth,
+            nationality=data.get("nationality"), risk_categories=risk_categories, entity_type=data.get("entity_type"),
+            top_k=top_k, threshold=threshold
+        )
         return json.loads(json.dumps(result, cls=CustomJSONEncoder))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error screening entity: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/screening/batch")
+async def screen_batch(file: UploadFile = File(None), request: Request = None, chunk_size: int = None,
+                       top_k: int = None, threshold: float = None):
+    """Screen a CSV/JSONL customer file (name, date_of_birth, optional customer_id); results stream back as NDJSON"""
+    try:
+        top_k, threshold = resolve_limits(top_k, threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    content_type = request.headers.get("content-type", "")
+    if not file and content_type.startswith("multipart/"):
+        raise HTTPException(status_code=400, detail="Multipart upload must contain a 'file' field")
+    file_format = detect_format(file.filename if file else None, file.content_type if file else content_type)
+    if file:
+        # Copied because the multipart file is closed once the endpoint returns, before streaming ends
+        spool = tempfile.SpooledTemporaryFile(max_size=config.UPLOAD_SPOOL_MAX_BYTES)
+        await run_in_threadpool(shutil.copyfileobj, file.file, spool, 1024 * 1024)
+        spool.seek(0)
+    else:
+        spool = await spool_request_body(request)
+
+    def results():
+        db = SessionLocal()
+        try:
+            screener = BatchScreener(
+                db, registry.get_embedding_generator(), chunk_size=chunk_size, top_k=top_k, threshold=threshold
+            )
+            for result in screener.screen(iter_upload_rows(spool, file_format)):
+                yield json.dumps(result, cls=CustomJSONEncoder) + "\n"
+        finally:
+            db.close()
+            spool.close()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.get("/screening/{screening_id}/explanation")
+async def get_screening_explanation(
+    screening_id: int, service: AsyncScreeningService = Depends(get_async_screening_service)
+):
+    explanation = await service.get_explanation(screening_id)
+    if explanation is None:
+        raise HTTPException(status_code=404, detail="Screening not found")
+    return explanation
+
+async def _load_explanation(screening_id: int):
+    async with AsyncSessionLocal() as db:
+        return await AsyncScreeningService(db).get_explanation(screening_id)
+
+@app.get("/screening/{screening_id}/explanation/stream")
+async def stream_screening_explanation(screening_id: int):
+    """Server-sent events: emits the explanation once it is no longer pending"""
+    explanation = await _load_explanation(screening_id)
+    if explanation is None:
+        raise HTTPException(status_code=404, detail="Screening not found")
+
+    async def events(explanation):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.LLM_EXPLANATION_STREAM_TIMEOUT
+        while explanation["status"] == "pending" and loop.time() < deadline:
+            yield ": waiting\n\n"
+            await asyncio.sleep(0.5)
+            explanation = await _load_explanation(screening_id)
+        yield f"event: explanation\ndata: {json.dumps(explanation)}\n\n"
+
+    return StreamingResponse(events(explanation), media_type="text/event-stream")
\ No newline at end of file
@@ -0,0 +1,318 @@
+import argparse
+import logging
+import sys
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def migrate_embedding_dim(args):
+    from databasemaintenance import shrink_embedding_dimension
+    from config import config
+    shrink_embedding_dimension(args.dim or config.EMBEDDING_SIZE, force=args.force)
+
+def create_vector_index(args):
+    from databasemaintenance import create_vector_index
+    create_vector_index(args.type, rebuild=args.rebuild, concurrently=not args.blocking)
+
+def drop_vector_index(args):
+    from databasemaintenance import drop_vector_indexes
+    drop_vector_indexes()
+
+def reindex_vector_index(args):
+    from databasemaintenance import reindex_vector_index
+    reindex_vector_index()
+
+def vector_index_status(args):
+    from databasemaintenance import get_vector_indexes
+    indexes = get_vector_indexes()
+    if not indexes:
+        print("No vector indexes on watchlist name or alias embeddings")
+    for name, definition in indexes.items():
+        print(f"{name}: {definition}")
+
+def recall_check(args):
+    from databasemaintenance import check_recall
+    # Sweep every requested ef_search/probes value so the speed/recall curve can be compared
+    for ef_search in args.ef_search or [None]:
+        for probes in args.probes or [None]:
+            result = check_recall(
+                sample_size=args.sample, k=args.k, ef_search=ef_search, probes=probes, filtered=args.filtered
+            )
+            print(
+                f"{result['index_type']} ef_search={result['ef_search']} probes={result['probes']} "
+                f"filtered={result['filtered']} iterative_scan={result['iterative_scan']} "
+                f"k={result['k']} queries={result['queries']}: recall={result['recall']:.4f} "
+                f"ann p50/p95={result['ann_p50_ms']:.2f}/{result['ann_p95_ms']:.2f}ms "
+                f"exact p50/p95={result['exact_p50_ms']:.2f}/{result['exact_p95_ms']:.2f}ms"
+            )
+
+def ingest_watchlist(args):
+    from databaseconnection import SessionLocal
+    from servicesingestion import WatchlistIngestor, detect_format, iter_upload_rows
+    from servicesregistry import registry
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as f:
+            rows = iter_upload_rows(f, detect_format(args.path))
+            ingestor = WatchlistIngestor(db, registry.get_embedding_generator(), chunk_size=args.chunk_size)
+            result = ingestor.ingest(rows)
+    finally:
+        db.close()
+    print(
+        f"Created: {result['created_count']}, Updated: {result['updated_count']}, "
+        f"Unchanged: {result['skipped_unchanged']}, Errors: {result['error_count']} "
+        f"({result['rows_per_second']} rows/s)"
+    )
+
+def build_vector_snapshot(args):
+    from servicesvectorindex import build_vector_snapshot as build
+    result = build(args.dir)
+    print(f"Snapshot of {result['count']} entities written in {result['elapsed_seconds']:.2f}s (watermark {result['watermark']})")
+
+def screen_batch(args):
+    import json
+    from databaseconnection import SessionLocal
+    from servicesbatchscreening import BatchScreener
+    from servicesingestion import detect_format, iter_upload_rows
+    from servicesregistry import registry
+    from servicesvectorindex import vector_mirror
+    from config import config
+    if config.SCREENING_ENGINE == "memory":
+        vector_mirror.start()
+    db = SessionLocal()
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        with open(args.path, "rb") as f:
+            screener = BatchScreener(
+                db, registry.get_embedding_generator(), chunk_size=args.chunk_size, top_k=args.top_k,
+                threshold=args.threshold
+            )
+            for result in screener.screen(iter_upload_rows(f, detect_format(args.path))):
+                output.write(json.dumps(result, default=str) + "\n")
+    finally:
+        db.close()
+        vector_mirror.stop()
+        if output is not sys.stdout:
+            output.close()
+    if args.output:
+        print(json.dumps(result["summary"]))
+
+def delta_rescreen(args):
+    from databaseconnection import SessionLocal
+    from servicesrescreen import DeltaRescreener
+    db = SessionLocal()
+    try:
+        result = DeltaRescreener(db, chunk_size=args.chunk_size).run(dry_run=args.dry_run)
+    finally:
+        db.close()
+    if result["to_change_id"] == result["from_change_id"]:
+        print("No watchlist changes since the last run")
+        return
+    print(
+        f"Changes {result['from_change_id'] + 1}..{result['to_change_id']}: {result['changed_entities']} entities "
+        f"against {result['customers_scanned']} customers, {result['customers_matched']} customers matched, "
+        f"{result['matches_created']} matches{' (dry run)' if args.dry_run else ''}"
+    )
+
+def build_name_index(args):
+    from serviceslexical import rebuild_name_index
+    result = rebuild_name_index(chunk_size=args.chunk_size)
+    print(f"Indexed {result['keys']} keys for {result['entities']} entities in {result['elapsed_seconds']:.2f}s")
+
+def rebuild_stats(args):
+    from databasemaintenance import rebuild_stats_counters
+    totals = rebuild_stats_counters()
+    print(", ".join(f"{name}={total}" for name, total in sorted(totals.items())) or "No counters")
+
+def benchmark_candidates(args):
+    from benchmark import benchmark_candidate_search
+    from servicesvectorindex import vector_mirror
+    from config import config
+    if config.SCREENING_ENGINE == "memory":
+        vector_mirror.start()
+    result = benchmark_candidate_search(sample_size=args.sample, seed=args.seed)
+    print(f"{result['queries']} misspelled queries ({result['engine']} engine):")
+    for plan in ("vector_only", "two_stage"):
+        stats = result[plan]
+        print(
+            f"  {plan}: recall={stats['recall']:.3f} mean matches={stats['mean_matches']:.2f} "
+            f"p50/p95={stats['p50_ms']:.2f}/{stats['p95_ms']:.2f}ms"
+        )
+
+def benchmark_transport(args):
+    from benchmark import benchmark_vector_transport
+    result = benchmark_vector_transport(iterations=args.iterations, round_trips=args.round_trips)
+    print(f"{result['dimensions']}-dim embedding, {result['iterations']} encodes, {result['round_trips']} round trips:")
+    for transport in ("text", "binary"):
+        stats = result[transport]
+        print(
+            f"  {transport}: encode={stats['encode_us']:.1f}us payload={stats['payload_bytes']}B "
+            f"peak alloc={stats['peak_alloc_bytes']}B round trip={stats['round_trip_us']:.1f}us"
+        )
+
+def export_onnx(args):
+    from servicesembedding import export_onnx_model
+    result = export_onnx_model(output_dir=args.output, quantize=not args.no_quantize, opset=args.opset)
+    sizes = ", ".join(f"{name} {size / 1e6:.1f}MB" for name, size in result["files"].items())
+    print(
+        f"Exported {result['model']} ({result['dimension']} dims, {result['pooling']} pooling) "
+        f"to {result['output_dir']} in {result['elapsed_seconds']:.1f}s: {sizes}"
+    )
+
+def check_embedding_parity(args):
+    import numpy as np
+    from servicesembedding import compare_embedding_backends
+    if args.names:
+        with open(args.names) as handle:
+            texts = [line.strip() for line in handle if line.strip()][:args.sample]
+    else:
+        from sqlalchemy import func, select
+        from databaseconnection import SessionLocal
+        from databasemodels import WatchlistEntity
+        from benchmark import perturb_name
+        with SessionLocal() as db:
+            names = db.scalars(
+                select(WatchlistEntity.name)
+                .order_by(func.md5(func.concat(WatchlistEntity.id, f":{args.seed}")))
+                .limit(args.sample)
+            ).all()
+        # Screening queries are rarely exact watchlist spellings
+        rng = np.random.default_rng(args.seed)
+        texts = names + [perturb_name(name, rng) for name in names]
+    if not texts:
+        raise RuntimeError("No names to compare; load a watchlist or pass --names")
+    result = compare_embedding_backends(texts, args.backend, reference=args.reference)
+    print(
+        f"{result['backend']} vs {result['reference']} on {result['texts']} names: "
+        f"min cosine={result['min_cosine']:.5f} p01={result['p01_cosine']:.5f} mean={result['mean_cosine']:.5f} "
+        f"nearest-neighbour agreement={result.get('nearest_neighbour_agreement', 1.0):.3f}"
+    )
+    # Dynamic int8 quantization costs a little accuracy; fp32 ONNX should match to rounding
+    min_cosine = args.min_cosine if args.min_cosine is not None else (0.98 if args.backend == "onnx-int8" else 0.999)
+    if result["min_cosine"] < min_cosine:
+        raise RuntimeError(
+            f"min cosine {result['min_cosine']:.5f} is below {min_cosine} "
+            f"(worst: {', '.join(result['worst'])})"
+        )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screening service administration commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser(
+        "migrate-embedding-dim",
+        help="Shrink zero-padded watchlist embeddings in place to the model's native dimension"
+    )
+    migrate.add_argument("--dim", type=int, default=None, help="Target dimension (default: EMBEDDING_SIZE)")
+    migrate.add_argument("--force", action="store_true", help="Truncate even if values past --dim are non-zero")
+    migrate.set_defaults(func=migrate_embedding_dim)
+
+    create_index = subparsers.add_parser("create-vector-index", help="Create the pgvector ANN index on watchlist names")
+    create_index.add_argument("--type", choices=["hnsw", "ivfflat"], default=None, help="Default: VECTOR_INDEX_TYPE")
+    create_index.add_argument("--rebuild", action="store_true", help="Drop and recreate with the current parameters")
+    create_index.add_argument("--blocking", action="store_true", help="Build without CONCURRENTLY (faster, blocks writes)")
+    create_index.set_defaults(func=create_vector_index)
+
+    subparsers.add_parser("drop-vector-index", help="Drop all ANN indexes on watchlist names") \
+        .set_defaults(func=drop_vector_index)
+    subparsers.add_parser("reindex-vector-index", help="Rebuild the ANN index concurrently") \
+        .set_defaults(func=reindex_vector_index)
+    subparsers.add_parser("vector-index-status", help="Show the ANN indexes on watchlist names") \
+        .set_defaults(func=vector_index_status)
+
+    recall = subparsers.add_parser("recall-check", help="Measure ANN recall@k against an exact scan")
+    recall.add_argument("--sample", type=int, default=100, help="Number of query vectors to sample")
+    recall.add_argument("--k", type=int, default=10)
+    recall.add_argument("--ef-search", type=int, nargs="*", help="HNSW ef_search values to sweep")
+    recall.add_argument("--probes", type=int, nargs="*", help="IVFFlat probes values to sweep")
+    recall.add_argument(
+        "--filtered", action="store_true",
+        help="Only search entities sharing the sampled entity's risk category and nationality"
+    )
+    recall.set_defaults(func=recall_check)
+
+    ingest = subparsers.add_parser("ingest", help="Bulk load a watchlist CSV or JSONL file")
+    ingest.add_argument("path")
+    ingest.add_argument("--chunk-size", type=int, default=None, help="Default: INGEST_CHUNK_SIZE")
+    ingest.set_defaults(func=ingest_watchlist)
+
+    snapshot = subparsers.add_parser(
+        "build-vector-snapshot",
+        help="Write the watchlist embeddings snapshot used by SCREENING_ENGINE=memory"
+    )
+    snapshot.add_argument("--dir", default=None, help="Default: VECTOR_SNAPSHOT_DIR")
+    snapshot.set_defaults(func=build_vector_snapshot)
+
+    batch = subparsers.add_parser("screen-batch", help="Screen a CSV or JSONL customer file, writing NDJSON results")
+    batch.add_argument("path")
+    batch.add_argument("--output", default=None, help="NDJSON results file (default: stdout)")
+    batch.add_argument("--chunk-size", type=int, default=None, help="Default: BATCH_SCREENING_CHUNK_SIZE")
+    batch.add_argument("--top-k", type=int, default=None, help="Matches kept per customer (default: SCREENING_DEFAULT_TOP_K)")
+    batch.add_argument("--threshold", type=float, default=None, help="Minimum match score (default: MATCH_SCORE_THRESHOLD)")
+    batch.set_defaults(func=screen_batch)
+
+    delta = subparsers.add_parser(
+        "delta-rescreen",
+        help="Re-screen stored customer embeddings against watchlist entities changed since the last run"
+    )
+    delta.add_argument("--chunk-size", type=int, default=None, help="Default: DELTA_RESCREEN_CHUNK_SIZE")
+    delta.add_argument("--dry-run", action="store_true", help="Report affected customers without writing screenings")
+    delta.set_defaults(func=delta_rescreen)
+
+    name_index = subparsers.add_parser(
+        "build-name-index",
+        help="Rebuild the lexical (trigram/phonetic) name index used for first-stage candidates"
+    )
+    name_index.add_argument("--chunk-size", type=int, default=10000)
+    name_index.set_defaults(func=build_name_index)
+
+    subparsers.add_parser("rebuild-stats", help="Recount the /stats counters from the screening and watchlist tables") \
+        .set_defaults(func=rebuild_stats)
+
+    benchmark = subparsers.add_parser(
+        "benchmark-candidates",
+        help="Compare latency and recall of two-stage candidate search with the vector-only query"
+    )
+    benchmark.add_argument("--sample", type=int, default=200, help="Number of watchlist names to misspell and search")
+    benchmark.add_argument("--seed", type=int, default=42)
+    benchmark.set_defaults(func=benchmark_candidates)
+
+    transport = subparsers.add_parser(
+        "benchmark-vector-transport",
+        help="Compare text-literal and binary serialization of embedding parameters"
+    )
+    transport.add_argument("--iterations", type=int, default=2000, help="Encodes timed per transport")
+    transport.add_argument("--round-trips", type=int, default=500, help="Queries timed per transport")
+    transport.set_defaults(func=benchmark_transport)
+
+    onnx = subparsers.add_parser(
+        "export-onnx",
+        help="Export EMBEDDING_MODEL to ONNX (plus an int8-quantized copy) for EMBEDDING_BACKEND=onnx/onnx-int8"
+    )
+    onnx.add_argument("--output", default=None, help="Default: EMBEDDING_ONNX_DIR")
+    onnx.add_argument("--no-quantize", action="store_true", help="Skip the int8 model")
+    onnx.add_argument("--opset", type=int, default=17)
+    onnx.set_defaults(func=export_onnx)
+
+    parity = subparsers.add_parser(
+        "check-embedding-parity",
+        help="Check an embedding backend's cosine agreement with the reference model; exits 1 below --min-cosine"
+    )
+    parity.add_argument("--backend", default="onnx")
+    parity.add_argument("--reference", default="sentence-transformers")
+    parity.add_argument("--names", default=None, help="File with one name per line (default: sample the watchlist)")
+    parity.add_argument("--sample", type=int, default=500, help="Names compared (watchlist samples add a misspelling each)")
+    parity.add_argument("--seed", type=int, default=42)
+    parity.add_argument("--min-cosine", type=float, default=None, help="Default: 0.98 for onnx-int8, else 0.999")
+    parity.set_defaults(func=check_embedding_parity)
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except Exception as e:
+        logger.error(f"{args.command} failed: {str(e)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,6 +10,12 @@ class DateOfBirth(BaseModel):
 class ScreeningRequest(BaseModel):
     name: str
     date_of_birth: Optional[Dict[str, int]] = None
+    nationality: Optional[str] = None
+    risk_categories: Optional[List[str]] = None
+    entity_type: Optional[str] = None
+    top_k: Optional[int] = None
+    threshold: Optional[float] = None
+    risk_threshold: Optional[float] = None  # sent by the UI; used when threshold is absent
 
 class WatchlistEntity(BaseModel):
     unique_id: str
@@ -0,0 +1,285 @@
+from sqlalchemy import text, insert, exc
+from databaseconnection import SessionLocal
+from databasemodels import ScreeningRecord, ScreeningMatch, vector_param
+from servicescustomers import customer_key, save_customer_embeddings
+from config import config
+import datetime
+import json
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+RECORD_COLUMNS = (
+    "name", "date_of_birth", "screening_type", "screening_time", "matched", "risk_score",
+    "llm_explanation", "explanation_status",
+)
+
+# A screening record, its matches and the customer's embedding in one statement (one round trip)
+PERSIST_SCREENING_SQL = (
+    "WITH record AS ("
+    "  INSERT INTO screening_records (" + ", ".join(RECORD_COLUMNS) + ") "
+    "  VALUES (" + ", ".join(":" + column for column in RECORD_COLUMNS) + ") RETURNING id"
+    "), matches AS ("
+    "  INSERT INTO screening_matches (screening_id, watchlist_entity_id, match_type, match_score) "
+    "  SELECT record.id, m.entity_id, m.match_type, m.match_score FROM record, "
+    "    unnest(CAST(:entity_ids AS int[]), CAST(:match_types AS text[]), CAST(:match_scores AS float8[])) "
+    "    AS m(entity_id, match_type, match_score)"
+    "){customer} "
+    "SELECT id FROM record"
+)
+CUSTOMER_EMBEDDING_CTE = (
+    ", customer AS ("
+    "  INSERT INTO customer_embeddings "
+    "    (customer_key, name, date_of_birth, name_embedding, last_screening_id, updated_at) "
+    "  SELECT :customer_key, :name, :date_of_birth, CAST(:embedding AS vector), record.id, :screening_time "
+    "  FROM record "
+    "  ON CONFLICT (customer_key) DO UPDATE SET name = EXCLUDED.name, name_embedding = EXCLUDED.name_embedding, "
+    "    last_screening_id = EXCLUDED.last_screening_id, updated_at = EXCLUDED.updated_at"
+    ")"
+)
+PERSIST_SCREENING = text(PERSIST_SCREENING_SQL.format(customer=""))
+PERSIST_SCREENING_WITH_CUSTOMER = text(PERSIST_SCREENING_SQL.format(customer=CUSTOMER_EMBEDDING_CTE))
+
+NEXT_SCREENING_IDS = text(
+    "SELECT nextval(pg_get_serial_sequence('screening_records', 'id')) FROM generate_series(1, :count)"
+)
+
+def _is_connection_error(error: Exception) -> bool:
+    """True when the database was unreachable, as opposed to rejecting the rows themselves"""
+    return isinstance(error, exc.OperationalError) or (
+        isinstance(error, exc.DBAPIError) and error.connection_invalidated
+    )
+
+def screening_audit(record: ScreeningRecord, matches, embedding) -> dict:
+    """Audit rows of one realtime screening: the record's columns, its match rows and the customer embedding.
+
+    matches are (watchlist entity id, describe_match() dict) pairs.
+    """
+    return {
+        "record": {column: getattr(record, column) for column in ("id",) + RECORD_COLUMNS},
+        "matches": [
+            {"watchlist_entity_id": entity_id, "match_type": details["match_type"], "match_score": details["match_score"]}
+            for entity_id, details in matches
+        ],
+        "embedding": embedding if config.CUSTOMER_EMBEDDINGS_ENABLED else None,
+    }
+
+def _persist_params(audit: dict):
+    record = audit["record"]
+    params = {column: record[column] for column in RECORD_COLUMNS}
+    params["entity_ids"] = [match["watchlist_entity_id"] for match in audit["matches"]]
+    params["match_types"] = [match["match_type"] for match in audit["matches"]]
+    params["match_scores"] = [match["match_score"] for match in audit["matches"]]
+    if audit["embedding"] is None:
+        return PERSIST_SCREENING, params
+    params["customer_key"] = customer_key(record["name"], record["date_of_birth"])
+    params["embedding"] = vector_param(audit["embedding"])
+    return PERSIST_SCREENING_WITH_CUSTOMER, params
+
+def persist_screening(db, audit: dict) -> int:
+    """Insert a screening_audit() in one round trip inside the caller's transaction; returns the record id"""
+    return db.execute(*_persist_params(audit)).scalar_one()
+
+async def persist_screening_async(db, audit: dict) -> int:
+    """persist_screening() for an AsyncSession"""
+    return (await db.execute(*_persist_params(audit))).scalar_one()
+
+class ScreeningAuditWriter:
+    """Write-behind buffer for realtime screening audit rows.
+
+    Screening ids are reserved from the screening_records sequence in blocks,
+    so a screening can answer with its id before its rows exist. A flusher
+    thread writes the buffered records, matches and customer embeddings in
+    one transaction every SCREENING_AUDIT_FLUSH_SECONDS, or as soon as
+    SCREENING_AUDIT_FLUSH_BATCH rows are waiting. Rows stay buffered (and
+    visible through pending_record()) until their flush commits. When the
+    database is unreachable the whole batch is retried later; when it
+    rejects the batch, each screening is retried on its own and the ones
+    still rejected go to the SCREENING_AUDIT_DEAD_LETTER_PATH log. stop()
+    flushes whatever is left.
+    """
+
+    def __init__(self, flush_seconds: float = None, flush_batch: int = None, max_pending: int = None,
+                 id_block_size: int = None):
+        self.flush_seconds = flush_seconds or config.SCREENING_AUDIT_FLUSH_SECONDS
+        self.flush_batch = flush_batch or config.SCREENING_AUDIT_FLUSH_BATCH
+        self.max_pending = max_pending or config.SCREENING_AUDIT_MAX_PENDING
+        self.id_block_size = id_block_size or config.SCREENING_ID_BLOCK_SIZE
+        self.dead_letter_path = config.SCREENING_AUDIT_DEAD_LETTER_PATH
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._id_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}
+        self._ids = []
+        self._thread = None
+        self._stopping = False
+        self._flushed = 0
+        self._flush_failures = 0
+        self._dead_lettered = 0
+        self._last_flush_ms = 0.0
+
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="screening-audit-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"Started screening audit writer (flush every {self.flush_seconds}s or {self.flush_batch} rows)")
+
+    def next_id(self) -> int:
+        """Reserve a screening id; one sequence round trip per id_block_size ids"""
+        with self._lock:
+            if self._ids:
+                return self._ids.pop()
+        # One thread fetches the next block; _lock stays free for submit() and pending_record() meanwhile
+        with self._id_lock:
+            with self._lock:
+                if self._ids:
+                    return self._ids.pop()
+            with SessionLocal() as db:
+                block = db.execute(NEXT_SCREENING_IDS, {"count": self.id_block_size}).scalars().all()
+            with self._lock:
+                self._ids = list(reversed(block))
+                return self._ids.pop()
+
+    def submit(self, audit: dict):
+        """Buffer a screening_audit() whose record id came from next_id()"""
+        with self._lock:
+            self._pending[audit["record"]["id"]] = audit
+            pending = len(self._pending)
+        if pending >= self.max_pending:
+            # Backpressure: the caller pays for the flush instead of the buffer growing without bound.
+            # Its screening is already buffered, so a failed flush is logged rather than failing the request.
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Screening audit flush failed with {pending} screenings buffered: {str(e)}")
+        elif pending >= self.flush_batch:
+            self._wake.set()
+
+    def pending_record(self, screening_id: int):
+        """Unsaved ScreeningRecord for a buffered screening id, else None"""
+        with self._lock:
+            audit = self._pending.get(screening_id)
+        return ScreeningRecord(**audit["record"]) if audit else None
+
+    def flush_through(self, screening_id: int):
+        """Make sure a buffered screening is written, e.g. before updating its row"""
+        with self._lock:
+            buffered = screening_id in self._pending
+        if buffered:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending.values())
+            if not batch:
+                return 0
+            start = time.perf_counter()
+            try:
+                self._write(batch)
+                written = batch
+            except Exception as e:
+                self._flush_failures += 1
+                if _is_connection_error(e):
+                    raise
+                logger.warning(f"Screening audit batch of {len(batch)} rejected, retrying one by one: {str(e)}")
+                written = self._write_individually(batch)
+            self._forget(written)
+            self._flushed += len(written)
+            self._last_flush_ms = (time.perf_counter() - start) * 1000
+            return len(written)
+
+    def _write(self, batch):
+        with SessionLocal() as db:
+            db.execute(insert(ScreeningRecord), [audit["record"] for audit in batch])
+            matches = [
+                {"screening_id": audit["record"]["id"], **match} for audit in batch for match in audit["matches"]
+            ]
+            if matches:
+                db.execute(insert(ScreeningMatch), matches)
+            save_customer_embeddings(db, [
+                {**audit["record"], "embedding": audit["embedding"], "screening_id": audit["record"]["id"]}
+                for audit in batch if audit["embedding"] is not None
+            ])
+            db.commit()
+
+    def _write_individually(self, batch) -> list:
+        """Write each screening in its own transaction, dead-lettering the rejected ones; returns the written ones"""
+        written = []
+        for audit in batch:
+            try:
+                self._write([audit])
+                written.append(audit)
+            except Exception as e:
+                if _is_connection_error(e):
+                    # The database went away: keep the rest buffered for the next flush
+                    self._forget(written)
+                    raise
+                self._dead_letter(audit, e)
+                self._forget([audit])
+        return written
+
+    def _forget(self, batch):
+        with self._lock:
+            for audit in batch:
+                self._pending.pop(audit["record"]["id"], None)
+
+    def _dead_letter(self, audit: dict, error: Exception):
+        entry = {
+            "failed_at": datetime.datetime.utcnow().isoformat(),
+            "error": str(error),
+            "record": audit["record"],
+            "matches": audit["matches"],
+            "embedding": [float(value) for value in audit["embedding"]] if audit["embedding"] is not None else None,
+        }
+        with open(self.dead_letter_path, "a") as handle:
+            handle.write(json.dumps(entry, default=str) + "\n")
+        self._dead_lettered += 1
+        logger.error(
+            f"Screening {audit['record']['id']} rejected by the database, written to {self.dead_letter_path}: {str(error)}"
+        )
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Screening audit flush failed, will retry: {str(e)}")
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            flushed = self.flush()
+            logger.info(f"Screening audit writer stopped after flushing {flushed} buffered screenings")
+        except Exception as e:
+            logger.error(f"Final screening audit flush failed, {len(self._pending)} screenings not written: {str(e)}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "running": self.is_running(),
+            "pending": pending,
+            "flushed": self._flushed,
+            "flush_failures": self._flush_failures,
+            "dead_lettered": self._dead_lettered,
+            "last_flush_ms": round(self._last_flush_ms, 3),
+        }
+
+# Shared instance for the whole process
+screening_audit_writer = ScreeningAuditWriter()
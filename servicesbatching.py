@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-name embedding requests into one model.encode call.
+
+    Callers block on generate_embedding() while a background thread collects
+    names that arrive within `window_ms` of the first one (up to `max_batch_size`),
+    encodes them together and hands each caller back its own vector.
+    """
+
+    def __init__(self, generator, window_ms: float, max_batch_size: int):
+        self.generator = generator
+        self.embedding_size = generator.embedding_size
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def generate_embedding(self, text: str):
+        if self._thread is None or self._stopped.is_set():
+            # Not running (e.g. CLI usage): encode directly
+            return self.generator.generate_embedding(text)
+        future = Future()
+        self._queue.put((text, future))
+        # stop() may have drained the queue just before the put; cancel() only wins while the worker hasn't claimed it
+        if self._stopped.is_set() and future.cancel():
+            return self.generator.generate_embedding(text)
+        return future.result()
+
+    def generate_embeddings(self, texts: list[str]):
+        # Callers that already have a batch don't need coalescing
+        return self.generator.generate_embeddings(texts)
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            # Claim each request; callers cancel theirs when they find the batcher stopped
+            batch = [(text, future) for text, future in self._collect() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.generator.generate_embeddings(texts)
+            except Exception as e:
+                logger.error(f"Batched embedding failed for {len(batch)} names: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+            self.batches += 1
+            self.items += len(batch)
+
+        # Drain anything still queued so no caller is left waiting
+        while True:
+            try:
+                text, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.generator.generate_embedding(text))
+            except Exception as e:
+                future.set_exception(e)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "average_batch_size": (self.items / self.batches) if self.batches else 0.0,
+            "queue_depth": self._queue.qsize(),
+        }
@@ -0,0 +1,147 @@
+from sqlalchemy import insert
+from databasemodels import ScreeningRecord, ScreeningMatch
+from servicesingestion import chunked
+from servicesscreening import describe_match, search_candidates, resolve_limits
+from servicescustomers import save_customer_embeddings
+from servicesstats import stats_counters
+from config import config
+import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class BatchScreener:
+    """Screens a customer file in chunks.
+
+    Each chunk is embedded in one batch, searched with one two-stage candidate
+    query (plus one matrix product against the in-memory mirror), and its
+    screening records and matches are written with two bulk INSERTs and a
+    single commit. LLM explanations are not generated for batch screenings.
+    """
+
+    def __init__(self, db_session, embedding_generator, chunk_size: int = None, top_k: int = None,
+                 threshold: float = None):
+        self.db = db_session
+        self.embedding_generator = embedding_generator
+        self.chunk_size = chunk_size or config.BATCH_SCREENING_CHUNK_SIZE
+        self.top_k, self.threshold = resolve_limits(top_k, threshold)
+
+    def screen(self, rows):
+        """Yield one result dict per input row, then a final {"summary": ...}"""
+        start = time.perf_counter()
+        summary = {"rows_processed": 0, "screened_count": 0, "matched_count": 0, "error_count": 0}
+        for chunk in chunked(enumerate(rows, start=1), self.chunk_size):
+            yield from self._screen_chunk(chunk, summary)
+            summary["rows_processed"] += len(chunk)
+        elapsed = time.perf_counter() - start
+        summary["elapsed_seconds"] = round(elapsed, 3)
+        summary["rows_per_second"] = round(summary["rows_processed"] / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(
+            f"Batch screened {summary['rows_processed']} rows in {elapsed:.1f}s ({summary['rows_per_second']} rows/s): "
+            f"matched={summary['matched_count']} errors={summary['error_count']}"
+        )
+        yield {"summary": summary}
+
+    def _prepare_row(self, entry: dict) -> dict:
+        if "_parse_error" in entry:
+            raise ValueError(entry["_parse_error"])
+        if not entry.get("name"):
+            raise ValueError("missing name")
+        date_of_birth = None
+        if entry.get("date_of_birth"):
+            try:
+                date_of_birth = datetime.datetime.strptime(entry["date_of_birth"], "%Y-%m-%d").date()
+            except ValueError:
+                raise ValueError(f"invalid date_of_birth: {entry['date_of_birth']}")
+        return {
+            "customer_id": entry.get("customer_id"),
+            "name": entry["name"],
+            "date_of_birth": date_of_birth,
+            "nationality": entry.get("nationality") or None,
+        }
+
+    def _screen_chunk(self, chunk, summary):
+        prepared = []
+        for row_number, entry in chunk:
+            try:
+                prepared.append((row_number, self._prepare_row(entry)))
+            except Exception as e:
+                summary["error_count"] += 1
+                yield {"row": row_number, "customer_id": entry.get("customer_id"), "error": str(e)}
+        if not prepared:
+            return
+
+        try:
+            embeddings = self.embedding_generator.generate_embeddings([row["name"] for _, row in prepared])
+            candidates = search_candidates(
+                self.db, [row["name"] for _, row in prepared], embeddings,
+                dates_of_birth=[row["date_of_birth"] for _, row in prepared],
+                nationalities=[row["nationality"] for _, row in prepared],
+                top_k=self.top_k, threshold=self.threshold,
+            )
+            results = self._persist(prepared, candidates, embeddings)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to screen chunk of {len(prepared)} customers: {str(e)}")
+            for row_number, row in prepared:
+                summary["error_count"] += 1
+                yield {"row": row_number, "customer_id": row["customer_id"], "error": f"Screening failed: {str(e)}"}
+            return
+
+        summary["screened_count"] += len(results)
+        summary["matched_count"] += sum(1 for result in results if result["matched"])
+        yield from results
+
+    def _persist(self, prepared, candidates, embeddings):
+        screening_time = datetime.datetime.utcnow()
+        results = []
+        records = []
+        for (row_number, row), (entities, truncated) in zip(prepared, candidates):
+            matches = [describe_match(entity, score) for entity, score in entities]
+            risk_score = sum(m["match_score"] for m in matches) / len(matches) if matches else None
+            records.append({
+                "name": row["name"],
+                "date_of_birth": row["date_of_birth"],
+                "screening_type": "Batch",
+                "screening_time": screening_time,
+                "matched": bool(matches),
+                "risk_score": risk_score,
+                "llm_explanation": None if matches else "No matches found",
+                "explanation_status": "not_requested" if matches else "not_required",
+            })
+            results.append({
+                "row": row_number,
+                "customer_id": row["customer_id"],
+                "name": row["name"],
+                "date_of_birth": row["date_of_birth"].isoformat() if row["date_of_birth"] else None,
+                "matched": bool(matches),
+                "risk_score": risk_score if matches else 0.0,
+                "matches": matches,
+                "truncated": truncated,
+            })
+
+        # insertmanyvalues batches the INSERT and returns ids in parameter order
+        screening_ids = self.db.execute(
+            insert(ScreeningRecord).returning(ScreeningRecord.id, sort_by_parameter_order=True),
+            records
+        ).scalars().all()
+        match_rows = []
+        for screening_id, result, (entities, _) in zip(screening_ids, results, candidates):
+            result["screening_id"] = screening_id
+            for (entity, _), match in zip(entities, result["matches"]):
+                match_rows.append({
+                    "screening_id": screening_id,
+                    "watchlist_entity_id": entity.id,
+                    "match_type": match["match_type"],
+                    "match_score": match["match_score"],
+                })
+        if match_rows:
+            self.db.execute(insert(ScreeningMatch), match_rows)
+        save_customer_embeddings(self.db, [
+            {**row, "embedding": embedding, "screening_id": screening_id}
+            for (_, row), embedding, screening_id in zip(prepared, embeddings, screening_ids)
+        ])
+        self.db.commit()
+        stats_counters.add_screenings(len(records), sum(1 for record in records if record["matched"]))
+        return results
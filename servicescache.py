@@ -0,0 +1,356 @@
+from collections import OrderedDict
+from sqlalchemy.dialects.postgresql import insert
+from databaseconnection import SessionLocal
+from databasemodels import LLMExplanationCache
+from servicesnormalization import normalize_name
+from config import config
+import numpy as np
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locking, a single process is assumed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class TTLLRUCache:
+    """Thread-safe LRU cache with a per-entry time-to-live"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class ExplanationCache:
+    """Two-tier cache for LLM risk explanations.
+
+    Keys hash every prompt input (normalized screened name, the matched
+    entity's fields), the model name and decoding options, so a changed
+    watchlist entry can never be served a stale explanation. Entries for an
+    entity are also dropped explicitly when the entity is updated.
+    """
+
+    def __init__(self):
+        self.local = TTLLRUCache(config.LLM_CACHE_MAX_ENTRIES, config.LLM_CACHE_TTL_SECONDS)
+        self._keys_by_entity = {}
+        self._lock = threading.Lock()
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+
+    @staticmethod
+    def make_key(name: str, matched_entity: dict, model: str, options: dict) -> str:
+        payload = {
+            "name": normalize_name(name),
+            "unique_id": matched_entity.get("unique_id"),
+            "entity_name": normalize_name(matched_entity.get("name")),
+            "date_of_birth": matched_entity.get("date_of_birth"),
+            "risk_category": matched_entity.get("risk_category"),
+            "model": model,
+            "options": options,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        explanation = self.local.get(key)
+        if explanation is not None or not config.LLM_CACHE_PERSISTENT:
+            return explanation
+        db = SessionLocal()
+        try:
+            row = db.get(LLMExplanationCache, key)
+            oldest = datetime.datetime.utcnow() - datetime.timedelta(seconds=config.LLM_CACHE_TTL_SECONDS)
+            if row is None or row.created_at < oldest:
+                self.persistent_misses += 1
+                return None
+            self.persistent_hits += 1
+            self._remember(key, row.explanation, row.entity_unique_id)
+            return row.explanation
+        except Exception as e:
+            logger.warning(f"Explanation cache lookup failed: {str(e)}")
+            return None
+        finally:
+            db.close()
+
+    def set(self, key: str, explanation: str, model: str, entity_unique_id: str):
+        self._remember(key, explanation, entity_unique_id)
+        if not config.LLM_CACHE_PERSISTENT:
+            return
+        db = SessionLocal()
+        try:
+            values = {
+                "cache_key": key,
+                "model": model,
+                "entity_unique_id": entity_unique_id,
+                "explanation": explanation,
+                "created_at": datetime.datetime.utcnow(),
+            }
+            db.execute(
+                insert(LLMExplanationCache)
+                .values(**values)
+                .on_conflict_do_update(index_elements=["cache_key"], set_=values)
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Explanation cache write failed: {str(e)}")
+        finally:
+            db.close()
+
+    def _remember(self, key, explanation, entity_unique_id):
+        self.local.set(key, explanation)
+        if entity_unique_id is not None:
+            with self._lock:
+                self._keys_by_entity.setdefault(entity_unique_id, set()).add(key)
+
+    def invalidate_local(self, entity_unique_ids):
+        with self._lock:
+            for unique_id in entity_unique_ids:
+                for key in self._keys_by_entity.pop(unique_id, ()):
+                    self.local.delete(key)
+
+    def invalidate_entity(self, db, unique_id: str):
+        """Delete persistent entries for an entity inside the caller's transaction"""
+        db.query(LLMExplanationCache).filter(LLMExplanationCache.entity_unique_id == unique_id).delete(
+            synchronize_session=False
+        )
+
+    def stats(self) -> dict:
+        stats = self.local.stats()
+        stats["persistent_enabled"] = config.LLM_CACHE_PERSISTENT
+        stats["persistent_hits"] = self.persistent_hits
+        stats["persistent_misses"] = self.persistent_misses
+        return stats
+
+# Shared instance for the whole process
+explanation_cache = ExplanationCache()
+
+class EmbeddingCache:
+    """Bounded LRU of normalized name -> embedding in front of an embedder.
+
+    Vectors live in a preallocated float32 matrix, one slot per entry. With a
+    path configured the matrix is a memory-mapped .npy file plus a slot
+    fingerprint file and a JSON key index, so the cache survives restarts.
+    The fingerprints let a reload discard index entries whose slot was
+    reused after the last flush. Only one process can own a cache file; the
+    others fall back to an in-memory cache.
+    """
+
+    def __init__(self, embedder, capacity: int, path: str = None, model_version: str = None):
+        self.embedder = embedder
+        self.embedding_size = embedder.embedding_size
+        self.capacity = capacity
+        self.model_version = model_version or config.EMBEDDING_MODEL
+        self.path = None
+        self._lock = threading.Lock()
+        self._slots = OrderedDict()  # key -> slot, least recently used first
+        self._lock_file = None
+        self._pending_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path and self._acquire_file(path):
+            self.path = path
+            self._open_files()
+        else:
+            self._vectors = np.zeros((capacity, self.embedding_size), dtype=np.float32)
+            self._fingerprints = np.zeros(capacity, dtype=np.uint64)
+        used = set(self._slots.values())
+        self._free = [slot for slot in range(capacity - 1, -1, -1) if slot not in used]
+
+    @staticmethod
+    def _fingerprint(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+    def _acquire_file(self, path: str) -> bool:
+        if fcntl is None:
+            return True
+        self._lock_file = open(f"{path}.lock", "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            logger.warning(f"Embedding cache file {path} is owned by another process; using an in-memory cache")
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def _open_files(self):
+        vectors_path = f"{self.path}.vectors.npy"
+        fingerprints_path = f"{self.path}.fingerprints.npy"
+        index_path = f"{self.path}.index.json"
+        shape = (self.capacity, self.embedding_size)
+        index = None
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+            vectors = np.load(vectors_path, mmap_mode="r+")
+            fingerprints = np.load(fingerprints_path, mmap_mode="r+")
+            if (vectors.shape != shape or fingerprints.shape != (self.capacity,)
+                    or index.get("model_version") != self.model_version):
+                raise ValueError("cache file does not match the current model or capacity")
+        except (OSError, ValueError) as e:
+            if index is not None:
+                logger.info(f"Recreating embedding cache at {self.path}: {str(e)}")
+            vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=shape)
+            fingerprints = np.lib.format.open_memmap(fingerprints_path, mode="w+", dtype=np.uint64, shape=(self.capacity,))
+            index = {"entries": []}
+        self._vectors = vectors
+        self._fingerprints = fingerprints
+        for key, slot in index["entries"]:
+            if 0 <= slot < self.capacity and fingerprints[slot] == self._fingerprint(key):
+                self._slots[key] = slot
+        logger.info(f"Loaded {len(self._slots)} cached embeddings from {self.path}")
+
+    def _lookup(self, key: str):
+        slot = self._slots.get(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self._slots.move_to_end(key)
+        self.hits += 1
+        # A copy: the slot can be reused once the lock is released
+        return self._vectors[slot].copy()
+
+    def _store(self, key: str, vector):
+        if key in self._slots:
+            return
+        if self._free:
+            slot = self._free.pop()
+        else:
+            _, slot = self._slots.popitem(last=False)
+            self.evictions += 1
+        self._fingerprints[slot] = 0
+        self._vectors[slot] = vector
+        self._fingerprints[slot] = self._fingerprint(key)
+        self._slots[key] = slot
+        self._pending_writes += 1
+
+    def generate_embedding(self, text: str):
+        key = normalize_name(text)
+        with self._lock:
+            cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        # The normalized form is what gets embedded, so every spelling that maps to the key shares one vector
+        vector = self.embedder.generate_embedding(key)
+        with self._lock:
+            self._store(key, vector)
+        self._maybe_flush()
+        return vector
+
+    def generate_embeddings(self, texts: list[str]):
+        keys = [normalize_name(text) for text in texts]
+        results = [None] * len(keys)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                results[i] = self._lookup(key)
+                if results[i] is None:
+                    missing.setdefault(key, []).append(i)
+        if missing:
+            missing_keys = list(missing)
+            vectors = self.embedder.generate_embeddings(missing_keys)
+            with self._lock:
+                for key, vector in zip(missing_keys, vectors):
+                    self._store(key, vector)
+                    for i in missing[key]:
+                        results[i] = vector
+            self._maybe_flush()
+        return results
+
+    def _maybe_flush(self):
+        if self.path and self._pending_writes >= config.EMBEDDING_CACHE_FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self.path:
+            return
+        with self._lock:
+            self._vectors.flush()
+            self._fingerprints.flush()
+            index = {"model_version": self.model_version, "entries": list(self._slots.items())}
+            self._pending_writes = 0
+        index_path = f"{self.path}.index.json"
+        with open(f"{index_path}.tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(f"{index_path}.tmp", index_path)
+
+    def close(self):
+        self.flush()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        # Vectors + fingerprints, plus a rough per-key overhead for the LRU index
+        key_bytes = sum(len(key) for key in self._slots) + len(self._slots) * 100
+        return {
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_bytes": int(self._vectors.nbytes + self._fingerprints.nbytes + key_bytes),
+            "persistent_path": self.path,
+        }
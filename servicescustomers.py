@@ -0,0 +1,49 @@
+from sqlalchemy.dialects.postgresql import insert
+from databasemodels import CustomerEmbedding
+from servicesnormalization import normalize_name
+from config import config
+import datetime
+
+def customer_key(name: str, date_of_birth: datetime.date = None, customer_id: str = None) -> str:
+    """Stable identity for a screened customer: the caller's id when given, else normalized name + DOB"""
+    if customer_id:
+        return f"id:{customer_id}"
+    return f"name:{normalize_name(name)}|{date_of_birth.isoformat() if date_of_birth else ''}"
+
+def save_customer_embeddings(db, customers):
+    """Upsert (name, date_of_birth, customer_id, embedding, screening_id) dicts inside the caller's transaction"""
+    upsert = _customer_embeddings_upsert(customers)
+    if upsert is not None:
+        db.execute(*upsert)
+
+def _customer_embeddings_upsert(customers):
+    """(statement, rows) upserting the customers, or None when there is nothing to write"""
+    if not config.CUSTOMER_EMBEDDINGS_ENABLED or not customers:
+        return None
+    now = datetime.datetime.utcnow()
+    rows = {}
+    for customer in customers:
+        key = customer_key(customer["name"], customer.get("date_of_birth"), customer.get("customer_id"))
+        # One row per key per statement; a later screening of the same customer wins
+        rows[key] = {
+            "customer_key": key,
+            "customer_id": customer.get("customer_id"),
+            "name": customer["name"],
+            "date_of_birth": customer.get("date_of_birth"),
+            "name_embedding": customer["embedding"],
+            "last_screening_id": customer["screening_id"],
+            "updated_at": now,
+        }
+    statement = insert(CustomerEmbedding)
+    return (
+        statement.on_conflict_do_update(
+            index_elements=["customer_key"],
+            set_={
+                "name": statement.excluded.name,
+                "name_embedding": statement.excluded.name_embedding,
+                "last_screening_id": statement.excluded.last_screening_id,
+                "updated_at": statement.excluded.updated_at,
+            }
+        ),
+        list(rows.values())
+    )
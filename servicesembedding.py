@@ -1,16 +1,299 @@
-import numpy as np
-from sentence_transformers import SentenceTransformer
+from abc import ABC, abstractmethod
 from config import config
+import json
+import os
+import time
+import zlib
+import logging
+import numpy as np
 
-class EmbeddingGenerator:
-    def __init__(self):
-        self.embedding_size = config.EMBEDDING_SIZE  # 1536 from config.py
-        # Use local model path
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')  # Outputs 384 dims
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+ONNX_CONFIG_FILE = "embedding_config.json"
+
+class EmbeddingGenerator(ABC):
+    """Embedding backend interface.
+
+    Backends return L2-normalized float32 vectors and describe them with
+    embedding_size (sizes the vector column) and model_version (stored with
+    each watchlist embedding, so a change forces re-embedding).
+    """
+
+    backend = None
+
+    def __init__(self, embedding_size: int, model_version: str):
+        self.embedding_size = embedding_size
+        self.model_version = model_version
+
+    @abstractmethod
+    def _encode(self, texts: list[str]):
+        """2-D float32 array, one row per text"""
 
     def generate_embedding(self, text: str):
-        embedding = self.model.encode(text, convert_to_numpy=True)  # 384 elements
-        # Pad to 1536 if shorter
-        if len(embedding) < self.embedding_size:
-            embedding = np.pad(embedding, (0, self.embedding_size - len(embedding)), mode='constant', constant_values=0)
-        return embedding[:self.embedding_size].tolist()  # Ensure exact length 1536
\ No newline at end of file
+        """float32 NumPy vector; passed to the database as-is (binary), never as a list of Python floats"""
+        return self._encode([text])[0]
+
+    def generate_embeddings(self, texts: list[str]):
+        """Encode many strings in batches of EMBEDDING_ENCODE_BATCH_SIZE; a list of float32 row vectors."""
+        if not texts:
+            return []
+        return list(self._encode(texts))
+
+class SentenceTransformerEmbeddingGenerator(EmbeddingGenerator):
+    """The reference PyTorch SentenceTransformer (EMBEDDING_MODEL)"""
+
+    backend = "sentence-transformers"
+
+    def __init__(self):
+        # Imported here: torch is the largest part of a cold start and the ONNX backends don't need it
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(config.EMBEDDING_MODEL)  # all-MiniLM-L6-v2 outputs 384 dims
+        super().__init__(self.model.get_sentence_embedding_dimension(), config.EMBEDDING_MODEL)
+
+    def _encode(self, texts: list[str]):
+        embeddings = self.model.encode(
+            texts,
+            batch_size=config.EMBEDDING_ENCODE_BATCH_SIZE,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return embeddings.astype(np.float32, copy=False)
+
+class OnnxEmbeddingGenerator(EmbeddingGenerator):
+    """EMBEDDING_MODEL exported to ONNX (manage.py export-onnx), run with ONNX Runtime on CPU.
+
+    Tokenization, pooling and normalization follow the exported model's
+    sentence-transformers pipeline. The int8 variant is dynamically
+    quantized; its vectors differ slightly from the reference model's, so it
+    gets its own model_version.
+    """
+
+    backend = "onnx"
+    model_file = ONNX_MODEL_FILE
+    version_suffix = ""
+
+    def __init__(self, model_dir: str = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        model_dir = model_dir or config.EMBEDDING_ONNX_DIR
+        model_path = os.path.join(model_dir, self.model_file)
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"{model_path} not found; run `python manage.py export-onnx` first")
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE)) as handle:
+            self.export_config = json.load(handle)
+        if self.export_config["model"] != config.EMBEDDING_MODEL:
+            logger.warning(
+                f"ONNX model in {model_dir} was exported from {self.export_config['model']}, "
+                f"not EMBEDDING_MODEL={config.EMBEDDING_MODEL}"
+            )
+        options = onnxruntime.SessionOptions()
+        if config.EMBEDDING_ONNX_THREADS:
+            options.intra_op_num_threads = config.EMBEDDING_ONNX_THREADS
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.export_config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.export_config["pad_token_id"])
+        super().__init__(self.export_config["dimension"], self.export_config["model"] + self.version_suffix)
+
+    def _encode_batch(self, texts: list[str]):
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+        if self.export_config["pooling"] == "cls":
+            pooled = token_embeddings[:, 0]
+        else:
+            mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.export_config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32, copy=False)
+
+    def _encode(self, texts: list[str]):
+        size = config.EMBEDDING_ENCODE_BATCH_SIZE
+        return np.concatenate([self._encode_batch(texts[i:i + size]) for i in range(0, len(texts), size)])
+
+class QuantizedOnnxEmbeddingGenerator(OnnxEmbeddingGenerator):
+    backend = "onnx-int8"
+    model_file = ONNX_INT8_MODEL_FILE
+    version_suffix = ":int8"
+
+class HashingEmbeddingGenerator(EmbeddingGenerator):
+    """Deterministic model-free stand-in for benchmarks and tests: hashed character trigrams, L2-normalized.
+
+    Close spellings share most trigrams, so misspelled queries still land near
+    their source name, which keeps recall numbers meaningful.
+    """
+
+    backend = "hashing"
+
+    def __init__(self, dimensions: int = None):
+        dimensions = dimensions or config.EMBEDDING_SIZE
+        super().__init__(dimensions, f"hashing-trigram-{dimensions}")
+
+    def _encode_one(self, text: str):
+        vector = np.zeros(self.embedding_size, dtype=np.float32)
+        padded = f" {text.lower()} "
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(padded[i:i + 3].encode()) % self.embedding_size] += 1
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _encode(self, texts: list[str]):
+        return np.stack([self._encode_one(text) for text in texts])
+
+EMBEDDING_BACKENDS = {
+    generator.backend: generator
+    for generator in (
+        SentenceTransformerEmbeddingGenerator, OnnxEmbeddingGenerator, QuantizedOnnxEmbeddingGenerator,
+        HashingEmbeddingGenerator,
+    )
+}
+
+def create_embedding_generator(backend: str = None) -> EmbeddingGenerator:
+    """Construct the EMBEDDING_BACKEND (or the named) backend"""
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[backend]()
+
+def export_onnx_model(output_dir: str = None, quantize: bool = True, opset: int = 17) -> dict:
+    """Export EMBEDDING_MODEL's transformer to ONNX, plus its tokenizer and pooling settings.
+
+    Writes model.onnx and, with quantize, a dynamically int8-quantized
+    model_int8.onnx. Only Transformer -> Pooling (mean or CLS) [-> Normalize]
+    pipelines are supported.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    output_dir = output_dir or config.EMBEDDING_ONNX_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    model = SentenceTransformer(config.EMBEDDING_MODEL, device="cpu")
+    modules = list(model)
+    if not (
+        isinstance(modules[0], models.Transformer)
+        and isinstance(modules[1], models.Pooling)
+        and all(isinstance(module, models.Normalize) for module in modules[2:])
+    ):
+        raise ValueError(f"Cannot export {config.EMBEDDING_MODEL}: expected Transformer, Pooling and optional Normalize")
+    transformer, pooling = modules[0], modules[1]
+    if pooling.pooling_mode_cls_token:
+        pooling_mode = "cls"
+    elif pooling.pooling_mode_mean_tokens:
+        pooling_mode = "mean"
+    else:
+        raise ValueError(f"Cannot export {config.EMBEDDING_MODEL}: only mean and CLS pooling are supported")
+
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(["Vladimir Kuznetsov", "Maria Gonzalez"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]}
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer.auto_model.eval()),
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+    tokenizer.save_pretrained(output_dir)
+    export_config = {
+        "model": config.EMBEDDING_MODEL,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "pooling": pooling_mode,
+        "normalize": len(modules) > 2,
+        "max_seq_length": model.max_seq_length,
+        "pad_token_id": tokenizer.pad_token_id or 0,
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w") as handle:
+        json.dump(export_config, handle, indent=2)
+
+    files = [ONNX_MODEL_FILE]
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(model_path, os.path.join(output_dir, ONNX_INT8_MODEL_FILE), weight_type=QuantType.QInt8)
+        files.append(ONNX_INT8_MODEL_FILE)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Exported {config.EMBEDDING_MODEL} to {output_dir} in {elapsed:.1f}s")
+    return {
+        "output_dir": output_dir,
+        "files": {name: os.path.getsize(os.path.join(output_dir, name)) for name in files},
+        "elapsed_seconds": round(elapsed, 3),
+        **export_config,
+    }
+
+def compare_embedding_backends(texts: list[str], backend: str, reference: str = "sentence-transformers") -> dict:
+    """Cosine agreement of a backend with the reference model on the same texts.
+
+    Besides per-text cosine between the two vectors, reports how often each
+    text's nearest neighbour within the set is the same under both, since
+    screening depends on rankings rather than exact values.
+    """
+    candidate_vectors = np.stack(create_embedding_generator(backend).generate_embeddings(texts))
+    reference_vectors = np.stack(create_embedding_generator(reference).generate_embeddings(texts))
+    cosines = np.sum(candidate_vectors * reference_vectors, axis=1) / (
+        np.linalg.norm(candidate_vectors, axis=1) * np.linalg.norm(reference_vectors, axis=1)
+    )
+    result = {
+        "backend": backend,
+        "reference": reference,
+        "texts": len(texts),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "p01_cosine": float(np.percentile(cosines, 1)),
+        "worst": [texts[i] for i in np.argsort(cosines)[:5]],
+    }
+    if len(texts) > 1:
+        neighbours = []
+        for vectors in (candidate_vectors, reference_vectors):
+            similarities = vectors @ vectors.T
+            np.fill_diagonal(similarities, -np.inf)
+            neighbours.append(similarities.argmax(axis=1))
+        result["nearest_neighbour_agreement"] = float(np.mean(neighbours[0] == neighbours[1]))
+    return result
+
+def benchmark_embedding_backend(backend: str, texts: list[str], single_calls: int = 200) -> dict:
+    """Cold start (construct + first encode, including imports when run in a fresh process) and encode speed"""
+    start = time.perf_counter()
+    generator = create_embedding_generator(backend)
+    generator.generate_embedding(texts[0])
+    cold_start = time.perf_counter() - start
+
+    timings = []
+    for text in texts[:single_calls]:
+        start = time.perf_counter()
+        generator.generate_embedding(text)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    generator.generate_embeddings(texts)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "backend": backend,
+        "model_version": generator.model_version,
+        "cold_start_seconds": round(cold_start, 3),
+        "single_p50_ms": round(float(np.percentile(timings, 50)) * 1000, 3),
+        "single_p95_ms": round(float(np.percentile(timings, 95)) * 1000, 3),
+        "batch_texts_per_second": round(len(texts) / batch_seconds, 1),
+        "batch_size": config.EMBEDDING_ENCODE_BATCH_SIZE,
+    }
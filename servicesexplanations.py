@@ -0,0 +1,85 @@
+import queue
+import threading
+import logging
+from databaseconnection import SessionLocal
+from databasemodels import ScreeningRecord
+from servicesregistry import registry
+from servicesaudit import screening_audit_writer
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class ExplanationQueue:
+    """Bounded background queue that generates LLM explanations off the screening hot path.
+
+    Screenings are committed with explanation_status="pending"; a worker
+    thread later writes llm_explanation and flips the status to completed or
+    failed. The queue is drained on shutdown.
+    """
+
+    def __init__(self, workers: int = None, max_size: int = None):
+        self.workers = workers or config.LLM_QUEUE_WORKERS
+        self._queue = queue.Queue(maxsize=max_size or config.LLM_QUEUE_MAX_SIZE)
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"llm-explainer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} LLM explanation workers")
+
+    def submit(self, screening_id: int, name: str, matched_entity: dict) -> bool:
+        """Queue an explanation; returns False when the queue is full"""
+        try:
+            self._queue.put_nowait((screening_id, name, matched_entity))
+            return True
+        except queue.Full:
+            logger.warning(f"Explanation queue full, dropping explanation for screening {screening_id}")
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            screening_id, name, matched_entity = item
+            try:
+                explanation = registry.get_llm_analyzer().generate_explanation(name, matched_entity)
+                self.store(screening_id, explanation, "completed")
+            except Exception as e:
+                logger.error(f"LLM explanation failed for screening {screening_id}: {str(e)}")
+                self.store(screening_id, f"LLM analysis failed: {str(e)}", "failed")
+
+    def store(self, screening_id: int, explanation: str, status: str):
+        db = SessionLocal()
+        try:
+            # The screening may still be waiting in the write-behind buffer
+            screening_audit_writer.flush_through(screening_id)
+            db.query(ScreeningRecord).filter(ScreeningRecord.id == screening_id).update(
+                {"llm_explanation": explanation, "explanation_status": status}
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to store explanation for screening {screening_id}: {str(e)}")
+        finally:
+            db.close()
+
+    def stop(self, timeout: float = 30):
+        if not self._threads:
+            return
+        # Sentinels queue behind pending work, so workers finish what was accepted first
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+# Shared instance for the whole process
+explanation_queue = ExplanationQueue()
@@ -0,0 +1,392 @@
+from sqlalchemy import text
+from io import TextIOWrapper
+from servicescache import explanation_cache
+from servicesnormalization import name_content_hash, clean_aliases, normalize_country
+from serviceslexical import name_key_rows
+from servicesmetrics import timed, INGEST_STAGE_SECONDS
+from servicesstats import stats_counters
+from config import config
+import csv
+import json
+import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE_DDL = (
+    "CREATE TEMP TABLE IF NOT EXISTS watchlist_staging ("
+    "  unique_id text, name text, name_embedding vector({dimension}), name_hash text, embedding_model text,"
+    "  aliases text[], dates_of_birth date[], risk_category text, nationality text, entity_type text"
+    ") ON COMMIT DELETE ROWS"
+)
+
+ALIAS_STAGING_TABLE_DDL = (
+    "CREATE TEMP TABLE IF NOT EXISTS watchlist_alias_staging ("
+    "  unique_id text, alias text, alias_embedding vector({dimension})"
+    ") ON COMMIT DELETE ROWS"
+)
+
+# One statement per chunk; xmax = 0 only for freshly inserted rows. Every merged row is also
+# written to the watchlist_changes changelog for delta rescreening.
+MERGE_STAGING_SQL = text(
+    "WITH merged AS ("
+    "  INSERT INTO watchlist_entities "
+    "    (unique_id, name, name_embedding, name_hash, embedding_model, aliases, dates_of_birth, risk_category, "
+    "     nationality, entity_type) "
+    "  SELECT unique_id, name, name_embedding, name_hash, embedding_model, aliases, dates_of_birth, risk_category, "
+    "    nationality, entity_type "
+    "  FROM watchlist_staging "
+    "  ON CONFLICT (unique_id) DO UPDATE SET "
+    "    name = EXCLUDED.name, "
+    # A NULL staged embedding means the name and aliases are unchanged and the stored vectors are kept
+    "    name_embedding = COALESCE(EXCLUDED.name_embedding, watchlist_entities.name_embedding), "
+    "    name_hash = EXCLUDED.name_hash, "
+    "    embedding_model = EXCLUDED.embedding_model, "
+    "    aliases = EXCLUDED.aliases, "
+    "    dates_of_birth = COALESCE(EXCLUDED.dates_of_birth, watchlist_entities.dates_of_birth), "
+    "    risk_category = COALESCE(EXCLUDED.risk_category, watchlist_entities.risk_category), "
+    "    nationality = COALESCE(EXCLUDED.nationality, watchlist_entities.nationality), "
+    "    entity_type = EXCLUDED.entity_type, "
+    "    updated_at = clock_timestamp() "
+    "  RETURNING id, unique_id, (xmax = 0) AS inserted"
+    "), logged AS ("
+    "  INSERT INTO watchlist_changes (watchlist_entity_id, change_type) "
+    "  SELECT id, CASE WHEN inserted THEN 'created' ELSE 'updated' END FROM merged"
+    ") "
+    "SELECT id, unique_id, inserted FROM merged"
+)
+
+# Alias vectors of re-embedded entities are replaced wholesale
+DELETE_ALIASES_SQL = text(
+    "DELETE FROM watchlist_aliases a USING watchlist_entities e, watchlist_staging s "
+    "WHERE a.watchlist_entity_id = e.id AND e.unique_id = s.unique_id AND s.name_embedding IS NOT NULL"
+)
+
+INSERT_ALIASES_SQL = text(
+    "INSERT INTO watchlist_aliases (watchlist_entity_id, alias, alias_embedding) "
+    "SELECT e.id, s.alias, s.alias_embedding FROM watchlist_alias_staging s "
+    "JOIN watchlist_entities e ON e.unique_id = s.unique_id"
+)
+
+DELETE_NAME_KEYS_SQL = text("DELETE FROM watchlist_name_keys WHERE watchlist_entity_id = ANY(:ids)")
+
+EXISTING_ENTITIES_SQL = text(
+    "SELECT unique_id, name, name_hash, embedding_model, aliases, dates_of_birth, risk_category, nationality, entity_type "
+    "FROM watchlist_entities WHERE unique_id = ANY(:unique_ids)"
+)
+
+INVALIDATE_EXPLANATIONS_SQL = text(
+    "DELETE FROM llm_explanation_cache WHERE entity_unique_id IN (SELECT unique_id FROM watchlist_staging)"
+)
+
+def parse_aliases(value):
+    """Aliases from an upload row: a list (JSON) or a ";"-separated string (CSV); None when the field is absent"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.split(";")
+    if isinstance(value, list):
+        return [str(alias) for alias in value if alias is not None]
+    raise ValueError("invalid aliases: expected a list or ';'-separated string")
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+JSONL_CONTENT_TYPES = {"application/x-ndjson", "application/jsonl", "application/x-jsonlines", "application/json-seq"}
+
+def detect_format(filename: str = None, content_type: str = None) -> str:
+    """Return "jsonl" or "csv" for an upload, based on extension first and content type second"""
+    if filename:
+        lowered = filename.lower()
+        if lowered.endswith((".jsonl", ".ndjson")):
+            return "jsonl"
+        if lowered.endswith(".csv"):
+            return "csv"
+    if content_type and content_type.split(";")[0].strip().lower() in JSONL_CONTENT_TYPES:
+        return "jsonl"
+    return "csv"
+
+def iter_csv_rows(text_stream):
+    for row in csv.DictReader(text_stream):
+        yield {k: (v if v != "" else None) for k, v in row.items()}
+
+def iter_jsonl_rows(text_stream):
+    for line_number, line in enumerate(text_stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            # Surfaced as a per-row error by the ingestor instead of aborting the upload
+            yield {"_parse_error": f"line {line_number}: invalid JSON ({e.msg})"}
+            continue
+        if not isinstance(row, dict):
+            yield {"_parse_error": f"line {line_number}: expected a JSON object"}
+            continue
+        yield row
+
+def iter_upload_rows(binary_stream, file_format: str):
+    """Lazily parse a binary file object line by line; nothing is read ahead beyond the csv/json buffers"""
+    # utf-8-sig drops the BOM Excel puts on CSV exports
+    text_stream = TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+    try:
+        if file_format == "jsonl":
+            yield from iter_jsonl_rows(text_stream)
+        else:
+            yield from iter_csv_rows(text_stream)
+    finally:
+        # Don't let the wrapper close the underlying upload file
+        text_stream.detach()
+
+def count_upload_rows(binary_stream, file_format: str) -> int:
+    """Cheap pre-pass used to report progress and ETA for upload jobs"""
+    count = sum(1 for _ in iter_upload_rows(binary_stream, file_format))
+    binary_stream.seek(0)
+    return count
+
+class WatchlistIngestor:
+    """Bulk watchlist loader.
+
+    Rows are processed in chunks: names are embedded in one batch, the chunk is
+    COPY'd into a temporary staging table and merged into watchlist_entities
+    with a single INSERT ... ON CONFLICT (unique_id) DO UPDATE.
+    """
+
+    def __init__(self, db_session, embedding_generator, chunk_size: int = None, progress_callback=None):
+        self.db = db_session
+        self.embedding_generator = embedding_generator
+        self.model_version = embedding_generator.model_version
+        self.chunk_size = chunk_size or config.INGEST_CHUNK_SIZE
+        # Called with the running stats after every committed chunk
+        self.progress_callback = progress_callback
+
+    def ingest(self, rows, continue_on_error: bool = True) -> dict:
+        start = time.perf_counter()
+        stats = {
+            "created_count": 0,
+            "updated_count": 0,
+            "skipped_unchanged": 0,
+            "error_count": 0,
+            "rows_processed": 0,
+            "errors": []
+        }
+        chunks = chunked(enumerate(rows, start=1), self.chunk_size)
+        while True:
+            # Upload rows are parsed lazily, so reading the next chunk is the parse stage
+            with timed(INGEST_STAGE_SECONDS, "parse"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            self._ingest_chunk(chunk, stats)
+            stats["rows_processed"] += len(chunk)
+            stats_counters.add("watchlist_rows_ingested", len(chunk))
+            if self.progress_callback is not None:
+                self.progress_callback(stats)
+            if stats["error_count"] and not continue_on_error:
+                logger.warning(f"Stopping ingestion after {stats['rows_processed']} rows: errors encountered")
+                break
+        elapsed = time.perf_counter() - start
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["rows_per_second"] = round(stats["rows_processed"] / elapsed, 1) if elapsed > 0 else 0.0
+        logger.info(
+            f"Ingested {stats['rows_processed']} rows in {elapsed:.1f}s ({stats['rows_per_second']} rows/s): "
+            f"created={stats['created_count']} updated={stats['updated_count']} "
+            f"unchanged={stats['skipped_unchanged']} errors={stats['error_count']}"
+        )
+        return stats
+
+    def _prepare_row(self, entry: dict) -> dict:
+        if "_parse_error" in entry:
+            raise ValueError(entry["_parse_error"])
+        unique_id = entry.get("unique_id")
+        name = entry.get("name")
+        if unique_id is None or unique_id == "":
+            raise ValueError("missing unique_id")
+        if not name:
+            raise ValueError("missing name")
+        dates_of_birth = None
+        if entry.get("date_of_birth"):
+            try:
+                dates_of_birth = [datetime.datetime.strptime(entry["date_of_birth"], "%Y-%m-%d").date()]
+            except ValueError:
+                raise ValueError(f"invalid date_of_birth: {entry['date_of_birth']}")
+        aliases = parse_aliases(entry.get("aliases"))
+        return {
+            "unique_id": str(unique_id),
+            "name": name,
+            # None (field absent) keeps the stored aliases
+            "aliases": clean_aliases(name, aliases) if aliases is not None else None,
+            "dates_of_birth": dates_of_birth,
+            "risk_category": entry.get("risk_category"),
+            "nationality": normalize_country(entry.get("nationality")),
+            "entity_type": entry["entity_type"].strip().upper() if entry.get("entity_type") else None,
+        }
+
+    def _classify(self, rows):
+        """Split rows into (to_embed, metadata_only, unchanged) against what is already stored"""
+        existing = {
+            row.unique_id: row
+            for row in self.db.execute(EXISTING_ENTITIES_SQL, {"unique_ids": [row["unique_id"] for row in rows]})
+        }
+        to_embed, metadata_only, unchanged = [], [], []
+        for row in rows:
+            current = existing.get(row["unique_id"])
+            current_aliases = list(current.aliases or []) if current is not None else []
+            if row["aliases"] is None:
+                row["aliases"] = current_aliases
+            if row["entity_type"] is None:
+                row["entity_type"] = current.entity_type if current is not None else "INDIVIDUAL"
+            row["name_hash"] = name_content_hash(row["name"], row["aliases"])
+            if current is None or current.name_hash != row["name_hash"] or current.embedding_model != self.model_version:
+                to_embed.append(row)
+            elif (
+                current.name == row["name"]
+                and row["aliases"] == current_aliases
+                and row["dates_of_birth"] in (None, current.dates_of_birth)
+                and row["risk_category"] in (None, current.risk_category)
+                and row["nationality"] in (None, current.nationality)
+                and row["entity_type"] == current.entity_type
+            ):
+                unchanged.append(row)
+            else:
+                metadata_only.append(row)
+        return to_embed, metadata_only, unchanged
+
+    def _record_error(self, stats, row_number, unique_id, message):
+        stats["error_count"] += 1
+        if len(stats["errors"]) < config.INGEST_MAX_REPORTED_ERRORS:
+            stats["errors"].append({"row": row_number, "unique_id": unique_id, "error": message})
+
+    def _ingest_chunk(self, chunk, stats):
+        with timed(INGEST_STAGE_SECONDS, "prepare"):
+            prepared, row_numbers, repeats = self._prepare_chunk(chunk, stats)
+        if not prepared:
+            return
+
+        rows = list(prepared.values())
+        try:
+            with timed(INGEST_STAGE_SECONDS, "classify"):
+                to_embed, metadata_only, unchanged = self._classify(rows)
+            # Folded repeats count the same way as the row they were folded into
+            skipped = sum(1 + repeats.get(row["unique_id"], 0) for row in unchanged)
+            if not to_embed and not metadata_only:
+                self.db.rollback()
+                stats["skipped_unchanged"] += skipped
+                return
+            # Names and aliases are embedded in one batch
+            alias_rows = [(row["unique_id"], alias) for row in to_embed for alias in row["aliases"]]
+            with timed(INGEST_STAGE_SECONDS, "embed"):
+                embeddings = self.embedding_generator.generate_embeddings(
+                    [row["name"] for row in to_embed] + [alias for _, alias in alias_rows]
+                )
+            name_embeddings, alias_embeddings = embeddings[:len(to_embed)], embeddings[len(to_embed):]
+            with timed(INGEST_STAGE_SECONDS, "copy"):
+                self._copy_to_staging(to_embed + metadata_only, name_embeddings + [None] * len(metadata_only))
+            with timed(INGEST_STAGE_SECONDS, "merge"):
+                results = self.db.execute(MERGE_STAGING_SQL).fetchall()
+            with timed(INGEST_STAGE_SECONDS, "aliases"):
+                self.db.execute(DELETE_ALIASES_SQL)
+                if alias_rows:
+                    self._copy_aliases_to_staging(alias_rows, alias_embeddings)
+                    self.db.execute(INSERT_ALIASES_SQL)
+            with timed(INGEST_STAGE_SECONDS, "name_keys"):
+                self._replace_name_keys(results, to_embed)
+            with timed(INGEST_STAGE_SECONDS, "commit"):
+                # Cached LLM explanations for changed entities are dropped in the same transaction
+                self.db.execute(INVALIDATE_EXPLANATIONS_SQL)
+                self.db.commit()
+            explanation_cache.invalidate_local(row["unique_id"] for row in to_embed + metadata_only)
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Failed to ingest chunk of {len(rows)} watchlist rows: {str(e)}")
+            for unique_id, numbers in row_numbers.items():
+                for row_number in numbers:
+                    self._record_error(stats, row_number, unique_id, f"Database error: {str(e)}")
+            return
+
+        created = sum(1 for result in results if result.inserted)
+        stats["created_count"] += created
+        stats_counters.add("watchlist_entities", created)
+        stats["skipped_unchanged"] += skipped
+        unchanged_ids = {row["unique_id"] for row in unchanged}
+        duplicates = sum(count for unique_id, count in repeats.items() if unique_id not in unchanged_ids)
+        stats["updated_count"] += len(results) - created + duplicates
+
+    def _prepare_chunk(self, chunk, stats):
+        """Validated rows of a chunk keyed by unique_id, their source row numbers and how many repeats were folded"""
+        prepared = {}
+        row_numbers = {}
+        repeats = {}
+        for row_number, entry in chunk:
+            try:
+                row = self._prepare_row(entry)
+            except Exception as e:
+                logger.warning(f"Skipping watchlist row {entry.get('unique_id', 'unknown')}: {str(e)}")
+                self._record_error(stats, row_number, entry.get("unique_id"), str(e))
+                continue
+            row_numbers.setdefault(row["unique_id"], []).append(row_number)
+            previous = prepared.get(row["unique_id"])
+            if previous is not None:
+                # A row can only be upserted once per statement: fold repeats into one, as sequential updates would
+                repeats[row["unique_id"]] = repeats.get(row["unique_id"], 0) + 1
+                row = {**previous, **{k: v for k, v in row.items() if v is not None}}
+            prepared[row["unique_id"]] = row
+        return prepared, row_numbers, repeats
+
+    def _copy_to_staging(self, rows, embeddings):
+        self.db.execute(text(STAGING_TABLE_DDL.format(dimension=self.embedding_generator.embedding_size)))
+        self._copy(
+            "watchlist_staging "
+            "(unique_id, name, name_embedding, name_hash, embedding_model, aliases, dates_of_birth, risk_category, "
+            "nationality, entity_type)",
+            ["text", "text", "vector", "text", "text", "text[]", "date[]", "text", "text", "text"],
+            (
+                (
+                    row["unique_id"], row["name"], embedding, row["name_hash"], self.model_version, row["aliases"],
+                    row["dates_of_birth"], row["risk_category"], row["nationality"], row["entity_type"],
+                )
+                for row, embedding in zip(rows, embeddings)
+            )
+        )
+
+    def _copy_aliases_to_staging(self, alias_rows, embeddings):
+        self.db.execute(text(ALIAS_STAGING_TABLE_DDL.format(dimension=self.embedding_generator.embedding_size)))
+        self._copy(
+            "watchlist_alias_staging (unique_id, alias, alias_embedding)",
+            ["text", "text", "vector"],
+            ((unique_id, alias, embedding) for (unique_id, alias), embedding in zip(alias_rows, embeddings))
+        )
+
+    def _replace_name_keys(self, results, rows):
+        """Rewrite the lexical index keys of re-embedded entities"""
+        if not rows:
+            return
+        entity_ids = {result.unique_id: result.id for result in results}
+        entities = [(entity_ids[row["unique_id"]], row["name"], row["aliases"]) for row in rows]
+        self.db.execute(DELETE_NAME_KEYS_SQL, {"ids": [entity[0] for entity in entities]})
+        self._copy(
+            "watchlist_name_keys (key, watchlist_entity_id)",
+            ["text", "int4"],
+            ((key_row["key"], key_row["watchlist_entity_id"]) for key_row in name_key_rows(entities))
+        )
+
+    def _copy(self, target: str, types, rows):
+        """Binary COPY; vectors go in as float32 arrays through pgvector's binary dumper"""
+        # COPY goes through the session's own connection so it shares the chunk's transaction
+        cursor = self.db.connection().connection.cursor()
+        try:
+            with cursor.copy(f"COPY {target} FROM STDIN (FORMAT BINARY)") as copy:
+                copy.set_types(types)
+                for row in rows:
+                    copy.write_row(row)
+        finally:
+            cursor.close()
@@ -0,0 +1,205 @@
+from concurrent.futures import ThreadPoolExecutor
+from databaseconnection import SessionLocal
+from databasemodels import UploadJob
+from servicesingestion import WatchlistIngestor, iter_upload_rows, count_upload_rows
+from servicesregistry import registry
+from config import config
+import datetime
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class UploadJobManager:
+    """Runs watchlist uploads on a local worker pool.
+
+    Job state lives in the upload_jobs table, so any API worker process can
+    answer a progress poll for a job running in another one. On shutdown
+    without waiting, queued jobs are cancelled and running ones stop after
+    their current chunk; both are marked failed so pollers don't wait forever.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or config.UPLOAD_JOB_WORKERS
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = {}  # job id -> (future, upload path) of this process's unfinished jobs
+        self._stopping = threading.Event()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._stopping.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="upload-job")
+        return self._executor
+
+    def submit(self, path: str, filename: str, file_format: str, chunk_size: int = None, continue_on_error: bool = True) -> str:
+        """Register a job for an upload already saved at `path` (the job deletes it when done)"""
+        job_id = str(uuid.uuid4())
+        db = SessionLocal()
+        try:
+            db.add(UploadJob(
+                id=job_id,
+                status="queued",
+                filename=filename,
+                rows_done=0,
+                created_count=0,
+                updated_count=0,
+                skipped_unchanged=0,
+                error_count=0,
+                errors=[],
+                created_at=datetime.datetime.utcnow()
+            ))
+            db.commit()
+        finally:
+            db.close()
+        with self._lock:
+            future = self._get_executor().submit(self._run, job_id, path, file_format, chunk_size, continue_on_error)
+            self._jobs[job_id] = (future, path)
+        logger.info(f"Queued upload job {job_id} for {filename}")
+        return job_id
+
+    def _update(self, job_id: str, **fields):
+        db = SessionLocal()
+        try:
+            db.query(UploadJob).filter(UploadJob.id == job_id).update(fields)
+            db.commit()
+        finally:
+            db.close()
+
+    def _run(self, job_id, path, file_format, chunk_size, continue_on_error):
+        db = SessionLocal()
+        try:
+            with open(path, "rb") as f:
+                total_rows = count_upload_rows(f, file_format)
+                self._update(job_id, status="running", total_rows=total_rows, started_at=datetime.datetime.utcnow())
+
+                def report_progress(stats):
+                    self._update(
+                        job_id,
+                        rows_done=stats["rows_processed"],
+                        created_count=stats["created_count"],
+                        updated_count=stats["updated_count"],
+                        skipped_unchanged=stats["skipped_unchanged"],
+                        error_count=stats["error_count"],
+                        errors=stats["errors"]
+                    )
+                    if self._stopping.is_set():
+                        raise RuntimeError(
+                            f"Interrupted by server shutdown after {stats['rows_processed']} rows; upload the file again"
+                        )
+
+                ingestor = WatchlistIngestor(
+                    db,
+                    registry.get_embedding_generator(),
+                    chunk_size=chunk_size,
+                    progress_callback=report_progress
+                )
+                rows = iter_upload_rows(f, file_format)
+                try:
+                    result = ingestor.ingest(rows, continue_on_error=continue_on_error)
+                finally:
+                    # Detach the parser from the file while it's still open, also when ingestion was interrupted
+                    rows.close()
+
+            status = "completed"
+            if result["error_count"] and not continue_on_error:
+                status = "failed"
+            self._update(
+                job_id,
+                status=status,
+                rows_done=result["rows_processed"],
+                message=(
+                    f"Created: {result['created_count']}, Updated: {result['updated_count']}, "
+                    f"Unchanged: {result['skipped_unchanged']}, Errors: {result['error_count']}"
+                ),
+                finished_at=datetime.datetime.utcnow()
+            )
+        except Exception as e:
+            logger.error(f"Upload job {job_id} failed: {str(e)}")
+            self._update(job_id, status="failed", message=str(e), finished_at=datetime.datetime.utcnow())
+        finally:
+            db.close()
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            self._remove_upload(path)
+
+    @staticmethod
+    def _remove_upload(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get(self, job_id: str):
+        db = SessionLocal()
+        try:
+            job = db.query(UploadJob).filter(UploadJob.id == job_id).first()
+            if job is None:
+                return None
+            return self._describe(job)
+        finally:
+            db.close()
+
+    def _describe(self, job: UploadJob) -> dict:
+        rows_per_second = None
+        eta_seconds = None
+        if job.started_at:
+            end = job.finished_at or datetime.datetime.utcnow()
+            elapsed = (end - job.started_at).total_seconds()
+            if elapsed > 0 and job.rows_done:
+                rows_per_second = round(job.rows_done / elapsed, 1)
+                if job.status == "running" and job.total_rows:
+                    eta_seconds = round(max(job.total_rows - job.rows_done, 0) / rows_per_second, 1)
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "filename": job.filename,
+            "total_rows": job.total_rows,
+            "rows_done": job.rows_done,
+            "created_count": job.created_count,
+            "updated_count": job.updated_count,
+            "skipped_unchanged": job.skipped_unchanged or 0,
+            "error_count": job.error_count,
+            "errors": job.errors or [],
+            "rows_per_second": rows_per_second,
+            "eta_seconds": eta_seconds,
+            "message": job.message,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is None:
+            return
+        if not wait:
+            self._stopping.set()
+        with self._lock:
+            self._executor.shutdown(wait=False, cancel_futures=not wait)
+            cancelled = [
+                (job_id, path) for job_id, (future, path) in self._jobs.items() if future.cancelled()
+            ]
+            for job_id, _ in cancelled:
+                self._jobs.pop(job_id)
+        # Cancelled jobs never reach _run(), which would otherwise fail them and delete their upload
+        for job_id, path in cancelled:
+            try:
+                self._update(
+                    job_id,
+                    status="failed",
+                    message="Cancelled by server shutdown before it started; upload the file again",
+                    finished_at=datetime.datetime.utcnow()
+                )
+            except Exception as e:
+                logger.error(f"Could not mark cancelled upload job {job_id} failed: {str(e)}")
+            self._remove_upload(path)
+        if cancelled:
+            logger.warning(f"Cancelled {len(cancelled)} queued upload jobs")
+        if wait:
+            self._executor.shutdown(wait=True)
+        self._executor = None
+
+# Shared instance for the whole process
+upload_jobs = UploadJobManager()
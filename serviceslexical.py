@@ -0,0 +1,259 @@
+from sqlalchemy import select, delete, insert
+from databaseconnection import engine
+from databasemodels import WatchlistEntity, WatchlistNameKey
+from servicesnormalization import normalize_name
+from config import config
+import functools
+import logging
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+_VOWELS = "AEIOUY"
+
+@functools.lru_cache(maxsize=65536)
+def fold_name(name: str) -> str:
+    """normalize_name() without accents or punctuation: the form n-grams, phonetic codes and edit distance use"""
+    decomposed = unicodedata.normalize("NFKD", normalize_name(name))
+    letters = "".join(c if c.isalnum() else " " for c in decomposed if not unicodedata.combining(c))
+    return " ".join(letters.split())
+
+def phonetic_codes(token: str) -> set[str]:
+    """Double Metaphone-style codes for one folded Latin-script token.
+
+    Returns the primary code plus an alternate where the spelling is
+    ambiguous across transliterations (CH as X/K, J as J/H, KH as K/H, ...).
+    Tokens in other scripts get no codes and rely on n-grams alone.
+    """
+    word = token.upper()
+    if not word.isascii() or not word.isalpha():
+        return set()
+    primary, alternate = [], []
+
+    def add(code, alternate_code=None):
+        primary.append(code)
+        alternate.append(code if alternate_code is None else alternate_code)
+
+    i = 0
+    if word[:2] in ("KN", "GN", "PN", "WR"):
+        i = 1
+    elif word[0] == "X":
+        add("S")
+        i = 1
+    while i < len(word):
+        c = word[i]
+        prev = word[i - 1] if i > 0 else ""
+        nxt = word[i + 1:i + 2]
+        if c == prev and c != "C":
+            i += 1
+            continue
+        if c in _VOWELS:
+            if i == 0:
+                add("A")
+        elif c == "B":
+            if not (prev == "M" and i == len(word) - 1):
+                add("P")
+        elif c == "C":
+            if nxt == "H":
+                add("X", "K")
+                i += 1
+            elif nxt and nxt in "EIY":
+                add("S")
+            elif nxt in ("K", "Q"):
+                add("K")
+                i += 1
+            else:
+                add("K")
+        elif c == "D":
+            if nxt == "G" and word[i + 2:i + 3] in ("E", "I", "Y"):
+                add("J")
+                i += 1
+            else:
+                add("T")
+        elif c == "G":
+            if nxt == "H":
+                if i == 0:
+                    add("K")
+                else:
+                    add("", "F")  # silent (Wright) or F (Laughlin)
+                i += 1
+            elif nxt == "N":
+                pass
+            elif nxt and nxt in "EIY":
+                add("J", "K")
+            else:
+                add("K")
+        elif c == "H":
+            if nxt and nxt in _VOWELS and not (prev and prev in "CGPST"):
+                add("H")
+        elif c == "J":
+            add("J", "H")
+        elif c == "K":
+            if nxt == "H":
+                add("K", "H")
+                i += 1
+            else:
+                add("K")
+        elif c == "P":
+            if nxt == "H":
+                add("F")
+                i += 1
+            else:
+                add("P")
+        elif c == "Q":
+            add("K")
+        elif c == "S":
+            if nxt == "H":
+                add("X")
+                i += 1
+            elif word[i + 1:i + 3] == "CH":
+                add("SK", "X")
+                i += 2
+            elif word[i + 1:i + 3] in ("IO", "IA"):
+                add("X", "S")
+            else:
+                add("S")
+        elif c == "T":
+            if nxt == "H":
+                add("0", "T")
+                i += 1
+            elif word[i + 1:i + 3] == "CH":
+                pass
+            elif word[i + 1:i + 3] in ("IO", "IA"):
+                add("X")
+            else:
+                add("T")
+        elif c == "V":
+            add("F")
+        elif c == "W":
+            if nxt and nxt in _VOWELS:
+                add("W", "F")
+            elif i == 0:
+                add("F")  # Wladimir / Vladimir
+        elif c == "X":
+            add("KS")
+        elif c == "Z":
+            add("S")
+        else:
+            add(c)
+        i += 1
+    return {_squeeze("".join(codes))[:6] for codes in (primary, alternate) if any(codes)}
+
+def _squeeze(code: str) -> str:
+    """Collapse repeated letters produced by neighbouring rules (Schmidt: D and T)"""
+    return "".join(c for i, c in enumerate(code) if i == 0 or c != code[i - 1])
+
+def name_keys(names) -> set[str]:
+    """Inverted-index keys for a name and its aliases: character trigrams ("t:") and phonetic codes ("p:")"""
+    keys = set()
+    for name in names:
+        folded = fold_name(name)
+        if not folded:
+            continue
+        padded = f" {folded} "
+        keys.update("t:" + padded[i:i + 3] for i in range(len(padded) - 2))
+        for token in folded.split():
+            keys.update("p:" + code for code in phonetic_codes(token))
+    return keys
+
+def levenshtein(a: str, b: str) -> int:
+    """Edit distance with Myers' bit-parallel algorithm: one pass over `a`, `b` held as bit vectors"""
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    full = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    peq = {}
+    for i, c in enumerate(b):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    pv, mv, distance = full, 0, len(b)
+    for c in a:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            distance += 1
+        elif mh & last:
+            distance -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return distance
+
+def edit_similarity(a: str, b: str) -> float:
+    """1 - normalized Levenshtein distance of the folded names, also tried with tokens sorted (word order)"""
+    a, b = fold_name(a), fold_name(b)
+    if not a or not b:
+        return 0.0
+    best = 1 - levenshtein(a, b) / max(len(a), len(b))
+    sorted_a, sorted_b = " ".join(sorted(a.split())), " ".join(sorted(b.split()))
+    if (sorted_a, sorted_b) != (a, b):
+        best = max(best, 1 - levenshtein(sorted_a, sorted_b) / max(len(sorted_a), len(sorted_b)))
+    return best
+
+def score_match(name: str, variants, similarities) -> dict:
+    """Composite score of a query name against an entity's name (variants[0]) and aliases.
+
+    Each variant scores MATCH_SCORE_VECTOR_WEIGHT * embedding cosine +
+    MATCH_SCORE_EDIT_WEIGHT * edit similarity; the best variant wins.
+    """
+    total_weight = config.MATCH_SCORE_VECTOR_WEIGHT + config.MATCH_SCORE_EDIT_WEIGHT
+    query = normalize_name(name)
+    best = None
+    for index, (variant, similarity) in enumerate(zip(variants, similarities)):
+        edit = edit_similarity(name, variant)
+        score = (config.MATCH_SCORE_VECTOR_WEIGHT * similarity + config.MATCH_SCORE_EDIT_WEIGHT * edit) / total_weight
+        exact = normalize_name(variant) == query
+        if exact:
+            score = 1.0
+        if best is None or score > best["match_score"]:
+            best = {
+                "match_score": round(min(max(score, 0.0), 1.0), 4),
+                "matched_alias": variant if index > 0 else None,
+                "vector_similarity": round(float(similarity), 4),
+                "edit_similarity": round(edit, 4),
+                "exact": exact,
+            }
+    return best
+
+def name_key_rows(entities):
+    """{"key", "watchlist_entity_id"} rows for (entity_id, name, aliases) tuples"""
+    for entity_id, name, aliases in entities:
+        for key in name_keys([name] + list(aliases or [])):
+            yield {"key": key, "watchlist_entity_id": entity_id}
+
+def replace_name_keys(db, entities):
+    """Rewrite the lexical keys of (entity_id, name, aliases) tuples inside the caller's transaction"""
+    entities = list(entities)
+    if not entities:
+        return
+    db.execute(
+        delete(WatchlistNameKey).where(WatchlistNameKey.watchlist_entity_id.in_([entity[0] for entity in entities]))
+    )
+    rows = list(name_key_rows(entities))
+    if rows:
+        db.execute(insert(WatchlistNameKey), rows)
+
+def rebuild_name_index(chunk_size: int = 10000) -> dict:
+    """Recompute the keys of every watchlist entity, e.g. after an upgrade or a change to the key scheme"""
+    start = time.perf_counter()
+    entities = keys = 0
+    with engine.connect() as reader, engine.begin() as writer:
+        writer.execute(delete(WatchlistNameKey))
+        rows = reader.execution_options(stream_results=True, yield_per=chunk_size).execute(
+            select(WatchlistEntity.id, WatchlistEntity.name, WatchlistEntity.aliases)
+        )
+        for batch in rows.partitions():
+            key_rows = list(name_key_rows(batch))
+            if key_rows:
+                writer.execute(insert(WatchlistNameKey), key_rows)
+            entities += len(batch)
+            keys += len(key_rows)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Rebuilt the lexical name index: {keys} keys for {entities} entities in {elapsed:.1f}s")
+    return {"entities": entities, "keys": keys, "elapsed_seconds": round(elapsed, 3)}
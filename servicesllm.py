@@ -1,5 +1,8 @@
 import ollama
 import logging
+from servicescache import explanation_cache
+from servicesmetrics import timed, LLM_REQUEST_SECONDS, LLM_INVOCATIONS
+from config import config
 
 logger = logging.getLogger(__name__)
 
@@ -8,24 +11,63 @@ class LLMAnalyzer:
         self.model = "gemma3:12b"  # Ollama model
         self.host = "http://localhost:11434"  # Default Ollama host
 
+    def warmup(self) -> bool:
+        """Ask Ollama to load the model into memory so the first screening doesn't pay for it."""
+        try:
+            # An empty prompt loads the model without generating anything
+            with timed(LLM_REQUEST_SECONDS, "llm_warmup"):
+                ollama.generate(model=self.model, prompt="")
+            logger.info(f"LLM model {self.model} loaded")
+            return True
+        except Exception as e:
+            logger.warning(f"LLM warmup failed, explanations will be unavailable until Ollama is reachable: {str(e)}")
+            return False
+
+    def _options(self) -> dict:
+        if config.LLM_DETERMINISTIC:
+            return {"temperature": 0, "seed": config.LLM_SEED}
+        return {"temperature": 0.7}
+
+    def generate_explanation(self, name: str, matched_entity: dict) -> str:
+        """Generate a risk explanation (served from the explanation cache when possible); raises if Ollama fails"""
+        options = self._options()
+        cache_key = None
+        if config.LLM_CACHE_ENABLED:
+            cache_key = explanation_cache.make_key(name, matched_entity, self.model, options)
+            cached = explanation_cache.get(cache_key)
+            if cached is not None:
+                LLM_INVOCATIONS.labels("cache_hit").inc()
+                logger.info(f"LLM explanation cache hit for {name}")
+                return cached
+
+        prompt = (
+            f"Analyze the risk of an individual named '{name}' who matches a watchlist entry: "
+            f"Unique ID: {matched_entity['unique_id']}, "
+            f"Name: {matched_entity['name']}, "
+            f"Date of Birth: {matched_entity['date_of_birth']}, "
+            f"Risk Category: {matched_entity['risk_category']}. "
+            f"Provide a brief explanation of why this match might indicate a risk."
+        )
+        try:
+            with timed(LLM_REQUEST_SECONDS, "llm_generate"):
+                response = ollama.generate(
+                    model=self.model,
+                    prompt=prompt,
+                    options=options
+                )
+        except Exception:
+            LLM_INVOCATIONS.labels("failed").inc()
+            raise
+        LLM_INVOCATIONS.labels("completed").inc()
+        explanation = response["response"].strip()
+        logger.info(f"LLM analysis completed for {name}")
+        if cache_key is not None:
+            explanation_cache.set(cache_key, explanation, self.model, matched_entity.get("unique_id"))
+        return explanation
+
     def analyze(self, name: str, matched_entity: dict) -> str:
         try:
-            prompt = (
-                f"Analyze the risk of an individual named '{name}' who matches a watchlist entry: "
-                f"Unique ID: {matched_entity['unique_id']}, "
-                f"Name: {matched_entity['name']}, "
-                f"Date of Birth: {matched_entity['date_of_birth']}, "
-                f"Risk Category: {matched_entity['risk_category']}. "
-                f"Provide a brief explanation of why this match might indicate a risk."
-            )
-            response = ollama.generate(
-                model=self.model,
-                prompt=prompt,
-                options={"temperature": 0.7}
-            )
-            explanation = response["response"].strip()
-            logger.info(f"LLM analysis completed for {name}")
-            return explanation
+            return self.generate_explanation(name, matched_entity)
         except Exception as e:
             logger.error(f"LLM analysis failed: {str(e)}")
             return f"LLM analysis failed: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,117 @@
+from prometheus_client import Counter, Histogram
+from config import config
+import contextlib
+import contextvars
+import datetime
+import logging
+import os
+import random
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds; from a cache-hit embedding up to a slow LLM call
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "API request latency", ["method", "route", "status"], buckets=STAGE_BUCKETS
+)
+SCREENING_STAGE_SECONDS = Histogram(
+    "screening_stage_seconds", "Realtime screening time per stage", ["stage"], buckets=STAGE_BUCKETS
+)
+# Per call: one name for realtime screening, a whole chunk for batch screening
+CANDIDATE_SEARCH_SECONDS = Histogram(
+    "candidate_search_seconds", "Candidate search time per step", ["stage"], buckets=STAGE_BUCKETS
+)
+INGEST_STAGE_SECONDS = Histogram(
+    "watchlist_ingest_stage_seconds", "Watchlist ingestion time per chunk and stage", ["stage"], buckets=STAGE_BUCKETS
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds", "Ollama call latency", ["stage"], buckets=STAGE_BUCKETS
+)
+SCREENING_CANDIDATES = Histogram(
+    "screening_candidates", "Candidate entities scored per screened name",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+LLM_INVOCATIONS = Counter(
+    "llm_invocations", "Explanation requests by outcome (cache_hit, completed, failed)", ["outcome"]
+)
+
+# Stage timings of the current request, for its Server-Timing header; None outside a timed request
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+@contextlib.contextmanager
+def timed(histogram, stage: str):
+    """Observe the block's duration in histogram{stage=...} and add it to the current request's Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.labels(stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+def start_request_timing() -> list:
+    """Collect timed() stages for the current request (threads started through run_in_threadpool/to_thread too)"""
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+def server_timing_header(timings, total_seconds: float) -> str:
+    """Server-Timing value: stages repeated within a request (e.g. per ingest chunk) are summed"""
+    durations = {}
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    durations["total"] = total_seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in durations.items())
+
+class SlowRequestProfiler:
+    """Opt-in pyinstrument profiling of slow requests.
+
+    A PROFILER_SAMPLE_RATE share of requests runs under the sampling profiler;
+    the report is kept only when the request took at least PROFILER_SLOW_MS.
+    The event loop thread is profiled: work handed to worker threads shows up
+    as time awaiting them.
+    """
+
+    def __init__(self):
+        self.enabled = config.PROFILER_ENABLED
+        self.sample_rate = config.PROFILER_SAMPLE_RATE
+        self.slow_ms = config.PROFILER_SLOW_MS
+        self.output_dir = config.PROFILER_OUTPUT_DIR
+        self._profiler_class = None
+        if self.enabled:
+            try:
+                from pyinstrument import Profiler
+                self._profiler_class = Profiler
+            except ImportError:
+                logger.warning("PROFILER_ENABLED is set but pyinstrument is not installed; profiling disabled")
+                self.enabled = False
+
+    def start(self):
+        """A running profiler for a sampled request, else None"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        profiler = self._profiler_class(interval=config.PROFILER_INTERVAL_SECONDS, async_mode="enabled")
+        profiler.start()
+        return profiler
+
+    def finish(self, profiler, method: str, path: str, elapsed_seconds: float):
+        profiler.stop()
+        elapsed_ms = elapsed_seconds * 1000
+        if elapsed_ms < self.slow_ms:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+        timestamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        report = os.path.join(self.output_dir, f"{timestamp}-{method}-{slug}-{elapsed_ms:.0f}ms.html")
+        with open(report, "w") as handle:
+            handle.write(profiler.output_html())
+        logger.warning(f"Slow request {method} {path} took {elapsed_ms:.0f}ms, profile written to {report}")
+        return report
+
+# Shared instance for the whole process
+request_profiler = SlowRequestProfiler()
@@ -0,0 +1,121 @@
+import hashlib
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_name(name: str) -> str:
+    """Canonical form of a name for hashing and cache keys: NFKC, casefolded, single-spaced"""
+    if name is None:
+        return ""
+    name = unicodedata.normalize("NFKC", name).casefold()
+    return _WHITESPACE.sub(" ", name).strip()
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+def _country_key(value: str) -> str:
+    """Accent-, case- and punctuation-insensitive lookup key: "Côte d'Ivoire" -> "cote d ivoire" """
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(char for char in value if not unicodedata.combining(char)).casefold().replace("&", " and ")
+    key = _NON_ALNUM.sub(" ", value).strip()
+    return key[4:] if key.startswith("the ") else key
+
+# Spellings ISO 3166 (via pycountry) doesn't carry: short and former names, and demonyms
+COUNTRY_VARIANTS = {
+    "US": ["america", "united states of america", "u s a", "us", "american"],
+    "GB": ["uk", "great britain", "britain", "england", "scotland", "wales", "northern ireland", "british",
+           "english", "scottish", "welsh"],
+    "RU": ["russia", "russian"],
+    "IR": ["persia", "iranian"],
+    "KP": ["dprk", "democratic peoples republic of korea", "north korean"],
+    "KR": ["republic of korea", "rok", "south korean"],
+    "SY": ["syrian"],
+    "CU": ["cuban"], "VE": ["venezuelan"], "BY": ["belarusian", "belarussian", "byelorussia"],
+    "IQ": ["iraqi"], "AF": ["afghan"], "LY": ["libyan"], "SD": ["sudanese"], "SS": ["south sudanese"],
+    "SO": ["somali", "somalian"], "YE": ["yemeni"], "LB": ["lebanese"], "MM": ["burma", "burmese", "myanmarese"],
+    "ZW": ["zimbabwean"], "NI": ["nicaraguan"], "ML": ["malian"], "CF": ["central african"],
+    "CD": ["drc", "dr congo", "congo kinshasa", "democratic republic of congo", "zaire", "congolese"],
+    "CG": ["congo brazzaville", "republic of congo"],
+    "PS": ["palestine", "palestinian", "palestinian territories"],
+    "CN": ["prc", "peoples republic of china", "chinese"], "TW": ["republic of china", "taiwanese"],
+    "HK": ["hong kong sar", "hong konger"], "MO": ["macau", "macao sar"],
+    "VN": ["vietnamese"], "LA": ["lao", "laotian"], "KH": ["cambodian"], "TH": ["thai"],
+    "MY": ["malaysian"], "SG": ["singaporean"], "ID": ["indonesian"], "PH": ["philippine", "filipino"],
+    "JP": ["japanese"], "MN": ["mongolian"], "IN": ["indian"], "PK": ["pakistani"], "BD": ["bangladeshi"],
+    "LK": ["sri lankan", "ceylon"], "NP": ["nepali", "nepalese"], "KZ": ["kazakh", "kazakhstani"],
+    "UZ": ["uzbek"], "TJ": ["tajik"], "TM": ["turkmen"], "KG": ["kyrgyz", "kirghizia"], "AZ": ["azerbaijani"],
+    "AM": ["armenian"], "GE": ["georgian"], "TR": ["turkey", "turkish"], "CY": ["cypriot"],
+    "SA": ["saudi", "saudi arabian"], "AE": ["uae", "u a e", "emirati"], "QA": ["qatari"], "KW": ["kuwaiti"],
+    "BH": ["bahraini"], "OM": ["omani"], "JO": ["jordanian"], "IL": ["israeli"], "EG": ["egyptian"],
+    "DZ": ["algerian"], "MA": ["moroccan"], "TN": ["tunisian"], "NG": ["nigerian"], "GH": ["ghanaian"],
+    "KE": ["kenyan"], "ET": ["ethiopian"], "ER": ["eritrean"], "UG": ["ugandan"], "TZ": ["tanzanian"],
+    "RW": ["rwandan"], "BI": ["burundian"], "ZA": ["south african"], "AO": ["angolan"], "MZ": ["mozambican"],
+    "ZM": ["zambian"], "CM": ["cameroonian"], "SN": ["senegalese"], "CI": ["ivory coast", "ivorian"],
+    "NE": ["nigerien"], "TD": ["chadian"], "BF": ["burkinabe"], "GN": ["guinean"], "GW": ["bissau guinean"],
+    "CV": ["cape verde", "cape verdean"], "SZ": ["swaziland", "swazi"], "MG": ["malagasy"],
+    "MX": ["mexican"], "GT": ["guatemalan"], "HN": ["honduran"], "SV": ["salvadoran"], "PA": ["panamanian"],
+    "CR": ["costa rican"], "HT": ["haitian"], "DO": ["dominican republic"], "JM": ["jamaican"],
+    "CO": ["colombian"], "EC": ["ecuadorian"], "PE": ["peruvian"], "BO": ["bolivian"], "BR": ["brazilian"],
+    "PY": ["paraguayan"], "UY": ["uruguayan"], "AR": ["argentine", "argentinian"], "CL": ["chilean"],
+    "CA": ["canadian"], "AU": ["australian"], "NZ": ["new zealander", "kiwi"], "DE": ["german"],
+    "FR": ["french"], "ES": ["spanish"], "PT": ["portuguese"], "IT": ["italian"], "NL": ["holland", "dutch"],
+    "BE": ["belgian"], "LU": ["luxembourgish", "luxembourger"], "CH": ["swiss"], "AT": ["austrian"],
+    "IE": ["irish"], "DK": ["danish"], "NO": ["norwegian"], "SE": ["swedish"], "FI": ["finnish"],
+    "IS": ["icelandic"], "PL": ["polish"], "CZ": ["czech republic", "czech"], "SK": ["slovak"],
+    "HU": ["hungarian"], "RO": ["romanian"], "BG": ["bulgarian"], "GR": ["greek"], "AL": ["albanian"],
+    "RS": ["serbian"], "HR": ["croatian"], "BA": ["bosnia", "bosnian"], "ME": ["montenegrin"],
+    "MK": ["macedonia", "macedonian"], "SI": ["slovenian", "slovene"], "UA": ["ukrainian"],
+    "MD": ["moldovan"], "LT": ["lithuanian"], "LV": ["latvian"], "EE": ["estonian"],
+    "TL": ["east timor", "timorese"], "VA": ["vatican", "vatican city", "holy see"],
+    "FM": ["micronesia"], "BN": ["brunei"], "KN": ["st kitts and nevis"], "LC": ["st lucia"],
+    "VC": ["st vincent and the grenadines"],
+    # Not assigned in ISO 3166 but used by sanctions lists
+    "XK": ["xk", "xkx", "kosovo", "kosovar"],
+}
+
+def _build_country_codes() -> dict:
+    import pycountry
+    codes = {}
+    for country in pycountry.countries:
+        names = [country.alpha_2, country.alpha_3, country.name]
+        names += [getattr(country, field) for field in ("common_name", "official_name") if hasattr(country, field)]
+        if ", " in country.name:
+            # "Korea, Republic of" -> "Republic of Korea"
+            head, tail = country.name.split(", ", 1)
+            names.append(f"{tail} {head}")
+        for name in names:
+            codes.setdefault(_country_key(name), country.alpha_2)
+    for code, names in COUNTRY_VARIANTS.items():
+        for name in names:
+            codes[_country_key(name)] = code
+    return codes
+
+# Normalized spelling -> ISO 3166 alpha-2 code stored on watchlist entities and compared in STRUCTURED_FILTERS
+COUNTRY_CODES = _build_country_codes()
+
+def normalize_country(value: str):
+    """ISO alpha-2 code for a country name, demonym or alpha-2/alpha-3 code.
+
+    None when blank or unrecognised: nationality is an exact-match screening
+    filter, so an unresolved spelling must disable the filter rather than
+    exclude entities recorded under the proper code.
+    """
+    if value is None:
+        return None
+    return COUNTRY_CODES.get(_country_key(value))
+
+def clean_aliases(name: str, aliases) -> list[str]:
+    """Drop blank aliases, aliases equal to the primary name and duplicates (after normalization), keeping order"""
+    seen = {normalize_name(name)}
+    cleaned = []
+    for alias in aliases or []:
+        key = normalize_name(alias)
+        if key and key not in seen:
+            seen.add(key)
+            cleaned.append(alias.strip())
+    return cleaned
+
+def name_content_hash(name: str, aliases=None) -> str:
+    """Hash of everything that goes into an entity's embeddings; equal hashes mean re-embedding can be skipped"""
+    parts = [normalize_name(name)] + sorted(normalize_name(alias) for alias in aliases or [])
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
@@ -0,0 +1,129 @@
+import threading
+import time
+import logging
+from servicesembedding import EmbeddingGenerator, create_embedding_generator
+from servicesllm import LLMAnalyzer
+from servicesbatching import EmbeddingBatcher
+from servicescache import EmbeddingCache
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """Process-wide holder for the embedding model and LLM analyzer.
+
+    Each uvicorn/gunicorn worker process owns exactly one registry, so the
+    SentenceTransformer weights are loaded once per process and shared by all
+    request threads. Loading is guarded by a lock so concurrent first requests
+    cannot trigger duplicate loads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._embedding_generator = None
+        self._llm_analyzer = None
+        self._embedding_batcher = None
+        self._embedding_cache = None
+        self._query_embedder = None
+        self.warmup_seconds = None
+        self.embedding_load_seconds = None
+        self.llm_warmup_seconds = None
+        self.llm_available = False
+
+    def get_embedding_generator(self) -> EmbeddingGenerator:
+        if self._embedding_generator is None:
+            with self._lock:
+                if self._embedding_generator is None:
+                    start = time.perf_counter()
+                    self._embedding_generator = create_embedding_generator()
+                    self.embedding_load_seconds = time.perf_counter() - start
+                    logger.info(
+                        f"Loaded {self._embedding_generator.backend} embedding backend in {self.embedding_load_seconds:.2f}s"
+                    )
+        return self._embedding_generator
+
+    def set_embedding_generator(self, generator):
+        """Use an already constructed generator (e.g. a benchmark stand-in) instead of loading EMBEDDING_MODEL.
+
+        Must be called before the first get_query_embedder(), which wraps the generator.
+        """
+        with self._lock:
+            self._embedding_generator = generator
+            self.embedding_load_seconds = 0.0
+
+    def get_query_embedder(self):
+        """Embedder for screening names: embedding cache -> micro-batcher -> generator, as enabled."""
+        if self._query_embedder is None:
+            generator = self.get_embedding_generator()
+            with self._lock:
+                if self._query_embedder is None:
+                    embedder = generator
+                    if config.EMBEDDING_COALESCING_ENABLED:
+                        self._embedding_batcher = EmbeddingBatcher(
+                            generator,
+                            window_ms=config.EMBEDDING_BATCH_WINDOW_MS,
+                            max_batch_size=config.EMBEDDING_MAX_BATCH_SIZE
+                        )
+                        embedder = self._embedding_batcher
+                    if config.EMBEDDING_CACHE_SIZE > 0:
+                        self._embedding_cache = EmbeddingCache(
+                            embedder,
+                            capacity=config.EMBEDDING_CACHE_SIZE,
+                            path=config.EMBEDDING_CACHE_PATH or None,
+                            # Cached vectors from another backend or model must not be reused
+                            model_version=generator.model_version
+                        )
+                        embedder = self._embedding_cache
+                    self._query_embedder = embedder
+        return self._query_embedder
+
+    def get_llm_analyzer(self) -> LLMAnalyzer:
+        if self._llm_analyzer is None:
+            with self._lock:
+                if self._llm_analyzer is None:
+                    self._llm_analyzer = LLMAnalyzer()
+        return self._llm_analyzer
+
+    def warmup(self):
+        """Load the embedding model and preload the Ollama model. Called once at startup."""
+        start = time.perf_counter()
+        generator = self.get_embedding_generator()
+        # Run one encode so lazy kernels/tokenizer caches are initialised before traffic
+        generator.generate_embedding("warmup")
+        self.get_query_embedder()
+        if self._embedding_batcher is not None:
+            self._embedding_batcher.start()
+
+        llm_start = time.perf_counter()
+        self.llm_available = self.get_llm_analyzer().warmup()
+        self.llm_warmup_seconds = time.perf_counter() - llm_start
+
+        self.warmup_seconds = time.perf_counter() - start
+        logger.info(
+            f"Model warmup completed in {self.warmup_seconds:.2f}s "
+            f"(embedding load: {self.embedding_load_seconds:.2f}s, llm: {self.llm_warmup_seconds:.2f}s)"
+        )
+
+    def shutdown(self):
+        if self._embedding_batcher is not None:
+            self._embedding_batcher.stop()
+        if self._embedding_cache is not None:
+            self._embedding_cache.close()
+
+    def is_ready(self) -> bool:
+        return self._embedding_generator is not None and self.warmup_seconds is not None
+
+    def status(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "embedding_model_loaded": self._embedding_generator is not None,
+            "llm_available": self.llm_available,
+            "warmup_seconds": self.warmup_seconds,
+            "embedding_load_seconds": self.embedding_load_seconds,
+            "llm_warmup_seconds": self.llm_warmup_seconds,
+            "embedding_batcher": self._embedding_batcher.stats() if self._embedding_batcher else None,
+            "embedding_cache": self._embedding_cache.stats() if self._embedding_cache else None,
+        }
+
+# Shared instance for the whole process
+registry = ModelRegistry()
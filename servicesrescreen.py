@@ -0,0 +1,239 @@
+from sqlalchemy import select, insert, update, func
+from databaseconnection import engine
+from databasemodels import (
+    WatchlistEntity, WatchlistAlias, WatchlistChange, CustomerEmbedding, DeltaRescreenRun, ScreeningRecord, ScreeningMatch
+)
+from servicesscreening import describe_match, birth_year_compatible
+from servicesvectorindex import normalize_rows
+from serviceslexical import score_match
+from servicesnormalization import normalize_name
+from config import config
+import numpy as np
+import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def candidate_similarity_floor() -> float:
+    """Lowest cosine at which a pair can still reach MATCH_SCORE_THRESHOLD, assuming a perfect edit similarity.
+
+    Realtime screening also admits lexical candidates whatever their cosine,
+    so the rescreen gates on the composite score's bound rather than on the
+    vector stage's MATCH_THRESHOLD.
+    """
+    total_weight = config.MATCH_SCORE_VECTOR_WEIGHT + config.MATCH_SCORE_EDIT_WEIGHT
+    if config.MATCH_SCORE_VECTOR_WEIGHT <= 0:
+        return -1.0
+    return (config.MATCH_SCORE_THRESHOLD * total_weight - config.MATCH_SCORE_EDIT_WEIGHT) / config.MATCH_SCORE_VECTOR_WEIGHT
+
+class DeltaRescreener:
+    """Re-screens stored customer embeddings against only the watchlist entities changed since the last run.
+
+    Changes come from the watchlist_changes changelog; each run covers the
+    change ids after the previous completed run. Customers are streamed in
+    chunks and compared with one (customers x changed name/alias vectors) matrix
+    product per chunk, so the cost is O(changes x customers) instead of a
+    full rescreen. Every affected customer gets a new "Delta" screening
+    record holding its matches against the changed entities.
+    """
+
+    def __init__(self, db_session, chunk_size: int = None):
+        self.db = db_session
+        self.chunk_size = chunk_size or config.DELTA_RESCREEN_CHUNK_SIZE
+
+    def pending_changes(self):
+        """(from_change_id, to_change_id) for the next run; equal ids mean nothing to do"""
+        from_change_id = self.db.execute(
+            select(func.coalesce(func.max(DeltaRescreenRun.to_change_id), 0))
+            .where(DeltaRescreenRun.status == "completed")
+        ).scalar()
+        # Changes logged in the last few seconds may belong to transactions that have not committed yet
+        settled = func.clock_timestamp() - datetime.timedelta(seconds=config.DELTA_RESCREEN_SETTLE_SECONDS)
+        to_change_id = self.db.execute(
+            select(func.coalesce(func.max(WatchlistChange.id), 0)).where(WatchlistChange.changed_at < settled)
+        ).scalar()
+        return from_change_id, max(from_change_id, to_change_id)
+
+    def run(self, dry_run: bool = False) -> dict:
+        start = time.perf_counter()
+        from_change_id, to_change_id = self.pending_changes()
+        stats = {
+            "from_change_id": from_change_id,
+            "to_change_id": to_change_id,
+            "changed_entities": 0,
+            "customers_scanned": 0,
+            "customers_matched": 0,
+            "matches_created": 0,
+        }
+        if to_change_id == from_change_id:
+            logger.info("Delta rescreen: no watchlist changes since the last run")
+            return stats
+
+        run = None
+        if not dry_run:
+            run = DeltaRescreenRun(
+                status="running",
+                from_change_id=from_change_id,
+                to_change_id=to_change_id,
+                started_at=datetime.datetime.utcnow()
+            )
+            self.db.add(run)
+            self.db.commit()
+        try:
+            entities = self._load_changed_entities(from_change_id, to_change_id)
+            stats["changed_entities"] = len(entities)
+            affected = self._find_affected_customers(entities, stats) if entities else []
+            stats["customers_matched"] = len(affected)
+            stats["matches_created"] = sum(len(matches) for _, matches in affected)
+            if not dry_run:
+                self._persist(affected)
+                run.status = "completed"
+                run.changed_entities = stats["changed_entities"]
+                run.customers_scanned = stats["customers_scanned"]
+                run.customers_matched = stats["customers_matched"]
+                run.matches_created = stats["matches_created"]
+                run.finished_at = datetime.datetime.utcnow()
+                self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Delta rescreen of changes {from_change_id + 1}..{to_change_id} failed: {str(e)}")
+            if run is not None:
+                run.status = "failed"
+                run.message = str(e)
+                run.finished_at = datetime.datetime.utcnow()
+                self.db.commit()
+            raise
+        stats["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(
+            f"Delta rescreen of {stats['changed_entities']} changed entities against {stats['customers_scanned']} "
+            f"customers in {stats['elapsed_seconds']}s: {stats['customers_matched']} customers matched"
+        )
+        return stats
+
+    def _load_changed_entities(self, from_change_id: int, to_change_id: int):
+        changed_ids = (
+            select(WatchlistChange.watchlist_entity_id)
+            .where(WatchlistChange.id > from_change_id, WatchlistChange.id <= to_change_id)
+            .distinct()
+        )
+        entities = self.db.execute(
+            select(
+                WatchlistEntity.id,
+                WatchlistEntity.unique_id,
+                WatchlistEntity.name,
+                WatchlistEntity.dates_of_birth,
+                WatchlistEntity.risk_category,
+                WatchlistEntity.birth_years,
+                WatchlistEntity.name_embedding,
+            ).where(WatchlistEntity.id.in_(changed_ids), WatchlistEntity.name_embedding.isnot(None))
+            .order_by(WatchlistEntity.id)
+        ).fetchall()
+        aliases = {}
+        for row in self.db.execute(
+            select(WatchlistAlias.watchlist_entity_id, WatchlistAlias.alias, WatchlistAlias.alias_embedding)
+            .where(WatchlistAlias.watchlist_entity_id.in_(changed_ids))
+            .order_by(WatchlistAlias.watchlist_entity_id, WatchlistAlias.id)
+        ):
+            aliases.setdefault(row.watchlist_entity_id, []).append(row)
+        return [(entity, aliases.get(entity.id, [])) for entity in entities]
+
+    def _find_affected_customers(self, entities, stats):
+        """[(customer row, [(entity, match details), ...])] for customers matching a changed entity.
+
+        Customers are not in the lexical index, so every pair whose cosine could
+        still reach MATCH_SCORE_THRESHOLD (plus exact name matches) is scored
+        like a realtime match.
+        """
+        # One column per name/alias vector; each entity's columns are contiguous, starting at starts[i]
+        variants, embeddings, starts = [], [], []
+        for entity, aliases in entities:
+            starts.append(len(variants))
+            variants.append(entity.name)
+            embeddings.append(entity.name_embedding)
+            for alias in aliases:
+                variants.append(alias.alias)
+                embeddings.append(alias.alias_embedding)
+        vector_matrix = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        ends = starts[1:] + [len(variants)]
+        # Exact name/alias matches score 1.0 whatever their cosine
+        exact_columns = {}
+        for column, (start, end) in enumerate(zip(starts, ends)):
+            for variant in variants[start:end]:
+                exact_columns.setdefault(normalize_name(variant), set()).add(column)
+        floor = candidate_similarity_floor()
+        affected = []
+        # A separate connection so the server-side cursor survives while the session is used elsewhere
+        with engine.connect() as conn:
+            customers = conn.execution_options(stream_results=True, yield_per=self.chunk_size).execute(
+                select(
+                    CustomerEmbedding.id,
+                    CustomerEmbedding.customer_id,
+                    CustomerEmbedding.name,
+                    CustomerEmbedding.date_of_birth,
+                    CustomerEmbedding.name_embedding,
+                )
+            )
+            for chunk in customers.partitions():
+                stats["customers_scanned"] += len(chunk)
+                customer_matrix = normalize_rows(
+                    np.asarray([customer.name_embedding for customer in chunk], dtype=np.float32)
+                )
+                vector_similarities = customer_matrix @ vector_matrix.T
+                # Best name or alias similarity per entity
+                similarities = np.maximum.reduceat(vector_similarities, starts, axis=1)
+                candidates = similarities >= floor
+                for row, customer in enumerate(chunk):
+                    for column in exact_columns.get(normalize_name(customer.name), ()):
+                        candidates[row, column] = True
+                for row in np.flatnonzero(candidates.any(axis=1)):
+                    customer = chunk[row]
+                    matches = []
+                    for column in np.flatnonzero(candidates[row]):
+                        if not birth_year_compatible(entities[column][0].birth_years, customer.date_of_birth):
+                            continue
+                        start, end = starts[column], ends[column]
+                        score = score_match(customer.name, variants[start:end], vector_similarities[row, start:end])
+                        if score["match_score"] >= config.MATCH_SCORE_THRESHOLD:
+                            matches.append((entities[column][0], describe_match(entities[column][0], score)))
+                    if matches:
+                        # Best first, as in realtime screening
+                        matches.sort(key=lambda match: -match[1]["match_score"])
+                        affected.append((customer, matches))
+        return affected
+
+    def _persist(self, affected):
+        if not affected:
+            return
+        screening_time = datetime.datetime.utcnow()
+        records = []
+        for customer, matches in affected:
+            records.append({
+                "name": customer.name,
+                "date_of_birth": customer.date_of_birth,
+                "screening_type": "Delta",
+                "screening_time": screening_time,
+                "matched": True,
+                "risk_score": sum(details["match_score"] for _, details in matches) / len(matches),
+                "explanation_status": "not_requested",
+            })
+        screening_ids = self.db.execute(
+            insert(ScreeningRecord).returning(ScreeningRecord.id, sort_by_parameter_order=True),
+            records
+        ).scalars().all()
+        match_rows = []
+        for screening_id, (customer, matches) in zip(screening_ids, affected):
+            for entity, details in matches:
+                match_rows.append({
+                    "screening_id": screening_id,
+                    "watchlist_entity_id": entity.id,
+                    "match_type": details["match_type"],
+                    "match_score": details["match_score"],
+                })
+        self.db.execute(insert(ScreeningMatch), match_rows)
+        # ORM bulk UPDATE by primary key (executemany)
+        self.db.execute(
+            update(CustomerEmbedding),
+            [{"id": customer.id, "last_screening_id": screening_id}
+             for screening_id, (customer, _) in zip(screening_ids, affected)]
+        )
@@ -1,121 +1,411 @@
-from databasemodels import WatchlistEntity, ScreeningRecord, ScreeningMatch
-from servicesembedding import EmbeddingGenerator
-from servicesllm import LLMAnalyzer
+from databasemodels import WatchlistEntity, WatchlistAlias, ScreeningRecord, WatchlistChange, vector_param
+from servicesregistry import registry
+from servicesexplanations import explanation_queue
+from servicescache import explanation_cache
+from servicesvectorindex import vector_mirror
+from servicesaudit import screening_audit, screening_audit_writer, persist_screening, persist_screening_async
+from servicesmetrics import timed, SCREENING_STAGE_SECONDS, CANDIDATE_SEARCH_SECONDS, SCREENING_CANDIDATES
+from servicesstats import stats_counters
+from servicesnormalization import name_content_hash, clean_aliases, normalize_country
+from serviceslexical import name_keys, score_match, replace_name_keys
+from databasemaintenance import apply_search_params, apply_search_params_async
+from config import config
 from sqlalchemy import text
 from pgvector.sqlalchemy import Vector
+import asyncio
 import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Minimum cosine similarity for a vector (stage one) candidate; matches are decided by MATCH_SCORE_THRESHOLD
+MATCH_THRESHOLD = 0.6  # Changed from 0.8 to allow broader fuzzy matches
+
+# Structured filters, applied inside every candidate source rather than to the final matches. Per
+# query (q): a DOB year window and a nationality; per request: risk categories and an entity type.
+# Entities with no recorded DOB or nationality are never excluded by those filters.
+STRUCTURED_FILTERS = (
+    "(q.birth_window IS NULL OR coalesce(cardinality(e.birth_years), 0) = 0 OR e.birth_years && q.birth_window) "
+    "AND (q.nationality IS NULL OR e.nationality IS NULL OR e.nationality = q.nationality) "
+    "AND (CAST(:risk_categories AS text[]) IS NULL OR e.risk_category = ANY(CAST(:risk_categories AS text[]))) "
+    "AND (CAST(:entity_type AS text) IS NULL OR e.entity_type = CAST(:entity_type AS text))"
+)
+
+# Two-stage candidate search for a batch of queries (:embeddings, numbered from 1 by ord).
+# Stage one pools lexical candidates (entities sharing enough trigram/phonetic keys with the
+# query, from :key_ords/:keys) with vector candidates ({semantic}); stage two returns every
+# pooled entity's name and alias distances so the caller can rerank them.
+CANDIDATES_SQL = (
+    "WITH queries AS ("
+    "  SELECT ord, embedding, nationality, "
+    "    CASE WHEN birth_year IS NOT NULL THEN "
+    "      ARRAY(SELECT generate_series(birth_year - :dob_tolerance, birth_year + :dob_tolerance)) "
+    "    END AS birth_window "
+    "  FROM unnest(CAST(:embeddings AS vector[]), CAST(:birth_years AS int[]), CAST(:nationalities AS text[])) "
+    "    WITH ORDINALITY AS q(embedding, birth_year, nationality, ord)"
+    "), query_keys AS ("
+    "  SELECT qk.ord, qk.key, count(*) OVER (PARTITION BY qk.ord) AS usable_keys "
+    "  FROM unnest(CAST(:key_ords AS bigint[]), CAST(:keys AS text[])) AS qk(ord, key) "
+    # Keys shared by very many entities narrow nothing down and cost the most to aggregate
+    "  WHERE (SELECT count(*) FROM ("
+    "    SELECT 1 FROM watchlist_name_keys k WHERE k.key = qk.key LIMIT :max_postings + 1"
+    "  ) AS postings) <= :max_postings"
+    "), lexical AS ("
+    "  SELECT ord, entity_id FROM ("
+    "    SELECT m.ord, m.entity_id, "
+    "      row_number() OVER (PARTITION BY m.ord ORDER BY m.shared DESC, m.entity_id) AS rank "
+    "    FROM ("
+    "      SELECT qk.ord, k.watchlist_entity_id AS entity_id, count(*) AS shared "
+    "      FROM query_keys qk JOIN watchlist_name_keys k ON k.key = qk.key "
+    "      GROUP BY qk.ord, k.watchlist_entity_id, qk.usable_keys "
+    "      HAVING count(*) >= CAST(:min_key_overlap AS float8) * qk.usable_keys"
+    "    ) AS m "
+    "    JOIN queries q ON q.ord = m.ord JOIN watchlist_entities e ON e.id = m.entity_id "
+    "    WHERE " + STRUCTURED_FILTERS +
+    "  ) AS ranked WHERE rank <= :lexical_limit"
+    "), semantic AS ({semantic}"
+    "), pool AS ("
+    "  SELECT ord, entity_id FROM lexical UNION SELECT ord, entity_id FROM semantic"
+    ") "
+    "SELECT pool.ord, e.id, e.unique_id, e.name, e.dates_of_birth, e.risk_category, v.variants, v.distances "
+    "FROM pool JOIN queries q ON q.ord = pool.ord JOIN watchlist_entities e ON e.id = pool.entity_id "
+    "CROSS JOIN LATERAL ("
+    "  SELECT array_agg(variant ORDER BY position) AS variants, array_agg(distance ORDER BY position) AS distances "
+    "  FROM ("
+    "    SELECT 0 AS position, e.name AS variant, e.name_embedding <=> q.embedding AS distance "
+    "    UNION ALL "
+    "    SELECT a.id, a.alias, a.alias_embedding <=> q.embedding FROM watchlist_aliases a "
+    "    WHERE a.watchlist_entity_id = e.id"
+    "  ) AS vectors"
+    ") AS v "
+    "WHERE e.name_embedding IS NOT NULL AND " + STRUCTURED_FILTERS
+)
+
+# Vector candidates from pgvector: separate name and alias probes, so each can use its own ANN
+# index. The index scan yields its nearest neighbours and the filters are applied to them afterwards,
+# so selective filters rely on search_params_statement() (iterative scans, or a wider search)
+POSTGRES_CANDIDATES_SQL = text(CANDIDATES_SQL.format(semantic=(
+    "  SELECT q.ord, probe.entity_id FROM queries q CROSS JOIN LATERAL ("
+    "    (SELECT e.id AS entity_id, e.name_embedding <=> q.embedding AS distance FROM watchlist_entities e "
+    "     WHERE " + STRUCTURED_FILTERS + " ORDER BY e.name_embedding <=> q.embedding LIMIT :limit)"
+    "    UNION ALL "
+    "    (SELECT a.watchlist_entity_id, a.alias_embedding <=> q.embedding FROM watchlist_aliases a "
+    "     JOIN watchlist_entities e ON e.id = a.watchlist_entity_id "
+    "     WHERE " + STRUCTURED_FILTERS + " ORDER BY a.alias_embedding <=> q.embedding LIMIT :alias_limit)"
+    "  ) AS probe WHERE probe.distance < :max_distance"
+)))
+
+# Vector candidates already found by the in-memory mirror (which has no filters: they apply in the final select)
+MEMORY_CANDIDATES_SQL = text(CANDIDATES_SQL.format(semantic=(
+    "  SELECT ord, entity_id FROM unnest(CAST(:semantic_ords AS bigint[]), CAST(:semantic_ids AS int[])) "
+    "  AS hit(ord, entity_id)"
+)))
+
+def birth_year_compatible(birth_years, date_of_birth) -> bool:
+    """The DOB filter of STRUCTURED_FILTERS in Python, for matches found outside the candidate query"""
+    if not birth_years or date_of_birth is None:
+        return True
+    return any(abs(year - date_of_birth.year) <= config.SCREENING_DOB_YEAR_TOLERANCE for year in birth_years)
+
+def resolve_limits(top_k=None, threshold=None):
+    """(top_k, threshold) for a screening request, defaulted from config; top_k is capped at SCREENING_MAX_TOP_K"""
+    if top_k is None:
+        top_k = config.SCREENING_DEFAULT_TOP_K
+    top_k = int(top_k)
+    if top_k < 1:
+        raise ValueError("top_k must be at least 1")
+    if threshold is None:
+        threshold = config.MATCH_SCORE_THRESHOLD
+    threshold = float(threshold)
+    if not 0.0 <= threshold <= 1.0:
+        raise ValueError("threshold must be between 0 and 1")
+    return min(top_k, config.SCREENING_MAX_TOP_K), threshold
+
+def _candidate_query(names, embeddings, dates_of_birth=None, nationalities=None, risk_categories=None,
+                     entity_type=None, top_k=None, threshold=None):
+    """(statement, params, top_k, threshold) of the candidate query for search_candidates()"""
+    top_k, threshold = resolve_limits(top_k, threshold)
+    # A threshold below the vector floor widens the vector candidate net with it
+    max_distance = 1 - min(MATCH_THRESHOLD, threshold)
+    # One candidate beyond top_k per source, so a full result can be told apart from a truncated one
+    params = {
+        "embeddings": [vector_param(embedding) for embedding in embeddings],
+        "birth_years": [dob.year if dob else None for dob in dates_of_birth or [None] * len(names)],
+        "nationalities": [normalize_country(value) for value in nationalities or [None] * len(names)],
+        "dob_tolerance": config.SCREENING_DOB_YEAR_TOLERANCE,
+        "risk_categories": list(risk_categories) if risk_categories else None,
+        "entity_type": entity_type.upper() if entity_type else None,
+        "key_ords": [],
+        "keys": [],
+        "min_key_overlap": config.LEXICAL_MIN_KEY_OVERLAP,
+        "max_postings": config.LEXICAL_MAX_KEY_POSTINGS,
+        "lexical_limit": max(config.LEXICAL_CANDIDATE_LIMIT, top_k + 1),
+    }
+    for ord, name in enumerate(names, start=1):
+        for key in name_keys([name]):
+            params["key_ords"].append(ord)
+            params["keys"].append(key)
+    if config.SCREENING_ENGINE == "memory" and vector_mirror.is_loaded():
+        nearest = vector_mirror.search_many(embeddings, max_distance, max(config.SCREENING_CANDIDATE_LIMIT, top_k + 1))
+        params["semantic_ords"] = [ord for ord, found in enumerate(nearest, start=1) for _ in found]
+        params["semantic_ids"] = [entity_id for found in nearest for entity_id, _ in found]
+        return MEMORY_CANDIDATES_SQL, params, top_k, threshold
+    params.update({
+        "max_distance": max_distance,
+        "limit": max(config.SCREENING_CANDIDATE_LIMIT, top_k + 1),
+        "alias_limit": max(config.SCREENING_ALIAS_CANDIDATE_LIMIT, top_k + 1),
+    })
+    return POSTGRES_CANDIDATES_SQL, params, top_k, threshold
+
+def _is_filtered(params) -> bool:
+    """Whether any structured filter applies to a candidate query"""
+    return bool(
+        params["risk_categories"] or params["entity_type"] or any(params["nationalities"])
+        or any(year is not None for year in params["birth_years"])
+    )
+
+def _rank_candidates(names, rows, top_k, threshold):
+    """Score candidate rows and keep each name's best top_k at or above threshold"""
+    matches = [[] for _ in names]
+    candidates = [0] * len(names)
+    for row in rows:
+        candidates[row.ord - 1] += 1
+        score = score_match(names[row.ord - 1], row.variants, [1 - distance for distance in row.distances])
+        if score["match_score"] >= threshold:
+            matches[row.ord - 1].append((row, score))
+    for count in candidates:
+        SCREENING_CANDIDATES.observe(count)
+    results = []
+    for found in matches:
+        found.sort(key=lambda match: (-match[1]["match_score"], match[0].id))
+        results.append((found[:top_k], len(found) > top_k))
+    return results
+
+def search_candidates(db, names, embeddings, dates_of_birth=None, nationalities=None,
+                      risk_categories=None, entity_type=None, top_k=None, threshold=None):
+    """Matches for a batch of query names: per name, ([(entity row, score_match() dict)], truncated).
+
+    Each list holds the best top_k matches scoring at least threshold;
+    truncated is True when more matches qualified. dates_of_birth and
+    nationalities are optional per-name lists (None entries disable that
+    filter for the name); risk_categories and entity_type apply to the whole
+    batch.
+    """
+    statement, params, top_k, threshold = _candidate_query(
+        names, embeddings, dates_of_birth, nationalities, risk_categories, entity_type, top_k, threshold
+    )
+    if statement is POSTGRES_CANDIDATES_SQL:
+        apply_search_params(db, filtered=_is_filtered(params))
+    with timed(CANDIDATE_SEARCH_SECONDS, "candidate_query"):
+        rows = db.execute(statement, params).all()
+    with timed(CANDIDATE_SEARCH_SECONDS, "candidate_rescoring"):
+        return _rank_candidates(names, rows, top_k, threshold)
+
+async def search_candidates_async(db, names, embeddings, dates_of_birth=None, nationalities=None,
+                                  risk_categories=None, entity_type=None, top_k=None, threshold=None):
+    """search_candidates() for an AsyncSession"""
+    statement, params, top_k, threshold = _candidate_query(
+        names, embeddings, dates_of_birth, nationalities, risk_categories, entity_type, top_k, threshold
+    )
+    if statement is POSTGRES_CANDIDATES_SQL:
+        await apply_search_params_async(db, filtered=_is_filtered(params))
+    with timed(CANDIDATE_SEARCH_SECONDS, "candidate_query"):
+        rows = (await db.execute(statement, params)).all()
+    with timed(CANDIDATE_SEARCH_SECONDS, "candidate_rescoring"):
+        return _rank_candidates(names, rows, top_k, threshold)
+
+def describe_match(entity, score: dict) -> dict:
+    """Response fields for one matched watchlist entity"""
+    return {
+        "unique_id": entity.unique_id,
+        "name": entity.name,
+        "matched_alias": score["matched_alias"],
+        "date_of_birth": entity.dates_of_birth[0].isoformat() if entity.dates_of_birth else None,
+        "risk_category": entity.risk_category,
+        "match_type": "Exact" if score["exact"] else "Fuzzy",
+        "match_score": score["match_score"],
+        "vector_similarity": score["vector_similarity"],
+        "edit_similarity": score["edit_similarity"],
+    }
+
+def _new_screening_record(name, date_of_birth, screening_type, watchlist_entities):
+    """Unsaved ScreeningRecord for a screening's results, plus its (entity id, describe_match()) pairs"""
+    matches = [(entity.id, describe_match(entity, score)) for entity, score in watchlist_entities]
+    record = ScreeningRecord(
+        name=name,
+        date_of_birth=date_of_birth,
+        screening_type=screening_type,
+        screening_time=datetime.datetime.utcnow(),
+        matched=bool(matches),
+        risk_score=sum(details["match_score"] for _, details in matches) / len(matches) if matches else None,
+    )
+    if not matches:
+        record.llm_explanation = "No matches found"
+        record.explanation_status = "not_required"
+    elif config.LLM_EXPLANATION_MODE == "async":
+        # Generated by the background explanation queue after we respond
+        record.explanation_status = "pending"
+    return record, matches
+
+def _mark_explanation_queue_full(screening_record):
+    screening_record.llm_explanation = "LLM analysis failed: explanation queue is full"
+    screening_record.explanation_status = "failed"
+    explanation_queue.store(screening_record.id, screening_record.llm_explanation, "failed")
+
+def _screening_response(screening_record, matches, truncated):
+    return {
+        "screening_id": screening_record.id,
+        "name": screening_record.name,
+        "date_of_birth": screening_record.date_of_birth.isoformat() if screening_record.date_of_birth else None,
+        "screening_time": screening_record.screening_time.isoformat(),
+        "matched": bool(matches),
+        "risk_score": screening_record.risk_score if matches else 0.0,
+        "explanation": screening_record.llm_explanation,
+        "explanation_status": screening_record.explanation_status,
+        "matches": [details for _, details in matches],
+        "truncated": truncated
+    }
+
+def _explanation_response(record):
+    if record is None:
+        return None
+    return {
+        "screening_id": record.id,
+        # Rows written before explanation_status existed always had their explanation inline
+        "status": record.explanation_status or "completed",
+        "explanation": record.llm_explanation,
+    }
+
+# Steps of screen_entity() shared by ScreeningService and AsyncScreeningService. The blocking ones
+# (embedding, LLM, audit writer, counters) are plain functions the async service runs in a worker thread.
+
+def _embed_query(embedder, name: str):
+    with timed(SCREENING_STAGE_SECONDS, "embedding"):
+        name_embedding = embedder.generate_embedding(name)
+    logger.info(f"Generated embedding for name: {name}")
+    return name_embedding
+
+def _explain_inline(llm_analyzer, screening_record, name: str, matches):
+    """Explain the first match during the request, unless there is none or the explanation queue does it"""
+    if not matches or config.LLM_EXPLANATION_MODE == "async":
+        return
+    with timed(SCREENING_STAGE_SECONDS, "llm_explanation"):
+        try:
+            screening_record.llm_explanation = llm_analyzer.generate_explanation(name, matches[0][1])
+            screening_record.explanation_status = "completed"
+        except Exception as e:
+            logger.error(f"LLM analysis failed: {str(e)}")
+            screening_record.llm_explanation = f"LLM analysis failed: {str(e)}"
+            screening_record.explanation_status = "failed"
+
+def _submit_to_audit_writer(screening_record, matches, name_embedding):
+    """Reserve the record's id and buffer its rows; submit() flushes synchronously when the buffer is full"""
+    screening_record.id = screening_audit_writer.next_id()
+    screening_audit_writer.submit(screening_audit(screening_record, matches, name_embedding))
+
+def _complete_screening(screening_record, matches, truncated):
+    """Counters and the queued explanation of a persisted screening; returns the response"""
+    stats_counters.add_screenings(1, int(bool(matches)))
+    logger.info(f"Saved screening record with ID: {screening_record.id}")
+    if (
+        matches and config.LLM_EXPLANATION_MODE == "async"
+        and not explanation_queue.submit(screening_record.id, screening_record.name, matches[0][1])
+    ):
+        _mark_explanation_queue_full(screening_record)
+    return _screening_response(screening_record, matches, truncated)
+
 class ScreeningService:
     def __init__(self, db_session):
         self.db = db_session
-        self.embedding_generator = EmbeddingGenerator()
-        self.llm_analyzer = LLMAnalyzer()
-
-    def screen_entity(self, name: str, date_of_birth: datetime.date = None, screening_type: str = "Real-time"):
-        try:
-            name_embedding = self.embedding_generator.generate_embedding(name)
-            logger.info(f"Generated embedding for name: {name}")
+        # Models are shared process-wide; constructing a service per request is cheap
+        self.embedding_generator = registry.get_query_embedder()
+        self.llm_analyzer = registry.get_llm_analyzer()
 
-            screening_record = ScreeningRecord(
-                name=name,
-                date_of_birth=date_of_birth,
-                screening_type=screening_type,
-                screening_time=datetime.datetime.utcnow(),
-                matched=False
-            )
-            self.db.add(screening_record)
-            self.db.commit()
-            logger.info(f"Created screening record with ID: {screening_record.id}")
+    def screen_entity(self, name: str, date_of_birth: datetime.date = None, screening_type: str = "Real-time",
+                      nationality: str = None, risk_categories=None, entity_type: str = None,
+                      top_k: int = None, threshold: float = None):
+        """Screen one name; the optional DOB, nationality, risk categories and entity type narrow the candidates.
 
-            threshold = 0.6  # Changed from 0.8 to allow broader fuzzy matches
-            embedding_str = f"[{','.join(map(str, name_embedding))}]"
-            query = text(
-                "SELECT * FROM watchlist_entities "
-                "WHERE (name_embedding <=> CAST(:embedding AS vector)) < :threshold"
-            )
-            watchlist_entities = self.db.execute(
-                query,
-                {"embedding": embedding_str, "threshold": 1 - threshold}
-            ).fetchall()
+        At most top_k matches scoring at least threshold are stored and returned
+        (see resolve_limits()); "truncated" tells whether more qualified.
+        """
+        top_k, threshold = resolve_limits(top_k, threshold)
+        try:
+            name_embedding = _embed_query(self.embedding_generator, name)
 
+            with timed(SCREENING_STAGE_SECONDS, "candidate_search"):
+                watchlist_entities, truncated = search_candidates(
+                    self.db, [name], [name_embedding], dates_of_birth=[date_of_birth], nationalities=[nationality],
+                    risk_categories=risk_categories, entity_type=entity_type, top_k=top_k, threshold=threshold
+                )[0]
             logger.info(f"Found {len(watchlist_entities)} potential matches")
 
-            matches = []
-            has_matches = False
+            screening_record, matches = _new_screening_record(name, date_of_birth, screening_type, watchlist_entities)
+            _explain_inline(self.llm_analyzer, screening_record, name, matches)
 
-            if watchlist_entities:
-                has_matches = True
-                for entity in watchlist_entities:
-                    match_type = "Exact" if entity.name.lower() == name.lower() else "Fuzzy"
-                    match_score = 1.0 if match_type == "Exact" else 0.9
-
-                    match_record = ScreeningMatch(
-                        screening_id=screening_record.id,
-                        watchlist_entity_id=entity.id,
-                        match_type=match_type,
-                        match_score=match_score
+            with timed(SCREENING_STAGE_SECONDS, "persist"):
+                if screening_audit_writer.is_running():
+                    _submit_to_audit_writer(screening_record, matches, name_embedding)
+                else:
+                    screening_record.id = persist_screening(
+                        self.db, screening_audit(screening_record, matches, name_embedding)
                     )
-                    self.db.add(match_record)
-
-                    match_details = {
-                        "unique_id": entity.unique_id,
-                        "name": entity.name,
-                        "date_of_birth": entity.dates_of_birth[0].isoformat() if entity.dates_of_birth else None,
-                        "risk_category": entity.risk_category,
-                        "match_type": match_type,
-                        "match_score": match_score
-                    }
-                    matches.append(match_details)
-
-            screening_record.matched = has_matches
-            if has_matches:
-                avg_score = sum(m["match_score"] for m in matches) / len(matches)
-                screening_record.risk_score = avg_score
-                # Trigger LLM analysis for the first match
-                screening_record.llm_explanation = self.llm_analyzer.analyze(name, matches[0])
-            else:
-                screening_record.llm_explanation = "No matches found"
-
-            self.db.commit()
-            logger.info("Successfully completed screening process")
-
-            return {
-                "screening_id": screening_record.id,
-                "name": name,
-                "date_of_birth": date_of_birth.isoformat() if date_of_birth else None,
-                "screening_time": screening_record.screening_time.isoformat(),
-                "matched": has_matches,
-                "risk_score": screening_record.risk_score if has_matches else 0.0,
-                "explanation": screening_record.llm_explanation,
-                "matches": matches
-            }
+                    self.db.commit()
+            return _complete_screening(screening_record, matches, truncated)
 
         except Exception as e:
             logger.error(f"Error during screening: {str(e)}")
             self.db.rollback()
             raise
 
+    def get_explanation(self, screening_id: int):
+        record = self.db.query(ScreeningRecord).filter(ScreeningRecord.id == screening_id).first()
+        return _explanation_response(record or screening_audit_writer.pending_record(screening_id))
+
+    def _sync_vector_mirror(self, entity_id: int, embeddings):
+        """Make a committed write visible to this process's mirror without waiting for its refresh"""
+        if vector_mirror.is_loaded():
+            vector_mirror.upsert(entity_id, embeddings)
+
+    def _embed_entity(self, name: str, aliases: list[str]):
+        """Name embedding first, then one per alias, from a single model batch"""
+        embeddings = self.embedding_generator.generate_embeddings([name] + aliases)
+        return embeddings[0], embeddings[1:]
+
+    def _replace_aliases(self, entity_id: int, name: str, aliases: list[str], alias_embeddings):
+        """Rewrite the entity's alias vectors and its lexical name keys"""
+        self.db.query(WatchlistAlias).filter(WatchlistAlias.watchlist_entity_id == entity_id).delete()
+        self.db.add_all([
+            WatchlistAlias(watchlist_entity_id=entity_id, alias=alias, alias_embedding=embedding)
+            for alias, embedding in zip(aliases, alias_embeddings)
+        ])
+        replace_name_keys(self.db, [(entity_id, name, aliases)])
+
     def add_watchlist_entity(self, unique_id, name, **kwargs):
         try:
-            name_embedding = self.embedding_generator.generate_embedding(name)
+            aliases = clean_aliases(name, kwargs.get("aliases"))
+            name_embedding, alias_embeddings = self._embed_entity(name, aliases)
             entity = WatchlistEntity(
                 unique_id=unique_id,
                 name=name,
                 name_embedding=name_embedding,
-                aliases=kwargs.get("aliases", []),
+                name_hash=name_content_hash(name, aliases),
+                embedding_model=registry.get_embedding_generator().model_version,
+                aliases=aliases,
                 dates_of_birth=kwargs.get("dates_of_birth", []),
                 gender=kwargs.get("gender"),
-                nationality=kwargs.get("nationality"),
+                nationality=normalize_country(kwargs.get("nationality")),
                 country_of_residence=kwargs.get("country_of_residence"),
                 risk_category=kwargs.get("risk_category"),
                 additional_info=kwargs.get("additional_info"),
                 entity_type=kwargs.get("entity_type", "INDIVIDUAL")
             )
             self.db.add(entity)
+            self.db.flush()
+            self._replace_aliases(entity.id, name, aliases, alias_embeddings)
+            self.db.add(WatchlistChange(watchlist_entity_id=entity.id, change_type="created"))
             self.db.commit()
+            self._sync_vector_mirror(entity.id, [name_embedding] + alias_embeddings)
             logger.info(f"Added watchlist entity with unique_id: {unique_id}")
             return entity
         except Exception as e:
@@ -123,43 +413,131 @@ class ScreeningService:
             self.db.rollback()
             raise
 
-    def add_or_update_watchlist_entity(self, unique_id, name, dates_of_birth=None, risk_category=None):
+    def add_or_update_watchlist_entity(self, unique_id, name, dates_of_birth=None, risk_category=None, aliases=None):
+        """Returns "created", "updated" or "unchanged" (nothing relevant differs, nothing written).
+
+        aliases=None keeps an existing entity's aliases; a list replaces them.
+        """
         try:
             # Convert unique_id to string to match database column type
             unique_id = str(unique_id)
-            
-            # Generate embedding for the name
-            name_embedding = self.embedding_generator.generate_embedding(name)
+            model_version = registry.get_embedding_generator().model_version
             
             # Check if entity exists by unique_id
             existing_entity = self.db.query(WatchlistEntity).filter(WatchlistEntity.unique_id == unique_id).first()
             
             if existing_entity:
+                aliases = clean_aliases(name, existing_entity.aliases if aliases is None else aliases)
+                name_hash = name_content_hash(name, aliases)
+                # Only a changed normalized name or alias list (or a new model) needs new embeddings
+                reembed = existing_entity.name_hash != name_hash or existing_entity.embedding_model != model_version
+                if (
+                    not reembed
+                    and existing_entity.name == name
+                    and aliases == (existing_entity.aliases or [])
+                    and (not dates_of_birth or dates_of_birth == existing_entity.dates_of_birth)
+                    and (not risk_category or risk_category == existing_entity.risk_category)
+                ):
+                    logger.info(f"Watchlist entity with unique_id {unique_id} is unchanged, skipping")
+                    return "unchanged"
+
                 # Update existing entity
                 existing_entity.name = name
-                existing_entity.name_embedding = name_embedding
+                existing_entity.aliases = aliases
+                if reembed:
+                    name_embedding, alias_embeddings = self._embed_entity(name, aliases)
+                    existing_entity.name_embedding = name_embedding
+                    existing_entity.name_hash = name_hash
+                    existing_entity.embedding_model = model_version
+                    self._replace_aliases(existing_entity.id, name, aliases, alias_embeddings)
                 if dates_of_birth:
                     existing_entity.dates_of_birth = dates_of_birth
                 if risk_category:
                     existing_entity.risk_category = risk_category
+                explanation_cache.invalidate_entity(self.db, unique_id)
+                self.db.add(WatchlistChange(watchlist_entity_id=existing_entity.id, change_type="updated"))
                 self.db.commit()
+                explanation_cache.invalidate_local([unique_id])
+                if reembed:
+                    self._sync_vector_mirror(existing_entity.id, [name_embedding] + alias_embeddings)
                 logger.info(f"Updated watchlist entity with unique_id: {unique_id}")
                 return "updated"
             else:
                 # Create new entity
+                aliases = clean_aliases(name, aliases)
+                name_embedding, alias_embeddings = self._embed_entity(name, aliases)
                 new_entity = WatchlistEntity(
                     unique_id=unique_id,
                     name=name,
                     name_embedding=name_embedding,
+                    name_hash=name_content_hash(name, aliases),
+                    embedding_model=model_version,
+                    aliases=aliases,
                     dates_of_birth=dates_of_birth,
                     risk_category=risk_category,
                     entity_type="INDIVIDUAL"  # Default value as per add_watchlist_entity
                 )
                 self.db.add(new_entity)
+                self.db.flush()
+                self._replace_aliases(new_entity.id, name, aliases, alias_embeddings)
+                self.db.add(WatchlistChange(watchlist_entity_id=new_entity.id, change_type="created"))
                 self.db.commit()
+                stats_counters.add("watchlist_entities")
+                self._sync_vector_mirror(new_entity.id, [name_embedding] + alias_embeddings)
                 logger.info(f"Added watchlist entity with unique_id: {unique_id}")
                 return "created"
         except Exception as e:
             self.db.rollback()
             logger.error(f"Error in add_or_update_watchlist_entity for unique_id {unique_id}: {str(e)}")
-            raise Exception(f"Database error: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Database error: {str(e)}")
+
+class AsyncScreeningService:
+    """ScreeningService for async route handlers.
+
+    Queries go through an AsyncSession on the asyncpg engine, so they don't
+    block the event loop; the embedding model and the LLM are blocking
+    libraries and run in worker threads. Watchlist maintenance stays on
+    ScreeningService.
+    """
+
+    def __init__(self, db_session):
+        self.db = db_session
+        self.embedding_generator = registry.get_query_embedder()
+        self.llm_analyzer = registry.get_llm_analyzer()
+
+    async def screen_entity(self, name: str, date_of_birth: datetime.date = None, screening_type: str = "Real-time",
+                            nationality: str = None, risk_categories=None, entity_type: str = None,
+                            top_k: int = None, threshold: float = None):
+        """Same behaviour and response as ScreeningService.screen_entity()"""
+        top_k, threshold = resolve_limits(top_k, threshold)
+        try:
+            name_embedding = await asyncio.to_thread(_embed_query, self.embedding_generator, name)
+
+            with timed(SCREENING_STAGE_SECONDS, "candidate_search"):
+                watchlist_entities, truncated = (await search_candidates_async(
+                    self.db, [name], [name_embedding], dates_of_birth=[date_of_birth], nationalities=[nationality],
+                    risk_categories=risk_categories, entity_type=entity_type, top_k=top_k, threshold=threshold
+                ))[0]
+            logger.info(f"Found {len(watchlist_entities)} potential matches")
+
+            screening_record, matches = _new_screening_record(name, date_of_birth, screening_type, watchlist_entities)
+            await asyncio.to_thread(_explain_inline, self.llm_analyzer, screening_record, name, matches)
+
+            with timed(SCREENING_STAGE_SECONDS, "persist"):
+                if screening_audit_writer.is_running():
+                    await asyncio.to_thread(_submit_to_audit_writer, screening_record, matches, name_embedding)
+                else:
+                    screening_record.id = await persist_screening_async(
+                        self.db, screening_audit(screening_record, matches, name_embedding)
+                    )
+                    await self.db.commit()
+            return await asyncio.to_thread(_complete_screening, screening_record, matches, truncated)
+
+        except Exception as e:
+            logger.error(f"Error during screening: {str(e)}")
+            await self.db.rollback()
+            raise
+
+    async def get_explanation(self, screening_id: int):
+        record = await self.db.get(ScreeningRecord, screening_id)
+        return _explanation_response(record or screening_audit_writer.pending_record(screening_id))
@@ -0,0 +1,148 @@
+from sqlalchemy import text
+from databaseconnection import engine
+from config import config
+import datetime
+import hashlib
+import json
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Adds buffered deltas; rows are upserted in key order so concurrent flushers can't deadlock
+UPSERT_COUNTERS = text(
+    "INSERT INTO stats_counters (name, day, value) "
+    "SELECT * FROM unnest(CAST(:names AS text[]), CAST(:days AS date[]), CAST(:deltas AS bigint[])) "
+    "ON CONFLICT (name, day) DO UPDATE SET value = stats_counters.value + EXCLUDED.value"
+)
+# A handful of rows per counter (one per day), however large the counted tables are
+READ_COUNTERS = text(
+    "SELECT name, sum(value) AS total, coalesce(sum(value) FILTER (WHERE day = :today), 0) AS today "
+    "FROM stats_counters GROUP BY name"
+)
+
+class StatsCounters:
+    """Incrementally maintained counters behind /stats.
+
+    add() buffers a delta for the current UTC day; a flusher thread upserts
+    all buffered deltas every STATS_FLUSH_SECONDS in one statement, so hot
+    paths never wait on the shared counter rows. When the flusher isn't
+    running (CLI commands) add() writes through. snapshot() reads the
+    counters (plus this process's unflushed deltas) at most once per
+    STATS_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, flush_seconds: float = None, cache_ttl_seconds: float = None):
+        self.flush_seconds = flush_seconds or config.STATS_FLUSH_SECONDS
+        self.cache_ttl_seconds = config.STATS_CACHE_TTL_SECONDS if cache_ttl_seconds is None else cache_ttl_seconds
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}
+        self._thread = None
+        self._stopping = False
+        self._snapshot = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="stats-counters", daemon=True)
+        self._thread.start()
+
+    def add(self, name: str, amount: int = 1):
+        if not amount:
+            return
+        key = (name, datetime.datetime.utcnow().date())
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + amount
+        if not self.is_running():
+            try:
+                self.flush()
+            except Exception as e:
+                # Kept buffered; the next flush retries
+                logger.error(f"Stats counter update failed: {str(e)}")
+
+    def add_screenings(self, screened: int, matched: int):
+        self.add("screenings", screened)
+        self.add("matched_screenings", matched)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            keys = sorted(batch)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(UPSERT_COUNTERS, {
+                        "names": [name for name, _ in keys],
+                        "days": [day for _, day in keys],
+                        "deltas": [batch[key] for key in keys],
+                    })
+            except Exception:
+                with self._lock:
+                    for key, amount in batch.items():
+                        self._pending[key] = self._pending.get(key, 0) + amount
+                raise
+            return len(keys)
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Stats counter flush failed, will retry: {str(e)}")
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Final stats counter flush failed: {str(e)}")
+
+    def snapshot(self):
+        """(stats dict, ETag); the ETag only changes when a counter does"""
+        with self._lock:
+            cached = self._snapshot
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl_seconds:
+            return cached[1], cached[2]
+
+        today = datetime.datetime.utcnow().date()
+        totals, todays = {}, {}
+        with engine.connect() as conn:
+            for row in conn.execute(READ_COUNTERS, {"today": today}):
+                totals[row.name], todays[row.name] = int(row.total), int(row.today)
+        with self._lock:
+            for (name, day), amount in self._pending.items():
+                totals[name] = totals.get(name, 0) + amount
+                if day == today:
+                    todays[name] = todays.get(name, 0) + amount
+        stats = {
+            "day": today.isoformat(),
+            "screenings_today": todays.get("screenings", 0),
+            "matched_screenings_today": todays.get("matched_screenings", 0),
+            "screenings_total": totals.get("screenings", 0),
+            "watchlist_size": totals.get("watchlist_entities", 0),
+            "watchlist_added_today": todays.get("watchlist_entities", 0),
+            "watchlist_rows_ingested_today": todays.get("watchlist_rows_ingested", 0),
+        }
+        etag = '"' + hashlib.sha256(json.dumps(stats, sort_keys=True).encode()).hexdigest()[:16] + '"'
+        stats["as_of"] = datetime.datetime.utcnow().isoformat()
+        with self._lock:
+            self._snapshot = (time.monotonic(), stats, etag)
+        return stats, etag
+
+# Shared instance for the whole process
+stats_counters = StatsCounters()
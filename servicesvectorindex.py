@@ -0,0 +1,331 @@
+from sqlalchemy import select, func, or_, union_all, literal
+from databaseconnection import engine
+from databasemodels import WatchlistEntity, WatchlistAlias
+from config import config
+import numpy as np
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locking, a single process is assumed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MANIFEST = "snapshot.json"
+
+# Bumped when the snapshot layout changes (2: alias vectors follow each entity's name vector)
+SNAPSHOT_FORMAT = 2
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so a dot product is the cosine similarity (zero rows stay zero)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _fetch_database_time(conn) -> datetime.datetime:
+    return conn.execute(select(func.clock_timestamp().cast(WatchlistEntity.updated_at.type))).scalar()
+
+def current_model_version() -> str:
+    """model_version of the process's embedding backend; snapshots are only reused for the same one"""
+    from servicesregistry import registry
+    return registry.get_embedding_generator().model_version
+
+def build_vector_snapshot(directory: str = None, model_version: str = None) -> dict:
+    """Write all watchlist embeddings to a new snapshot in `directory` and point the manifest at it.
+
+    The snapshot is two .npy files (unit-normalized float32 name and alias
+    vectors, and the owning entity id of each) plus a manifest recording the watermark: every row
+    updated before it is in the snapshot, anything later is picked up by the
+    mirror's incremental refresh.
+    """
+    directory = directory or config.VECTOR_SNAPSHOT_DIR
+    model_version = model_version or current_model_version()
+    os.makedirs(directory, exist_ok=True)
+    start = time.perf_counter()
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        watermark = _fetch_database_time(conn)
+        selected = (
+            WatchlistEntity.name_embedding.isnot(None),
+            or_(WatchlistEntity.updated_at <= watermark, WatchlistEntity.updated_at.is_(None)),
+        )
+        # Name then alias vectors (by alias id), grouped by entity so each entity owns one contiguous block of rows
+        entity_vectors = union_all(
+            select(
+                WatchlistEntity.id.label("entity_id"),
+                WatchlistEntity.name_embedding.label("embedding"),
+                literal(0).label("sort_key"),
+            ).where(*selected),
+            select(WatchlistAlias.watchlist_entity_id, WatchlistAlias.alias_embedding, WatchlistAlias.id)
+            .join(WatchlistEntity, WatchlistEntity.id == WatchlistAlias.watchlist_entity_id)
+            .where(*selected),
+        ).subquery()
+        count = conn.execute(select(func.count()).select_from(entity_vectors)).scalar()
+        stamp = watermark.strftime("%Y%m%dT%H%M%S%f")
+        vectors_file = f"vectors-{stamp}.npy"
+        ids_file = f"ids-{stamp}.npy"
+        vectors = np.lib.format.open_memmap(
+            os.path.join(directory, vectors_file), mode="w+", dtype=np.float32, shape=(count, config.EMBEDDING_SIZE)
+        )
+        ids = np.lib.format.open_memmap(os.path.join(directory, ids_file), mode="w+", dtype=np.int64, shape=(count,))
+        rows = conn.execution_options(stream_results=True, yield_per=10000).execute(
+            select(entity_vectors.c.entity_id, entity_vectors.c.embedding).order_by(entity_vectors.c.entity_id, entity_vectors.c.sort_key)
+        )
+        position = 0
+        for batch in rows.partitions():
+            batch_ids = [row.entity_id for row in batch]
+            batch_vectors = np.asarray([row.embedding for row in batch], dtype=np.float32)
+            vectors[position:position + len(batch)] = normalize_rows(batch_vectors)
+            ids[position:position + len(batch)] = batch_ids
+            position += len(batch)
+    vectors.flush()
+    ids.flush()
+    del vectors, ids
+
+    manifest = {
+        "vectors": vectors_file,
+        "ids": ids_file,
+        "count": count,
+        "dimension": config.EMBEDDING_SIZE,
+        "format": SNAPSHOT_FORMAT,
+        "model": model_version,
+        "watermark": watermark.isoformat(),
+    }
+    previous = _read_manifest(directory)
+    manifest_path = os.path.join(directory, SNAPSHOT_MANIFEST)
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    # Workers still mapping the old files keep them alive until they reload
+    if previous:
+        for key in ("vectors", "ids"):
+            try:
+                os.remove(os.path.join(directory, previous[key]))
+            except OSError:
+                pass
+    elapsed = time.perf_counter() - start
+    logger.info(f"Built vector snapshot of {count} name/alias vectors in {elapsed:.2f}s ({directory})")
+    return dict(manifest, elapsed_seconds=elapsed)
+
+def _read_manifest(directory: str):
+    try:
+        with open(os.path.join(directory, SNAPSHOT_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class VectorMirror:
+    """In-process copy of the watchlist embeddings for screening without a pgvector scan.
+
+    The bulk of the vectors comes from a snapshot file memory-mapped read-only,
+    so every worker process on a host shares one copy in the page cache. Rows
+    changed since the snapshot are kept in a small per-process overlay that a
+    background thread refreshes from Postgres (the source of truth) using the
+    updated_at column; local upserts are applied immediately.
+    """
+
+    def __init__(self, directory: str = None, refresh_seconds: float = None):
+        self.directory = directory or config.VECTOR_SNAPSHOT_DIR
+        self.refresh_seconds = refresh_seconds or config.VECTOR_MIRROR_REFRESH_SECONDS
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._manifest = None
+        self._vectors = None
+        self._ids = None
+        self._positions = {}  # entity id -> (first, end) snapshot rows of its name and alias vectors
+        self._shadowed = None  # snapshot rows superseded by the overlay
+        self._overlay = {}  # entity id -> matrix of unit vectors (name first, then aliases)
+        self._overlay_ids = np.zeros(0, dtype=np.int64)
+        self._overlay_matrix = np.zeros((0, config.EMBEDDING_SIZE), dtype=np.float32)
+        self._overlay_dirty = False
+        self._watermark = None
+        self.model_version = None
+        self.last_refresh = None
+
+    def start(self):
+        """Load (building first if needed) the snapshot and start the refresh thread"""
+        if self._thread is not None:
+            return
+        self.model_version = current_model_version()
+        manifest = _read_manifest(self.directory)
+        if not self._is_usable(manifest):
+            manifest = self._build_once()
+        self._load(manifest)
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name="vector-mirror-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+
+    def is_loaded(self) -> bool:
+        return self._vectors is not None
+
+    def _is_usable(self, manifest) -> bool:
+        return (
+            manifest is not None
+            and manifest.get("format") == SNAPSHOT_FORMAT
+            and manifest.get("dimension") == config.EMBEDDING_SIZE
+            and manifest.get("model") == self.model_version
+        )
+
+    def _build_once(self):
+        """Build a snapshot unless another worker process is already doing it"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "build.lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            manifest = _read_manifest(self.directory)
+            if not self._is_usable(manifest):
+                build_vector_snapshot(self.directory, self.model_version)
+                manifest = _read_manifest(self.directory)
+        return manifest
+
+    def _load(self, manifest: dict):
+        vectors = np.load(os.path.join(self.directory, manifest["vectors"]), mmap_mode="r")
+        ids = np.load(os.path.join(self.directory, manifest["ids"]), mmap_mode="r")
+        entity_ids, firsts, counts = np.unique(ids, return_index=True, return_counts=True)
+        positions = {
+            int(entity_id): (int(first), int(first + count))
+            for entity_id, first, count in zip(entity_ids, firsts, counts)
+        }
+        watermark = datetime.datetime.fromisoformat(manifest["watermark"])
+        with self._lock:
+            self._manifest = manifest
+            self._vectors = vectors
+            self._ids = ids
+            self._positions = positions
+            self._shadowed = np.zeros(len(ids), dtype=bool)
+            self._overlay = {}
+            self._overlay_dirty = True
+            self._watermark = watermark
+        logger.info(
+            f"Loaded vector snapshot with {len(ids)} vectors for {len(positions)} entities "
+            f"(watermark {manifest['watermark']})"
+        )
+
+    def upsert(self, entity_id: int, embeddings):
+        """Apply a committed insert/update of one entity (its name embedding, then alias embeddings)"""
+        matrix = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        with self._lock:
+            self._overlay[int(entity_id)] = matrix
+            rows = self._positions.get(int(entity_id))
+            if rows is not None:
+                self._shadowed[rows[0]:rows[1]] = True
+            self._overlay_dirty = True
+
+    def _matches_snapshot(self, entity_id: int, matrix: np.ndarray) -> bool:
+        rows = self._positions.get(entity_id)
+        if rows is None or self._shadowed[rows[0]]:
+            return False
+        stored = self._vectors[rows[0]:rows[1]]
+        return stored.shape == matrix.shape and np.allclose(stored, matrix)
+
+    def refresh(self):
+        """Pick up a newer snapshot, then entities changed in Postgres since the watermark"""
+        manifest = _read_manifest(self.directory)
+        if self._is_usable(manifest) and manifest != self._manifest:
+            self._load(manifest)
+        # Chunks committed slightly out of updated_at order are re-read within the overlap window
+        since = self._watermark - datetime.timedelta(seconds=config.VECTOR_MIRROR_REFRESH_OVERLAP_SECONDS)
+        changed = (WatchlistEntity.updated_at > since, WatchlistEntity.name_embedding.isnot(None))
+        with engine.connect() as conn:
+            now = _fetch_database_time(conn)
+            entities = conn.execute(select(WatchlistEntity.id, WatchlistEntity.name_embedding).where(*changed)).fetchall()
+            aliases = {}
+            if entities:
+                for row in conn.execute(
+                    select(WatchlistAlias.watchlist_entity_id, WatchlistAlias.alias_embedding)
+                    .join(WatchlistEntity, WatchlistEntity.id == WatchlistAlias.watchlist_entity_id)
+                    .where(*changed)
+                    .order_by(WatchlistAlias.watchlist_entity_id, WatchlistAlias.id)
+                ):
+                    aliases.setdefault(row.watchlist_entity_id, []).append(row.alias_embedding)
+        for entity in entities:
+            embeddings = [entity.name_embedding] + aliases.get(entity.id, [])
+            matrix = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+            # Entities re-read inside the overlap window are usually unchanged from the snapshot
+            if self._matches_snapshot(entity.id, matrix):
+                continue
+            self.upsert(entity.id, matrix)
+        with self._lock:
+            self._watermark = max(self._watermark, now)
+        self.last_refresh = datetime.datetime.utcnow()
+        if len(self._overlay) > config.VECTOR_MIRROR_MAX_OVERLAY:
+            logger.warning(
+                f"Vector mirror overlay holds {len(self._overlay)} entities; "
+                f"rebuild the snapshot with `python manage.py build-vector-snapshot`"
+            )
+
+    def _run(self):
+        while not self._stop_event.wait(self.refresh_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Vector mirror refresh failed: {str(e)}")
+
+    def _current_overlay(self):
+        if self._overlay_dirty:
+            if self._overlay:
+                self._overlay_ids = np.concatenate([
+                    np.full(len(matrix), entity_id, dtype=np.int64) for entity_id, matrix in self._overlay.items()
+                ])
+                self._overlay_matrix = np.concatenate(list(self._overlay.values()))
+            else:
+                self._overlay_ids = np.zeros(0, dtype=np.int64)
+                self._overlay_matrix = np.zeros((0, config.EMBEDDING_SIZE), dtype=np.float32)
+            self._overlay_dirty = False
+        return self._overlay_ids, self._overlay_matrix
+
+    def search(self, embedding, max_distance: float, limit: int):
+        """Return [(entity_id, best cosine distance)] below max_distance, nearest first, at most `limit`"""
+        return self.search_many([embedding], max_distance, limit)[0]
+
+    def search_many(self, embeddings, max_distance: float, limit: int):
+        """Vectorized search for a batch of query embeddings; one result list per query"""
+        queries = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+        with self._lock:
+            vectors, ids, shadowed = self._vectors, self._ids, self._shadowed
+            overlay_ids, overlay_matrix = self._current_overlay()
+        all_ids = np.concatenate([ids, overlay_ids])
+        # Bound the (vectors x queries) distance block to roughly 64M floats
+        step = max(1, (1 << 26) // max(len(all_ids), 1))
+        results = []
+        for offset in range(0, len(queries), step):
+            block = queries[offset:offset + step].T
+            # Exact cosine distance over every row; a superseded snapshot row is pushed out of range
+            distances = 1.0 - vectors @ block
+            distances[shadowed] = np.inf
+            all_distances = np.concatenate([distances, 1.0 - overlay_matrix @ block])
+            for column in range(all_distances.shape[1]):
+                query_distances = all_distances[:, column]
+                within = np.flatnonzero(query_distances < max_distance)
+                within = within[np.argsort(query_distances[within], kind="stable")]
+                # Keep each entity's closest name/alias vector
+                _, first = np.unique(all_ids[within], return_index=True)
+                within = within[np.sort(first)][:limit]
+                results.append([(int(all_ids[i]), float(query_distances[i])) for i in within])
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.is_loaded(),
+            "snapshot_entities": len(self._positions),
+            "snapshot_vectors": len(self._ids) if self._ids is not None else 0,
+            "overlay_entities": len(self._overlay),
+            "snapshot_watermark": self._manifest["watermark"] if self._manifest else None,
+            "last_refresh": self.last_refresh.isoformat() if self.last_refresh else None,
+        }
+
+# Shared instance for the whole process
+vector_mirror = VectorMirror()
@@ -112,6 +112,18 @@ st.markdown("""
 # API endpoints from config
 SCREENING_API_URL = config.SCREENING_API_URL
 UPLOAD_API_URL = config.UPLOAD_API_URL
+UPLOAD_JOBS_API_URL = config.UPLOAD_JOBS_API_URL
+STATS_API_URL = config.STATS_API_URL
+
+@st.cache_data(ttl=config.UI_STATS_CACHE_SECONDS, show_spinner=False)
+def fetch_stats():
+    """Sidebar counters, reused across reruns for UI_STATS_CACHE_SECONDS; None when the API is unreachable"""
+    try:
+        response = requests.get(STATS_API_URL, timeout=2)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException:
+        return None
 
 # Sidebar
 with st.sidebar:
@@ -121,23 +133,16 @@ with st.sidebar:
     
     st.markdown("---")
     st.markdown("### Stats")
-    # These could be fetched from a stats API endpoint in a real implementation
-    try:
-        stats_response = requests.get(f"{config.BASE_API_URL}/stats", timeout=300)
-        if stats_response.status_code == 200:
-            stats = stats_response.json()
-            st.metric("Screenings Today", stats.get("screenings_today", "N/A"))
-            st.metric("Watchlist Size", stats.get("watchlist_size", "N/A"))
-        else:
-            st.metric("Screenings Today", "N/A")
-            st.metric("Watchlist Size", "N/A")
-    except:
-        st.metric("Screenings Today", "N/A")
-        st.metric("Watchlist Size", "N/A")
+    stats = fetch_stats() or {}
+    st.metric("Screenings Today", stats.get("screenings_today", "N/A"))
+    st.metric("Watchlist Size", stats.get("watchlist_size", "N/A"))
     
     st.markdown("---")
     st.markdown("#### Last Updated")
-    st.markdown(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}")
+    if stats.get("as_of"):
+        st.markdown(f"{datetime.datetime.fromisoformat(stats['as_of']).strftime('%Y-%m-%d %H:%M')} UTC")
+    else:
+        st.markdown(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}")
 
 # Main content
 st.markdown('<h1 class="main-header">Customer Screening Tool</h1>', unsafe_allow_html=True)
@@ -229,7 +234,21 @@ if page == "Screen Customer":
                     col1, col2 = st.columns([3, 1])
                     with col1:
                         st.warning("⚠️ Match Found!")
-                        st.markdown(f"**Explanation:** {result.get('explanation', 'No explanation provided')}")
+                        explanation_box = st.empty()
+                        explanation = result.get('explanation') or 'No explanation provided'
+                        if result.get("explanation_status") == "pending":
+                            # Explanation is generated in the background; poll until it's ready
+                            explanation_box.markdown("**Explanation:** _Generating risk explanation..._")
+                            explanation_url = f"{config.API_BASE_URL}/screening/{result['screening_id']}/explanation"
+                            for _ in range(120):
+                                time.sleep(1)
+                                explanation_response = requests.get(explanation_url, timeout=10)
+                                if explanation_response.ok and explanation_response.json().get("status") != "pending":
+                                    explanation = explanation_response.json().get("explanation") or explanation
+                                    break
+                            else:
+                                explanation = "Explanation is still being generated. Check back later."
+                        explanation_box.markdown(f"**Explanation:** {explanation}")
                     with col2:
                         st.metric("Risk Score", f"{result.get('risk_score', 0):.2f}", 
                                 delta=f"{result.get('risk_score', 0) - 0.5:.2f}", 
@@ -369,7 +388,7 @@ elif page == "Upload Watchlist":
                 st.markdown('<h3 class="subheader">Upload Options</h3>', unsafe_allow_html=True)
                 col1, col2 = st.columns(2)
                 with col1:
-                    batch_size = st.number_input("Batch Size", min_value=1, max_value=1000, value=100, 
+                    batch_size = st.number_input("Batch Size", min_value=1, max_value=10000, value=1000, 
                                                help="Number of records to process at once")
                 with col2:
                     continue_on_error = st.checkbox("Continue on Errors", value=True,
@@ -380,47 +399,79 @@ elif page == "Upload Watchlist":
                     status_text = st.empty()
                     
                     try:
-                        with st.spinner('Uploading watchlist...'):
-                            # Convert DataFrame to list of dictionaries
-                            data = df.to_dict('records')
-                            
-                            # Clean the data (remove NaN values)
-                            cleaned_data = []
-                            for record in data:
-                                cleaned_record = {}
-                                for key, value in record.items():
-                                    if pd.isna(value) or value == '':
-                                        cleaned_record[key] = None
-                                    else:
-                                        cleaned_record[key] = value
-                                cleaned_data.append(cleaned_record)
-                            
-                            status_text.text("Sending data to API...")
-                            response = requests.post(
-                                UPLOAD_API_URL,
-                                json={"watchlist": cleaned_data},
-                                timeout=300  # 5 minute timeout for large uploads
-                            )
-                            response.raise_for_status()
-                            result = response.json()
-                        
+                        status_text.text("Sending file to API...")
+                        response = requests.post(
+                            UPLOAD_JOBS_API_URL,
+                            files={"file": (uploaded_file.name, uploaded_file.getvalue(), "text/csv")},
+                            params={"chunk_size": int(batch_size), "continue_on_error": continue_on_error},
+                            timeout=60
+                        )
+                        response.raise_for_status()
+                        job_id = response.json()["job_id"]
+
+                        # Poll the job for real progress instead of blocking on one long request
+                        poll_start = last_change = time.monotonic()
+                        last_progress = None
+                        while True:
+                            job_response = requests.get(f"{UPLOAD_JOBS_API_URL}/{job_id}", timeout=10)
+                            job_response.raise_for_status()
+                            result = job_response.json()
+                            now = time.monotonic()
+                            progress = (result.get("status"), result.get("rows_done"))
+                            if progress != last_progress:
+                                last_progress, last_change = progress, now
+                            total_rows = result.get("total_rows") or len(df)
+                            rows_done = result.get("rows_done") or 0
+                            progress_bar.progress(min(int(rows_done * 100 / total_rows), 100) if total_rows else 0)
+                            status_line = f"Processed {rows_done} of {total_rows} rows"
+                            if result.get("rows_per_second"):
+                                status_line += f" ({result['rows_per_second']:.0f} rows/s"
+                                if result.get("eta_seconds") is not None:
+                                    status_line += f", ETA {result['eta_seconds']:.0f}s"
+                                status_line += ")"
+                            status_text.text(status_line)
+                            if result.get("status") in ("completed", "failed"):
+                                break
+                            # A job lost to a server restart never finishes; don't poll it forever
+                            if now - last_change > config.UI_UPLOAD_STALL_SECONDS:
+                                result["status"] = "failed"
+                                result["message"] = (
+                                    f"No progress for {config.UI_UPLOAD_STALL_SECONDS}s (job {job_id} is "
+                                    f"{progress[0]}); the server may have restarted, check it and upload again"
+                                )
+                                break
+                            if now - poll_start > config.UI_UPLOAD_MAX_WAIT_SECONDS:
+                                result["status"] = "failed"
+                                result["message"] = (
+                                    f"Stopped waiting after {config.UI_UPLOAD_MAX_WAIT_SECONDS}s; "
+                                    f"job {job_id} may still be running"
+                                )
+                                break
+                            time.sleep(1)
+
+                        if result.get("status") == "failed":
+                            st.error(f"Upload job failed: {result.get('message', 'Unknown error')}")
+
                         progress_bar.progress(100)
-                        status_text.text("Upload completed!")
+                        status_text.text("Upload completed!" if result.get("status") == "completed" else "Upload stopped")
                         
                         # Display results
                         st.markdown('<div class="success-box">', unsafe_allow_html=True)
                         st.markdown("**Upload Results:**")
                         
-                        col1, col2, col3 = st.columns(3)
+                        col1, col2, col3, col4 = st.columns(4)
                         col1.metric("Created", result.get('created_count', 0))
                         col2.metric("Updated", result.get('updated_count', 0))
-                        col3.metric("Errors", result.get('error_count', 0))
+                        col3.metric("Unchanged", result.get('skipped_unchanged', 0))
+                        col4.metric("Errors", result.get('error_count', 0))
                         
                         st.markdown(f"**Message:** {result.get('message', 'Upload completed')}")
                         st.markdown('</div>', unsafe_allow_html=True)
                         
                         if result.get('error_count', 0) > 0:
-                            st.warning(f"Some records failed to process. Check the server logs for details.")
+                            st.warning(f"Some records failed to process.")
+                            if result.get("errors"):
+                                st.dataframe(pd.DataFrame(result["errors"]), use_container_width=True)
 
                     except requests.exceptions.RequestException as e:
                         st.error(f"API Error: {str(e)}")
@@ -468,7 +519,7 @@ else:  # Help & Documentation
     - **Duplicate unique_id error**: The system now handles duplicates by updating existing records
     - **Invalid date format**: Use YYYY-MM-DD format for dates
     - **Missing required fields**: Ensure all records have `unique_id` and `name`
-    - **Large file timeouts**: Consider splitting large files into smaller batches
+    - **Large files**: Uploads run as background jobs; progress is shown while the file is processed
     
     #### API Errors:
     - Check that the backend service is running